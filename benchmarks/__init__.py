@@ -0,0 +1,4 @@
+'''
+Performance benchmarks. Run from the project root, e.g.:
+    python -m benchmarks.throttle_store
+'''
@@ -0,0 +1,47 @@
+import contextlib, os, statistics, time
+
+def setup_django(settings_module='config.settings'):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+@contextlib.contextmanager
+def test_database():
+    '''
+    Run against a throwaway test database (migrated, empty) so benchmarks never touch real data.
+    '''
+    from django.db import connection
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+def percentiles(samples):
+    '''
+    p50/p95/p99/mean of a list of durations (seconds), reported in microseconds.
+    '''
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'n': len(ordered),
+        'p50_us': round(pick(0.50) * 1e6, 2),
+        'p95_us': round(pick(0.95) * 1e6, 2),
+        'p99_us': round(pick(0.99) * 1e6, 2),
+        'mean_us': round(statistics.fmean(ordered) * 1e6, 2),
+    }
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def print_table(title, rows):
+    print(f'\n{title}')
+    for name, stats in rows:
+        cols = '  '.join(f'{k}={v}' for k, v in stats.items())
+        print(f'  {name:<32} {cols}')
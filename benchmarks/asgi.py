@@ -0,0 +1,179 @@
+'''
+Requests/second of one worker process under mixed slow-client load: the native async read
+views against the sync stack.
+
+    python -m benchmarks.asgi [--size 5k] [--clients 64] [--slow 0.5] [--slow-delay 0.2] [--duration 5]
+
+A share of the clients (--slow) read their responses slowly (--slow-delay seconds per body);
+the rest are fast. Every client loops over list, ?tag=, ?tags=a,b and detail requests until
+--duration runs out. Stacks, all in this process and against the same seeded database:
+
+- wsgi-threads: WSGIHandler on a --threads pool (like a threaded WSGI worker); a slow
+  client keeps its thread busy until its body has been written
+- asgi-sync: ASGIHandler with the DRF views, each request run in a worker thread
+- asgi-async: ASGIHandler with bookmarks.async_views (BOOKMARKS['ASYNC_VIEWS'])
+
+The response cache is off and throttle rates are raised out of the way (their checks still
+run), so every request does its real work. Reported: completed requests/second overall and
+p50/p95 latency of the fast clients.
+'''
+import argparse, asyncio, concurrent.futures, importlib, io, os, random, sys, tempfile, time
+from ._common import percentiles, print_table, setup_django, test_database
+from .suite import parse_size, seed
+
+def _paths(rng, ids):
+    kind = rng.random()
+    if kind < 0.4:
+        return '/bookmarks/v1/bookmarks/', ''
+    if kind < 0.6:
+        return '/bookmarks/v1/bookmarks/', f'tag=tag-{rng.randint(0, 20)}'
+    if kind < 0.7:
+        return '/bookmarks/v1/bookmarks/', f'tags=tag-0,tag-{rng.randint(1, 20)}'
+    return f'/bookmarks/v1/bookmarks/{rng.choice(ids)}/', ''
+
+def _use_async_views(enabled):
+    from django.conf import settings
+    from django.urls import clear_url_caches
+    import bookmarks.urls, config.urls
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'ASYNC_VIEWS': enabled}
+    importlib.reload(bookmarks.urls)
+    importlib.reload(config.urls)
+    clear_url_caches()
+
+# Stacks: each returns `request(path, query, slow) -> awaitable status`
+def wsgi_stack(threads, slow_delay):
+    from django.core.handlers.wsgi import WSGIHandler
+    handler = WSGIHandler()
+    pool = concurrent.futures.ThreadPoolExecutor(threads)
+
+    def serve(path, query, slow):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'REMOTE_ADDR': '203.0.113.10',
+            'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+        }
+        status = []
+        body = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+        for _ in body:
+            if slow:
+                time.sleep(slow_delay) # a blocking write to a slow socket
+        body.close()
+        return int(status[0][:3])
+
+    async def request(path, query, slow):
+        return await asyncio.get_running_loop().run_in_executor(pool, serve, path, query, slow)
+    return request
+
+def asgi_stack(slow_delay):
+    from django.core.handlers.asgi import ASGIHandler
+    handler = ASGIHandler()
+
+    async def request(path, query, slow):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'testserver')], 'client': ('203.0.113.10', 40000),
+            'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        status = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Future() # the client never disconnects early
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif slow and message['type'] == 'http.response.body':
+                await asyncio.sleep(slow_delay) # waiting for a slow socket to drain
+
+        await handler(scope, receive, send)
+        return status[0]
+    return request
+
+async def drive(request, clients, slow_share, duration, ids, seed_):
+    rng = random.Random(seed_)
+    deadline = time.perf_counter() + duration
+    fast_samples, done = [], [0]
+
+    async def client(slow):
+        while time.perf_counter() < deadline:
+            path, query = _paths(rng, ids)
+            started = time.perf_counter()
+            status = await request(path, query, slow)
+            assert status == 200, (path, query, status)
+            done[0] += 1
+            if not slow:
+                fast_samples.append(time.perf_counter() - started)
+
+    n_slow = int(clients * slow_share)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i < n_slow) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+    stats = percentiles(fast_samples) if fast_samples else {}
+    return {
+        'req_per_s': round(done[0] / elapsed, 1),
+        'fast_p50_ms': round(stats.get('p50_us', 0) / 1000, 2),
+        'fast_p95_ms': round(stats.get('p95_us', 0) / 1000, 2),
+        'requests': done[0],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='5k', help='bookmarks to seed, e.g. 5k')
+    parser.add_argument('--clients', type=int, default=64, help='concurrent clients')
+    parser.add_argument('--slow', type=float, default=0.5, help='share of slow clients')
+    parser.add_argument('--slow-delay', type=float, default=0.2, help='seconds a slow client takes to read a body')
+    parser.add_argument('--threads', type=int, default=8, help='threads of the wsgi-threads worker')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per stack')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    from rest_framework.throttling import SimpleRateThrottle
+    from bookmarks import search
+    from bookmarks.models import Bookmark
+
+    setup_test_environment() # allows the 'testserver' host
+    SimpleRateThrottle.THROTTLE_RATES = {scope: '1000000000/day' for scope in SimpleRateThrottle.THROTTLE_RATES}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A file database: the stacks open connections from many threads
+        connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': os.path.join(tmp, 'bench.sqlite3')}
+        with test_database(), override_settings(BOOKMARKS={
+            'RESPONSE_CACHE': False,
+            'METRICS': False,
+            'THROTTLE_STORE': 'bookmarks.throttle_store.SQLiteThrottleStore',
+            'THROTTLE_STORE_OPTIONS': {'path': os.path.join(tmp, 'throttle.sqlite3')},
+        }):
+            size = parse_size(args.size)
+            print(f'Seeding {size:,} bookmarks', file=sys.stderr)
+            seed(0, size, random.Random(args.seed))
+            search.rebuild()
+            ids = list(Bookmark.objects.filter(is_approved=True).values_list('id', flat=True)[:1000])
+            connection.close()
+
+            stacks = [
+                ('wsgi-threads', False, lambda: wsgi_stack(args.threads, args.slow_delay)),
+                ('asgi-sync', False, lambda: asgi_stack(args.slow_delay)),
+                ('asgi-async', True, lambda: asgi_stack(args.slow_delay)),
+            ]
+            rows = []
+            for name, use_async, make in stacks:
+                _use_async_views(use_async)
+                request = make()
+                asyncio.run(drive(request, min(4, args.clients), 0, 0.5, ids, args.seed)) # warm up
+                rows.append((name, asyncio.run(drive(request, args.clients, args.slow, args.duration, ids, args.seed))))
+            _use_async_views(False)
+
+    print_table(
+        f'{size:,} bookmarks, {args.clients} clients ({args.slow:.0%} reading at {args.slow_delay * 1000:.0f} ms/body), {args.duration:.0f}s per stack',
+        rows,
+    )
+
+if __name__ == '__main__':
+    main()
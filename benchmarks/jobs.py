@@ -0,0 +1,97 @@
+'''
+Throughput of the background job queue (bookmarks.jobs): enqueueing, and draining the queue
+with worker processes at several batch sizes.
+
+    python -m benchmarks.jobs [--jobs 2000] [--batch-sizes 1,10,100] [--processes 1,2] [--cost 0.002]
+
+Each job of the benchmark kind stands for one round trip to something slow (an HTTP fetch, a
+lookup): its handler sleeps --cost seconds per call plus --per-job seconds per payload, so
+batching pays off the way it does for real handlers. Workers are forked like
+`manage.py bookmarks_worker --processes N --once` and share one file SQLite database.
+
+Reported: enqueue rate for submit-sized (1 job) and import-sized (--jobs jobs) INSERTs, and
+for each (processes, batch size) jobs/second until the queue is empty.
+'''
+import argparse, multiprocessing, os, sys, tempfile, time
+from ._common import percentiles, print_table, setup_django, test_database, timed
+
+KIND = 'bench'
+
+def _register(batch_size, cost, per_job):
+    from bookmarks import jobs
+
+    @jobs.handler(KIND, batch_size=batch_size)
+    def bench(payloads):
+        time.sleep(cost + per_job * len(payloads))
+
+def _drain(worker):
+    from django.db import connections
+    from bookmarks import jobs
+    try:
+        jobs.work(worker=worker, kinds=[KIND], once=True)
+    finally:
+        connections.close_all()
+
+def drain(processes):
+    from django.db import connections
+    connections.close_all() # children must open their own connections
+    context = multiprocessing.get_context('fork')
+    children = [context.Process(target=_drain, args=(f'bench-{i}',)) for i in range(processes)]
+    started = time.perf_counter()
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=2000, help='jobs to drain per run')
+    parser.add_argument('--batch-sizes', default='1,10,100')
+    parser.add_argument('--processes', default='1,2')
+    parser.add_argument('--cost', type=float, default=0.002, help='seconds per handler call')
+    parser.add_argument('--per-job', type=float, default=0.0001, help='extra seconds per payload')
+    args = parser.parse_args()
+    setup_django()
+
+    from django.db import connection
+    from django.test.utils import override_settings
+    from bookmarks import jobs
+    from bookmarks.models import Job
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A file database: the forked workers need to see the same queue
+        connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': os.path.join(tmp, 'bench.sqlite3')}
+        with test_database(), override_settings(BOOKMARKS={'METRICS': False}):
+            counter = iter(range(10 ** 9))
+
+            def enqueue_one():
+                i = next(counter)
+                jobs.enqueue(KIND, {'id': i}, key=f'{KIND}:{i}')
+            single = timed(enqueue_one, 500)
+            started = time.perf_counter()
+            jobs.enqueue_many(KIND, [({'id': i}, f'{KIND}:bulk:{i}') for i in range(args.jobs)])
+            bulk = time.perf_counter() - started
+            rows = [
+                ('enqueue (1 job)', percentiles(single)),
+                (f'enqueue_many ({args.jobs} jobs)', {'jobs_per_s': round(args.jobs / bulk), 'total_ms': round(bulk * 1000, 1)}),
+            ]
+
+            for processes in [int(p) for p in args.processes.split(',')]:
+                for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+                    Job.objects.all().delete()
+                    jobs.enqueue_many(KIND, [({'id': i}, None) for i in range(args.jobs)])
+                    _register(batch_size, args.cost, args.per_job)
+                    print(f'Draining {args.jobs:,} jobs: {processes} process(es), batches of {batch_size}', file=sys.stderr)
+                    elapsed = drain(processes)
+                    done = Job.objects.filter(status=Job.DONE).count()
+                    assert done == args.jobs, (done, args.jobs)
+                    rows.append((f'drain p={processes} batch={batch_size}', {
+                        'jobs_per_s': round(args.jobs / elapsed, 1),
+                        'seconds': round(elapsed, 2),
+                    }))
+
+    print_table(f'Job queue, {args.jobs:,} jobs, handler {args.cost * 1000:g} ms/call + {args.per_job * 1000:g} ms/job', rows)
+
+if __name__ == '__main__':
+    main()
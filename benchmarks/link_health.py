@@ -0,0 +1,74 @@
+'''
+Links per minute of the dead-link sweep (bookmarks.link_health) against the local stand-in
+web server of benchmarks.metadata, which answers every request after --latency seconds.
+
+    python -m benchmarks.link_health [--links 5000] [--domains 500] [--latency 0.05] [--concurrency 10,100,200] [--delay 0]
+
+The bookmarks are spread over --domains domains, so LINK_CHECK_PER_DOMAIN and
+LINK_CHECK_DOMAIN_DELAY (--delay) apply as they would to real links, and the whole sweep runs
+as `manage.py bookmarks_check_links` does: keyset batches, results stored every 100 checks.
+Reported per LINK_CHECK_CONCURRENCY: links per minute, connections opened, rows skipped.
+'''
+import argparse, time
+from ._common import print_table, setup_django, test_database
+from .metadata import StandIn
+
+def seed(base, links, domains):
+    from bookmarks.models import Bookmark, url_hash
+    rows = []
+    for i in range(links):
+        url = f'{base}/{i}'
+        rows.append(Bookmark(
+            title=f'Link {i}', url=url, url_hash=url_hash(url), domain=f'site{i % domains}.example', is_approved=True,
+        ))
+    Bookmark.objects.bulk_create(rows, batch_size=100)
+
+def run(server, concurrency, batch_size):
+    from bookmarks import link_health
+    from bookmarks.models import Bookmark
+    Bookmark.objects.update(link_checked_at=None)
+    server.connections = 0
+    started = time.perf_counter()
+    totals = link_health.sweep(batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    assert not Bookmark.objects.filter(link_dead=True).exists()
+    return {
+        'links_per_min': round(totals.get('checked', 0) / elapsed * 60),
+        'seconds': round(elapsed, 2),
+        'connections': server.connections,
+        'skipped': totals.get('skipped', 0),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--links', type=int, default=5000)
+    parser.add_argument('--domains', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the server takes per request')
+    parser.add_argument('--concurrency', default='10,100,200', help='LINK_CHECK_CONCURRENCY values to try')
+    parser.add_argument('--per-domain', type=int, default=2, help='LINK_CHECK_PER_DOMAIN')
+    parser.add_argument('--delay', type=float, default=0.0, help='LINK_CHECK_DOMAIN_DELAY')
+    parser.add_argument('--batch-size', type=int, default=1000, help='bookmarks_check_links --batch-size')
+    args = parser.parse_args()
+    setup_django()
+
+    from django.test.utils import override_settings
+
+    server = StandIn(args.latency)
+    rows = []
+    with test_database():
+        seed(f'http://127.0.0.1:{server.port}', args.links, args.domains)
+        for concurrency in [int(c) for c in args.concurrency.split(',')]:
+            with override_settings(BOOKMARKS={
+                'LINK_CHECK_CONCURRENCY': concurrency, 'LINK_CHECK_PER_DOMAIN': args.per_domain,
+                'LINK_CHECK_DOMAIN_DELAY': args.delay, 'LINK_CHECK_TIMEOUT': 30.0, 'METADATA_ALLOW_PRIVATE': True,
+            }):
+                rows.append((f'concurrency={concurrency}', run(server, concurrency, args.batch_size)))
+
+    print_table(
+        f'{args.links:,} links over {args.domains} domains, {args.latency * 1000:g} ms per request, '
+        f'{args.per_domain} per domain, {args.delay:g} s apart',
+        rows,
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+URLs per minute of the link metadata fetcher (bookmarks.link_metadata) against a local
+stand-in web server that answers every page after --latency seconds.
+
+    python -m benchmarks.metadata [--urls 2000] [--domains 50] [--latency 0.05] [--concurrency 1,10,100]
+
+The URLs are spread over --domains domains, so METADATA_PER_DOMAIN applies as it would to
+real submissions. Each concurrency level runs twice: with pooled keep-alive connections, and
+with the server closing every connection (a new TCP connection per page). Reported: URLs per
+minute and connections opened.
+'''
+import argparse, asyncio, threading, time
+from ._common import print_table, setup_django
+
+PAGE = b'<html><head><title>Stand-in</title><meta name="description" content="A page"></head><body>' + b'x' * 20000 + b'</body></html>'
+
+class StandIn:
+    '''
+    Minimal HTTP/1.1 server on its own event loop thread (GET and HEAD).
+    '''
+    def __init__(self, latency):
+        self.latency = latency
+        self.close_connections = False
+        self.connections = 0
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.serve, '127.0.0.1', 0, backlog=1024), self.loop,
+        ).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while line := await reader.readline():
+                while (await reader.readline()) not in (b'\r\n', b''):
+                    pass
+                await asyncio.sleep(self.latency)
+                close = b'Connection: close\r\n' if self.close_connections else b''
+                body = b'' if line.startswith(b'HEAD ') else PAGE
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: %d\r\n%s\r\n%s' % (len(PAGE), close, body))
+                await writer.drain()
+                if close:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+def run(server, targets, concurrency, per_domain):
+    from bookmarks import link_metadata
+
+    async def fetch():
+        pool = link_metadata.new_pool(concurrency=concurrency, per_domain=per_domain, allow_private=True)
+        try:
+            return await link_metadata.fetch_all(targets, pool), pool
+        finally:
+            await pool.close()
+
+    server.connections = 0
+    started = time.perf_counter()
+    results, pool = asyncio.run(fetch())
+    elapsed = time.perf_counter() - started
+    errors = [m.error for m in results if m.error]
+    assert not errors, errors[:3]
+    return {
+        'urls_per_min': round(len(targets) / elapsed * 60),
+        'seconds': round(elapsed, 2),
+        'connections': server.connections,
+        'reused': pool.reused,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--urls', type=int, default=2000)
+    parser.add_argument('--domains', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the server takes per page')
+    parser.add_argument('--concurrency', default='1,10,100', help='METADATA_CONCURRENCY values to try')
+    parser.add_argument('--per-domain', type=int, default=4, help='METADATA_PER_DOMAIN')
+    args = parser.parse_args()
+    setup_django()
+
+    from django.test.utils import override_settings
+
+    server = StandIn(args.latency)
+    base = f'http://127.0.0.1:{server.port}'
+    targets = [(f'{base}/{i}', f'site{i % args.domains}.example') for i in range(args.urls)]
+    rows = []
+    with override_settings(BOOKMARKS={'METADATA_TIMEOUT': 30.0}):
+        for concurrency in [int(c) for c in args.concurrency.split(',')]:
+            urls = targets if concurrency > 1 else targets[:max(1, int(5 / args.latency))] # ~5s sequential sample
+            for close in (False, True):
+                server.close_connections = close
+                name = f'concurrency={concurrency} {"new connections" if close else "keep-alive"}'
+                rows.append((name, run(server, urls, concurrency, args.per_domain)))
+
+    print_table(
+        f'{args.urls:,} URLs over {args.domains} domains, {args.latency * 1000:g} ms per page, {args.per_domain} per domain',
+        rows,
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+Size and speed of the near-duplicate index (bookmarks.near_duplicates) with millions of
+signatures, no database involved.
+
+    python -m benchmarks.near_duplicates [--signatures 1000000] [--lookups 2000]
+
+The index is loaded with --signatures random band keys (what unrelated bookmarks look like to
+it) plus a few hundred copies of real articles, then probed with near-duplicate submissions.
+Reported: signature cost per bookmark, load time and memory, lookup latency, and the rate of
+incremental adds (including the periodic merges).
+'''
+import argparse, os, random, time, tracemalloc
+from ._common import percentiles, print_table, setup_django, timed
+
+WORDS = [f'word{i}' for i in range(20000)]
+
+def article(rng):
+    title = ' '.join(rng.sample(WORDS, 8))
+    description = ' '.join(rng.sample(WORDS, 20))
+    path = '-'.join(rng.sample(WORDS, 4))
+    return title, description, path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signatures', type=int, default=1_000_000)
+    parser.add_argument('--articles', type=int, default=500, help='real articles stored, each probed by a copy')
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+    setup_django()
+
+    from bookmarks import near_duplicates
+    from bookmarks.models import LSH_BANDS, bookmark_lsh_bands
+
+    rng = random.Random(1)
+    articles = [article(rng) for _ in range(args.articles)]
+    started = time.perf_counter()
+    stored = [bookmark_lsh_bands(t, d, f'https://blog.example/{p}') for t, d, p in articles]
+    signature_us = (time.perf_counter() - started) / len(articles) * 1e6
+    # Copies on a mirror with a suffixed title: what a reposted article looks like
+    copies = [bookmark_lsh_bands(f'{t} | Mirror', d, f'https://mirror.example/amp/{p}') for t, d, p in articles]
+
+    def rows():
+        for i in range(1, args.signatures + 1):
+            yield i, os.urandom(4 * LSH_BANDS)
+        for i, bands in enumerate(stored, start=args.signatures + 1):
+            yield i, bands
+
+    index = near_duplicates.NearDuplicateIndex()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.load(rows(), args.signatures + len(stored))
+    load_seconds = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    found = sum(bool(index.candidates(bands)) for bands in copies)
+    probes = [copies[i % len(copies)] for i in range(args.lookups)]
+    it = iter(probes)
+    lookups = percentiles(timed(lambda: index.candidates(next(it)), len(probes)))
+
+    extra = near_duplicates.MERGE_AFTER * 3
+    next_id = args.signatures + len(stored) + 1
+    started = time.perf_counter()
+    for i in range(0, extra, 100):
+        index.add((next_id + i + j, os.urandom(4 * LSH_BANDS)) for j in range(100))
+    add_rate = extra / (time.perf_counter() - started)
+
+    print_table(f'{len(index):,} signatures, {LSH_BANDS} bands', [
+        ('signature', {'us_per_bookmark': round(signature_us, 1)}),
+        ('load', {'seconds': round(load_seconds, 2), 'mb': round(memory / 2**20, 1), 'bytes_per_bookmark': round(memory / (args.signatures + len(stored)), 1)}),
+        ('lookup', {**lookups, 'copies_found': f'{found}/{len(copies)}'}),
+        ('add', {'per_second': round(add_rate)}),
+    ])
+
+if __name__ == '__main__':
+    main()
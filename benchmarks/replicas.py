@@ -0,0 +1,145 @@
+'''
+Read throughput against worker count, with a writer submitting at the same time: every read
+on the primary, then spread over SQLite read replicas.
+
+    python -m benchmarks.replicas [--size 5k] [--workers 1 2 4 8] [--replicas 2] [--write-rate 20] [--duration 3]
+
+The seeded database is a file in WAL mode (bookmarks.db pragmas), copied to --replicas files
+that serve as read replicas (BOOKMARKS_READ_REPLICAS). For each mode and worker count, that
+many forked processes loop over list, ?tag= and detail requests through the full Django/DRF
+stack for --duration seconds, while one more process submits --write-rate bookmarks/second.
+The response cache is off and throttle rates are raised out of the way.
+
+Reported: reads/second in total and per worker, read p50/p95, and the writer's successful
+and failed ("database is locked") submissions. With one core the workers share it, so total
+reads/second stays flat; the latencies and writer errors still show the contention.
+'''
+import argparse, multiprocessing, os, random, sys, tempfile, time
+from ._common import percentiles, print_table, setup_django, test_database
+from .suite import parse_size, seed
+
+def _read_loop(args):
+    duration, ids, worker_seed = args
+    from django.test import Client
+    client = Client(REMOTE_ADDR='203.0.113.10')
+    rng = random.Random(worker_seed)
+    samples, errors = [], 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        kind = rng.random()
+        if kind < 0.5:
+            path, params = '/bookmarks/v1/bookmarks/', {}
+        elif kind < 0.7:
+            path, params = '/bookmarks/v1/bookmarks/', {'tag': f'tag-{rng.randint(0, 20)}'}
+        else:
+            path, params = f'/bookmarks/v1/bookmarks/{rng.choice(ids)}/', {}
+        started = time.perf_counter()
+        try:
+            ok = client.get(path, params).status_code == 200
+        except Exception:
+            ok = False
+        samples.append(time.perf_counter() - started)
+        errors += not ok
+    return 'read', samples, errors
+
+def _write_loop(args):
+    duration, rate, worker_seed = args
+    from django.test import Client
+    client = Client(REMOTE_ADDR='203.0.113.20')
+    done = errors = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < duration:
+        if done + errors >= elapsed * rate:
+            time.sleep(0.005)
+            continue
+        try:
+            ok = client.post('/bookmarks/v1/bookmarks/submit/', {
+                'title': f'Submitted {worker_seed} {done + errors}',
+                'url': f'https://submitted.example.org/{worker_seed}/{done + errors}',
+                'description': 'Benchmark submission',
+                'tags': ['tag-1'],
+            }, content_type='application/json').status_code == 201
+        except Exception: # database is locked
+            ok = False
+        done += ok
+        errors += not ok
+    return 'write', done, errors
+
+def _run(task):
+    role, args = task
+    return _read_loop(args) if role == 'read' else _write_loop(args)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', default='5k', help='bookmarks to seed, e.g. 5k')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='reader process counts')
+    parser.add_argument('--replicas', type=int, default=2)
+    parser.add_argument('--write-rate', type=float, default=20, help='submissions/second during every run')
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per run')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        replicas = [os.path.join(tmp, f'replica{i}.sqlite3') for i in range(1, args.replicas + 1)]
+        os.environ['BOOKMARKS_READ_REPLICAS'] = ','.join(replicas) # read by config.settings
+        setup_django()
+
+        from django.db import connection, connections
+        from django.test.utils import override_settings, setup_test_environment
+        from rest_framework.throttling import SimpleRateThrottle
+        from bookmarks import db, search
+        from bookmarks.models import Bookmark
+
+        setup_test_environment() # allows the 'testserver' host
+        SimpleRateThrottle.THROTTLE_RATES = {scope: '1000000000/day' for scope in SimpleRateThrottle.THROTTLE_RATES}
+        aliases = [alias for alias in connections if alias != 'default']
+        primary = os.path.join(tmp, 'primary.sqlite3')
+        connection.settings_dict['TEST'] = {**connection.settings_dict.get('TEST', {}), 'NAME': primary}
+
+        with test_database():
+            size = parse_size(args.size)
+            print(f'Seeding {size:,} bookmarks', file=sys.stderr)
+            seed(0, size, random.Random(args.seed))
+            search.rebuild()
+            ids = list(Bookmark.objects.filter(is_approved=True).values_list('id', flat=True)[:1000])
+            for path in replicas:
+                db.copy_database(primary, path)
+
+            ctx = multiprocessing.get_context('fork')
+            rows = []
+            for mode, read_replicas in (('primary', []), ('replicas', aliases)):
+                with override_settings(BOOKMARKS={
+                    'RESPONSE_CACHE': False,
+                    'METRICS': False,
+                    'SUBMIT_JOBS': [],
+                    'READ_REPLICAS': read_replicas,
+                    'THROTTLE_STORE': 'bookmarks.throttle_store.SQLiteThrottleStore',
+                    'THROTTLE_STORE_OPTIONS': {'path': os.path.join(tmp, 'throttle.sqlite3')},
+                }):
+                    for workers in args.workers:
+                        connections.close_all() # children open their own
+                        tasks = [('read', (args.duration, ids, args.seed + i)) for i in range(workers)]
+                        tasks.append(('write', (args.duration, args.write_rate, f'{mode}-{workers}')))
+                        with ctx.Pool(len(tasks)) as pool:
+                            results = pool.map(_run, tasks)
+                        samples = [s for role, got, _ in results if role == 'read' for s in got]
+                        read_errors = sum(errors for role, _, errors in results if role == 'read')
+                        (_, written, write_errors), = [r for r in results if r[0] == 'write']
+                        stats = percentiles(samples)
+                        rows.append((f'{mode} x{workers}', {
+                            'reads_per_s': round(len(samples) / args.duration),
+                            'per_worker': round(len(samples) / args.duration / workers),
+                            'p50_us': stats['p50_us'],
+                            'p95_us': stats['p95_us'],
+                            'read_errors': read_errors,
+                            'writes': written,
+                            'write_errors': write_errors,
+                        }))
+
+    print_table(
+        f'{size:,} bookmarks, {args.replicas} replica(s), writer at {args.write_rate:g}/s, {args.duration:g}s per run',
+        rows,
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Cost of turning a page of bookmarks into response bytes.
+
+    python -m benchmarks.serialization [--sizes 10 100 1000] [--repeat 50]
+
+- drf: queryset.prefetch_related('tags') -> BookmarkReadSerializer(many=True) -> JSONRenderer
+- fast: .values() rows + one tag query -> bookmarks.fastread.serialize -> FastJSONRenderer
+
+Both paths include their queries; the output bytes are checked to be identical.
+'''
+import argparse, random
+from datetime import timedelta
+from ._common import percentiles, print_table, setup_django, test_database, timed
+
+def _seed(rows):
+    from django.utils import timezone
+    from bookmarks import bulk
+    from bookmarks.models import Bookmark, Tag, url_domain, url_hash
+    tags = Tag.objects.bulk_create([Tag(name=f'Tag {i}', slug=f'tag-{i}') for i in range(50)])
+    now = timezone.now()
+    bookmarks = Bookmark.objects.bulk_create([
+        Bookmark(
+            title=f'Bookmark {i} – ünïcode',
+            url=f'https://example{i % 97}.com/{i}',
+            domain=url_domain(f'https://example{i % 97}.com/{i}'),
+            url_hash=url_hash(f'https://example{i % 97}.com/{i}'),
+            description='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 3,
+            is_approved=True,
+            created_at=now - timedelta(minutes=i),
+        )
+        for i in range(rows)
+    ])
+    rng = random.Random(1)
+    bulk.attach_tags((b.id, t.id) for b in bookmarks for t in rng.sample(tags, 3))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+    from bookmarks import fastread
+    from bookmarks.models import Bookmark
+    from bookmarks.renderers import FastJSONRenderer, orjson
+    from bookmarks.serializers import BookmarkReadSerializer
+
+    with test_database():
+        _seed(max(args.sizes))
+        queryset = Bookmark.objects.filter(is_approved=True).order_by('-created_at', '-id')
+        drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+
+        def drf(size):
+            return drf_renderer.render(BookmarkReadSerializer(queryset.prefetch_related('tags')[:size], many=True).data)
+
+        def fast(size):
+            return fast_renderer.render(fastread.serialize(list(fastread.values(queryset)[:size])))
+
+        for size in args.sizes:
+            assert drf(size) == fast(size), 'fast path output differs'
+            slow_stats = percentiles(timed(lambda: drf(size), args.repeat))
+            fast_stats = percentiles(timed(lambda: fast(size), args.repeat))
+            fast_stats['speedup'] = f"{slow_stats['p50_us'] / fast_stats['p50_us']:.1f}x"
+            print_table(
+                f"PAGE_SIZE={size} ({'orjson' if orjson else 'stdlib json'})",
+                [('drf', slow_stats), ('fast', fast_stats)],
+            )
+
+if __name__ == '__main__':
+    main()
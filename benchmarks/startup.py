@@ -0,0 +1,122 @@
+'''
+Cold start and per-request overhead of the full site (config.wsgi) against the API-only
+profile (config.wsgi_api, config.settings_api).
+
+    python -m benchmarks.startup [--runs 10] [--requests 2000] [--size 1k]
+
+- startup: wall time of a fresh interpreter importing the entry point and loading the URLconf
+  (median of --runs), and the number of modules it imported
+- requests: p50/p95 of health (no database), list and detail requests through the entry
+  point's WSGI application, against a throwaway test database seeded with --size bookmarks
+
+Each profile runs in its own processes, so neither inherits the other's imports. The response
+cache is off and throttle rates are raised out of the way (their checks still run).
+'''
+import argparse, json, os, random, statistics, subprocess, sys, time
+from ._common import percentiles, print_table
+
+PROFILES = [('full', 'config.wsgi'), ('api', 'config.wsgi_api')]
+
+STARTUP = '''
+import sys, time
+started = time.perf_counter()
+import {entry}
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - started, len(sys.modules))
+'''
+
+def _env():
+    env = dict(os.environ)
+    env.pop('DJANGO_SETTINGS_MODULE', None) # each entry point picks its own
+    return env
+
+def measure_startup(entry, runs):
+    walls, imports, modules = [], [], 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, '-c', STARTUP.format(entry=entry)], env=_env(), capture_output=True, text=True, check=True,
+        ).stdout.split()
+        walls.append(time.perf_counter() - started)
+        imports.append(float(out[0]))
+        modules = int(out[1])
+    return {
+        'process_ms': round(statistics.median(walls) * 1000, 1),
+        'import_and_setup_ms': round(statistics.median(imports) * 1000, 1),
+        'modules': modules,
+    }
+
+def serve(entry, requests, size):
+    '''
+    Child process: time requests through `entry`'s WSGI application; prints JSON results.
+    '''
+    import importlib, io, tempfile
+    application = importlib.import_module(entry).application
+
+    from django.conf import settings
+    from django.test.utils import override_settings, setup_test_environment
+    from rest_framework.throttling import SimpleRateThrottle
+    from bookmarks.models import Bookmark
+    from ._common import test_database, timed
+    from .suite import seed
+
+    setup_test_environment() # allows the 'testserver' host
+    SimpleRateThrottle.THROTTLE_RATES = {scope: '1000000000/day' for scope in SimpleRateThrottle.THROTTLE_RATES}
+
+    def get(path, query=''):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'REMOTE_ADDR': '203.0.113.10',
+            'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+        }
+        status = []
+        body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+        b''.join(body)
+        body.close()
+        assert status[0].startswith('200'), (path, status)
+
+    with tempfile.TemporaryDirectory() as tmp, test_database(), override_settings(BOOKMARKS={
+        **settings.BOOKMARKS,
+        'RESPONSE_CACHE': False,
+        'THROTTLE_STORE_OPTIONS': {'path': os.path.join(tmp, 'throttle.sqlite3')},
+    }):
+        rng = random.Random(1)
+        seed(0, size, rng)
+        ids = list(Bookmark.objects.filter(is_approved=True).values_list('id', flat=True)[:1000])
+        get('/bookmarks/v1/health/') # warm up
+        detail = iter(rng.choice(ids) for _ in range(requests))
+        results = {
+            'health': percentiles(timed(lambda: get('/bookmarks/v1/health/'), requests)),
+            'list': percentiles(timed(lambda: get('/bookmarks/v1/bookmarks/'), requests)),
+            'detail': percentiles(timed(lambda: get(f'/bookmarks/v1/bookmarks/{next(detail)}/'), requests)),
+        }
+    print(json.dumps(results))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes per entry point')
+    parser.add_argument('--requests', type=int, default=2000, help='timed requests per endpoint')
+    parser.add_argument('--size', default='1k', help='bookmarks to seed, e.g. 1k')
+    parser.add_argument('--serve', help=argparse.SUPPRESS) # child process mode
+    args = parser.parse_args()
+
+    from .suite import parse_size
+    if args.serve:
+        return serve(args.serve, args.requests, parse_size(args.size))
+
+    startup, requests = [], []
+    for name, entry in PROFILES:
+        startup.append((f'{name} ({entry})', measure_startup(entry, args.runs)))
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.startup', '--serve', entry, '--requests', str(args.requests), '--size', args.size],
+            env=_env(), capture_output=True, text=True, check=True,
+        ).stdout
+        for endpoint, stats in json.loads(out.splitlines()[-1]).items():
+            requests.append((f'{name} {endpoint}', {k: stats[k] for k in ('p50_us', 'p95_us', 'mean_us')}))
+
+    print_table(f'Startup, median of {args.runs} fresh processes', startup)
+    print_table(f'Requests through the WSGI application, {args.requests} per endpoint', requests)
+
+if __name__ == '__main__':
+    main()
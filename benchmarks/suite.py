@@ -0,0 +1,274 @@
+'''
+End-to-end benchmarks for the API hot paths, with a regression gate.
+
+    python -m benchmarks.suite [--sizes 1k 100k 1m] [--requests 200] [--output bench.json]
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.25]
+
+Every size is seeded into a throwaway test database with bulk inserts (about 10% of the
+rows unapproved, 1-5 tags each drawn from a skewed distribution over 200 tags), and each
+scenario goes through the full Django/DRF stack via the test client:
+
+- list, list_tag, list_search, list_deep (cursor halfway down), list_deep_page (legacy ?page=)
+- list_sparse (?fields=id,url,title: no description column, no tags query)
+- list_not_modified (If-None-Match with the current ETag)
+- detail, submit
+- approve_selected (the admin action, on batches of --approve-batch pending rows)
+
+Recorded per scenario: p50/p95/p99 latency, SQL queries for one request and peak Python
+allocations (tracemalloc) for one request. The response cache is off and throttle rates are
+raised out of the way (their checks still run), so every request does its real work.
+
+--compare exits with status 1 when a scenario present in both files got slower than the
+baseline by more than --threshold (p50 or p95), allocates that much more, or runs more queries.
+'''
+import argparse, json, platform, random, sqlite3, subprocess, sys, time, tracemalloc
+from datetime import timedelta
+from ._common import percentiles, print_table, setup_django, test_database
+
+WORDS = (
+    'python django rest api async cache database index query performance postgres sqlite '
+    'testing deploy docker linux security auth http json parser compiler rust go web '
+    'frontend css design tutorial guide release notes benchmark profiling memory'
+).split()
+TAGS = 200
+BATCH = 5000
+
+def parse_size(text):
+    text = text.lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+def _sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+def seed(start, stop, rng):
+    '''
+    Bulk-insert bookmarks number `start`..`stop`-1 with their tags; returns nothing, prints progress.
+    '''
+    from django.utils import timezone
+    from bookmarks import bulk
+    from bookmarks.models import Bookmark, Tag, url_domain, url_hash
+
+    tags = list(Tag.objects.order_by('id'))
+    if not tags:
+        tags = Tag.objects.bulk_create([Tag(name=f'Tag {i:03}', slug=f'tag-{i}') for i in range(TAGS)])
+    weights = [1 / (i + 1) for i in range(len(tags))] # a few popular tags, a long tail
+
+    epoch = timezone.now() - timedelta(days=3 * 365)
+    for chunk_start in range(start, stop, BATCH):
+        rows = []
+        for i in range(chunk_start, min(stop, chunk_start + BATCH)):
+            url = f'https://site{i % 5000}.example.com/{i}/{rng.choice(WORDS)}'
+            rows.append(Bookmark(
+                title=_sentence(rng, rng.randint(3, 8)).capitalize(),
+                url=url,
+                domain=url_domain(url),
+                url_hash=url_hash(url),
+                description=_sentence(rng, rng.randint(10, 40)),
+                is_approved=rng.random() >= 0.1,
+                created_at=epoch + timedelta(seconds=i * 30 + rng.randint(0, 29)),
+            ))
+        Bookmark.objects.bulk_create(rows)
+        bulk.attach_tags(
+            (b.id, t.id)
+            for b in rows
+            for t in set(rng.choices(tags, weights, k=rng.randint(1, 5)))
+        )
+        print(f'  seeded {min(stop, chunk_start + BATCH):,}/{stop:,}', end='\r', file=sys.stderr)
+    print(file=sys.stderr)
+
+def _measure(fn, n, setup=None, warmup=5):
+    '''
+    Latency percentiles over `n` calls, plus queries and peak allocations of one extra call.
+    `setup` (untimed) returns the argument for each call.
+    '''
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    setup = setup or (lambda: None)
+    for _ in range(warmup):
+        fn(setup())
+
+    samples = []
+    for _ in range(n):
+        arg = setup()
+        started = time.perf_counter()
+        fn(arg)
+        samples.append(time.perf_counter() - started)
+    stats = percentiles(samples)
+
+    arg = setup()
+    with CaptureQueriesContext(connection) as queries:
+        fn(arg)
+    stats['queries'] = len(queries)
+
+    arg = setup()
+    tracemalloc.start()
+    try:
+        fn(arg)
+        stats['alloc_peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return stats
+
+def run_scenarios(size, n, approve_batch, rng):
+    from django.contrib.auth import get_user_model
+    from django.contrib.messages.storage.base import BaseStorage
+    from django.test import Client, RequestFactory
+    from bookmarks.admin import BookmarkAdmin
+    from bookmarks.models import Bookmark, url_hash
+    from bookmarks.pagination import KeysetPagination
+    from django.contrib import admin
+
+    client = Client(REMOTE_ADDR='203.0.113.10')
+
+    def get(url, params=None, status=200, **headers):
+        response = client.get(url, params or {}, **headers)
+        assert response.status_code == status, (url, response.status_code)
+        return response
+
+    approved = Bookmark.objects.filter(is_approved=True)
+    halfway = approved.count() // 2
+    middle = approved.order_by('-created_at', '-id').values_list('created_at', 'id')[halfway]
+    deep_cursor = KeysetPagination().encode_cursor(list(middle), reverse=False)
+    ids = list(approved.values_list('id', flat=True)[:1000])
+    etag = get('/bookmarks/v1/bookmarks/')['ETag']
+
+    results = {
+        'list': _measure(lambda _: get('/bookmarks/v1/bookmarks/'), n),
+        'list_tag': _measure(lambda tag: get('/bookmarks/v1/bookmarks/', {'tag': tag}), n, setup=lambda: f'tag-{rng.randint(0, 20)}'),
+        'list_search': _measure(lambda word: get('/bookmarks/v1/bookmarks/', {'search': word}), n, setup=lambda: rng.choice(WORDS)),
+        'list_deep': _measure(lambda _: get('/bookmarks/v1/bookmarks/', {'cursor': deep_cursor}), n),
+        'list_sparse': _measure(lambda _: get('/bookmarks/v1/bookmarks/', {'fields': 'id,url,title'}), n),
+        'list_deep_page': _measure(lambda _: get('/bookmarks/v1/bookmarks/', {'page': halfway // 10}), max(5, n // 10)),
+        'detail': _measure(lambda id_: get(f'/bookmarks/v1/bookmarks/{id_}/'), n, setup=lambda: rng.choice(ids)),
+        # A poller revalidating its copy: 304 from the data version alone
+        'list_not_modified': _measure(lambda etag: get('/bookmarks/v1/bookmarks/', status=304, HTTP_IF_NONE_MATCH=etag), n, setup=lambda: etag),
+    }
+
+    counter = iter(range(10**9))
+    def submit(i):
+        response = client.post('/bookmarks/v1/bookmarks/submit/', {
+            'title': f'Submitted {i}',
+            'url': f'https://submitted.example.org/{size}/{i}',
+            'description': _sentence(rng, 12),
+            'tags': ['tag-1', 'tag-2', 'brand-new'],
+        }, content_type='application/json')
+        assert response.status_code == 201, response.content
+    results['submit'] = _measure(submit, n, setup=lambda: next(counter))
+
+    # approve_selected works on fresh pending rows each time; creating them is not timed
+    moderator = get_user_model().objects.get_or_create(username='bench-admin', defaults={'is_staff': True, 'is_superuser': True})[0]
+    model_admin = BookmarkAdmin(Bookmark, admin.site)
+    request = RequestFactory().post('/admin/bookmarks/bookmark/')
+    request.user = moderator
+    request._messages = BaseStorage(request)
+
+    def pending_batch():
+        urls = [f'https://pending.example.org/{size}/{next(counter)}' for _ in range(approve_batch)]
+        batch = [Bookmark(title='Pending', url=url, url_hash=url_hash(url), description='', is_approved=False) for url in urls]
+        Bookmark.objects.bulk_create(batch)
+        return Bookmark.objects.filter(id__in=[b.id for b in batch])
+    results['approve_selected'] = _measure(lambda qs: model_admin.approve_selected(request, qs), max(5, n // 10), setup=pending_batch)
+    return results
+
+def compare(baseline, current, threshold):
+    '''
+    List of human-readable regressions of `current` against `baseline` (same JSON layout).
+    '''
+    regressions = []
+    for size, scenarios in current['results'].items():
+        for name, stats in scenarios.items():
+            base = baseline.get('results', {}).get(size, {}).get(name)
+            if not base:
+                continue
+            for metric in ('p50_us', 'p95_us', 'alloc_peak_kib'):
+                if base.get(metric) and stats[metric] > base[metric] * (1 + threshold):
+                    regressions.append(f'{size} {name}: {metric} {base[metric]} -> {stats[metric]} (+{stats[metric] / base[metric] - 1:.0%})')
+            if stats['queries'] > base.get('queries', stats['queries']):
+                regressions.append(f"{size} {name}: queries {base['queries']} -> {stats['queries']}")
+    return regressions
+
+def _environment():
+    import django
+    from django.db import connection
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ''
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': revision,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'sqlite': sqlite3.sqlite_version,
+        'orjson': getattr(orjson, '__version__', None),
+        'machine': platform.machine(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['1k'], help='dataset sizes, e.g. 1k 100k 1m')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--approve-batch', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='fail if results regress against this file')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+    setup_django()
+
+    import tempfile
+    from django.test.utils import override_settings, setup_test_environment
+    from rest_framework.throttling import SimpleRateThrottle
+    from bookmarks import search
+
+    setup_test_environment() # allows the test client's 'testserver' host
+    # Keep the throttle checks on the path, but never let them reject
+    SimpleRateThrottle.THROTTLE_RATES = {scope: '1000000000/day' for scope in SimpleRateThrottle.THROTTLE_RATES}
+    rng = random.Random(args.seed)
+    report = {'environment': _environment(), 'requests': args.requests, 'results': {}}
+
+    with tempfile.TemporaryDirectory() as tmp, test_database():
+        bookmarks_settings = {
+            'RESPONSE_CACHE': False,
+            'CONDITIONAL_GET': True, # one process, so its LocMem data version is the only one
+            'THROTTLE_STORE': 'bookmarks.throttle_store.SQLiteThrottleStore',
+            'THROTTLE_STORE_OPTIONS': {'path': f'{tmp}/throttle.sqlite3'},
+        }
+        with override_settings(BOOKMARKS=bookmarks_settings):
+            seeded = 0
+            for label in sorted(args.sizes, key=parse_size):
+                size = parse_size(label)
+                print(f'Seeding {size:,} bookmarks', file=sys.stderr)
+                started = time.perf_counter()
+                seed(seeded, size, rng)
+                search.rebuild()
+                seeded = size
+                print(f'  done in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+                results = run_scenarios(size, args.requests, args.approve_batch, rng)
+                report['results'][label] = results
+                print_table(f'{size:,} bookmarks', list(results.items()))
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nWrote {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) against {args.compare}:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'No regressions against {args.compare} (threshold {args.threshold:.0%})')
+
+if __name__ == '__main__':
+    main()
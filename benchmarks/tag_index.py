@@ -0,0 +1,66 @@
+'''
+Latency of multi-tag pages from the in-memory tag index, on a synthetic corpus.
+
+    python -m benchmarks.tag_index [--bookmarks 1000000] [--tags 200] [--queries 2000]
+
+Rows are generated in memory and fed to TagIndex.load() (no database), so this measures
+the index itself: build time, memory, and page() for AND/OR queries at the top of the
+list and halfway down (cursor seek).
+'''
+import argparse, random, time, tracemalloc
+from datetime import datetime, timedelta, timezone as dt_timezone
+from ._common import percentiles, print_table, setup_django, timed
+
+def _rows(bookmarks, tags, rng):
+    base = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+    weights = [1 / (i + 1) for i in range(tags)] # a few popular tags, a long tail
+    for bookmark_id in range(1, bookmarks + 1):
+        created_at = base + timedelta(seconds=bookmark_id * 60)
+        for tag_id in sorted(set(rng.choices(range(1, tags + 1), weights, k=rng.randint(1, 5)))):
+            yield tag_id, bookmark_id, created_at
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookmarks', type=int, default=1_000_000)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+    setup_django()
+    from bookmarks.tag_index import TagIndex
+
+    rng = random.Random(1)
+    rows = list(_rows(args.bookmarks, args.tags, rng))
+    slug_ids = {f't{i}': i for i in range(1, args.tags + 1)}
+    started = time.perf_counter()
+    TagIndex().load(rows, slug_ids, max_id=args.bookmarks)
+    elapsed = time.perf_counter() - started
+
+    index = TagIndex()
+    tracemalloc.start() # second load just to measure memory (tracemalloc slows it down)
+    index.load(rows, slug_ids, max_id=args.bookmarks)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    sizes = sorted(((len(ids), f't{t}') for t, ids in index.postings.items()), reverse=True)
+    print(f'Loaded {len(rows):,} (bookmark, tag) pairs in {elapsed:.2f}s, ~{memory / 2**20:.0f} MiB; '
+          f'largest postings: {", ".join(f"{s}={n:,}" for n, s in sizes[:3])}')
+
+    middle = index._key(args.bookmarks // 2)
+    limit = args.page_size + 1
+    cases = {
+        'all: 2 popular': (['t1', 't2'], 'all', None),
+        'all: popular + rare': (['t1', f't{args.tags // 2}'], 'all', None),
+        'all: 3 popular, deep': (['t1', 't2', 't3'], 'all', middle),
+        'any: 3 popular': (['t1', 't2', 't3'], 'any', None),
+        'any: 3 rare, deep': ([f't{args.tags - i}' for i in range(3)], 'any', middle),
+    }
+    rows_out = []
+    for name, (slugs, match, after) in cases.items():
+        found = index.page(slugs, match, after=after, limit=limit)
+        stats = percentiles(timed(lambda: index.page(slugs, match, after=after, limit=limit), args.queries))
+        stats['ids'] = len(found)
+        rows_out.append((name, stats))
+    print_table(f'page(limit={limit}) over {args.bookmarks:,} bookmarks', rows_out)
+
+if __name__ == '__main__':
+    main()
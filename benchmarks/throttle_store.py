@@ -0,0 +1,64 @@
+'''
+Per-check latency of the throttle stores, and correctness across worker processes.
+
+    python -m benchmarks.throttle_store [--checks 20000] [--workers 4]
+
+- locmem: CacheThrottleStore over LocMemCache (per-process; counts diverge across workers)
+- sqlite: SQLiteThrottleStore (WAL file shared by every worker on the host)
+'''
+import argparse, multiprocessing, os, tempfile, time
+from ._common import percentiles, print_table, setup_django, timed
+
+def _stores(path):
+    from django.core.cache.backends.locmem import LocMemCache
+    from bookmarks.throttling import CacheThrottleStore
+    from bookmarks.throttle_store import SQLiteThrottleStore
+    return {
+        'locmem': CacheThrottleStore(LocMemCache('throttle-bench', {})),
+        'sqlite': SQLiteThrottleStore(path),
+    }
+
+def _check_loop(name, path, checks, keys):
+    store = _stores(path)[name]
+    i = iter(range(checks))
+    return timed(lambda: store.hit(f'throttle_bench_{next(i) % keys}', time.time(), 60, 10**9), checks)
+
+def _worker(args):
+    name, path, checks, limit = args
+    store = _stores(path)[name]
+    now = time.time()
+    return sum(store.hit('throttle_bench_shared', now, 3600, limit)[0] for _ in range(checks))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=20000)
+    parser.add_argument('--keys', type=int, default=1000, help='distinct client ids')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    setup_django()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'throttle.sqlite3')
+
+        rows = [(name, percentiles(_check_loop(name, path, args.checks, args.keys))) for name in ('locmem', 'sqlite')]
+        print_table(f'Single process, {args.checks} checks over {args.keys} keys', rows)
+
+        # Every worker hammers one client key; a shared store must allow exactly `limit` in total
+        limit = args.checks // 10
+        per_worker = limit
+        ctx = multiprocessing.get_context('fork')
+        rows = []
+        for name in ('locmem', 'sqlite'):
+            started = time.perf_counter()
+            with ctx.Pool(args.workers) as pool:
+                allowed = sum(pool.map(_worker, [(name, path + '.mp', per_worker, limit)] * args.workers))
+            elapsed = time.perf_counter() - started
+            rows.append((name, {
+                'limit': limit,
+                'allowed_total': allowed,
+                'checks_per_s': round(per_worker * args.workers / elapsed),
+            }))
+        print_table(f'{args.workers} worker processes sharing one client key', rows)
+
+if __name__ == '__main__':
+    main()
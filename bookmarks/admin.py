@@ -1,7 +1,62 @@
 from django.contrib import admin
+from django.db.models import Q
 from django.utils import timezone, formats
+from django.utils.html import format_html
 from zoneinfo import ZoneInfo
-from .models import Tag, Bookmark
+from . import bulk, domain_counts, jobs, link_metadata
+from .models import Tag, Bookmark, Job, LinkMetadata, bookmark_lsh_bands
+from .signals import bookmarks_changed
+
+class DomainFilter(admin.SimpleListFilter):
+    '''
+    The busiest domains, read from the DomainStat rollup instead of a SELECT DISTINCT over every bookmark.
+    '''
+    title = 'domain'
+    parameter_name = 'domain'
+    limit = 50
+
+    def lookups(self, request, model_admin):
+        domains = domain_counts.top_domains(self.limit, field='total_count')
+        if self.value() and self.value() not in domains:
+            domains.append(self.value()) # keep a selected domain listed
+        return [(d, d) for d in domains]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(domain=self.value())
+        return queryset
+
+class NearDuplicateFilter(admin.SimpleListFilter):
+    '''
+    Bookmarks flagged as near duplicates at submission (see bookmarks.near_duplicates), or one
+    group: ?near_duplicates=<id> lists bookmark <id> and everything flagged as its copy.
+    '''
+    title = 'near duplicates'
+    parameter_name = 'near_duplicates'
+
+    def lookups(self, request, model_admin):
+        return [('flagged', 'Flagged')]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value == 'flagged':
+            return queryset.filter(near_duplicate_of__isnull=False)
+        if value and value.isdigit():
+            return queryset.filter(Q(id=value) | Q(near_duplicate_of=value))
+        return queryset
+
+class LinkMetadataInline(admin.StackedInline):
+    '''
+    What the page says about itself, next to what the submitter typed.
+    '''
+    model = LinkMetadata
+    fields = ('title', 'description', 'final_url', 'canonical_url', 'status_code', 'content_type', 'error', 'fetched_at')
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 # Register your models here.
 @admin.register(Tag)
@@ -12,31 +67,101 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Bookmark)
 class BookmarkAdmin(admin.ModelAdmin):
-    list_display = ('title', 'domain', 'is_approved', 'created_local')
-    list_filter = ('is_approved', 'domain', 'tags')
+    list_display = ('title', 'fetched_title', 'domain', 'near_duplicate', 'is_approved', 'created_local')
+    list_select_related = ('metadata',)
+    list_filter = ('is_approved', NearDuplicateFilter, 'link_dead', DomainFilter, 'tags')
     search_fields = ('title', 'url', 'description')
-    readonly_fields = ('submitted_ip', 'created_at', 'approved_at', 'approved_by', 'pending_tags')
+    readonly_fields = (
+        'submitted_ip', 'created_at', 'approved_at', 'approved_by', 'pending_tags',
+        'link_status', 'link_error', 'link_latency_ms', 'link_checked_at', 'link_failures', 'link_dead',
+        'near_duplicate_of',
+    )
     autocomplete_fields = ('tags',)
     date_hierarchy = 'created_at'
     list_per_page = 50
+    inlines = [LinkMetadataInline]
 
-    # Attach bulk action
-    actions = ['approve_selected']
+    # Attach bulk actions
+    actions = ['approve_selected', 'reject_selected', 'use_fetched_metadata', 'fetch_metadata', 'not_near_duplicates']
 
     @admin.display(description='Created (CT)', ordering='-created_at')
     def created_local(self, obj):
         dt = timezone.localtime(obj.created_at, ZoneInfo('America/Chicago'))
         return formats.date_format(dt, 'DATETIME_FORMAT')
 
-    @admin.action(description='Approve selected bookmarks')
-    def approve_selected(self, request, queryset):
-        # Approve bookmarks in bulk
-        now = timezone.now()
-        to_update = queryset.exclude(is_approved=True)
-        updated = to_update.update(
-            is_approved=True,
-            approved_at=now,
-            approved_by=request.user,
+    @admin.display(description='Fetched title')
+    def fetched_title(self, obj):
+        metadata = getattr(obj, 'metadata', None)
+        if metadata is None:
+            return '-'
+        return metadata.title or metadata.error or '-'
+
+    @admin.display(description='Near duplicate of')
+    def near_duplicate(self, obj):
+        if obj.near_duplicate_of_id is None:
+            return '-'
+        return format_html(
+            '<a href="?{}={}">group #{}</a>', NearDuplicateFilter.parameter_name, obj.near_duplicate_of_id, obj.near_duplicate_of_id,
         )
+
+    @admin.action(description='Approve selected bookmarks (and create their pending tags)')
+    def approve_selected(self, request, queryset):
+        # Approve in bulk; pending tags become real tags (see bulk.approve_bookmarks)
+        ids, created = bulk.approve_bookmarks(queryset, user=request.user)
+        message = f'Approved {len(ids)} bookmark(s).'
+        if created:
+            message += f' Created {len(created)} tag(s): {", ".join(sorted(created))}.'
         # Give feedback to admin UI
-        self.message_user(request, f'Approved {updated} bookmark(s).')
\ No newline at end of file
+        self.message_user(request, message)
+
+    @admin.action(description='Reject (delete) selected bookmarks', permissions=['delete'])
+    def reject_selected(self, request, queryset):
+        ids = bulk.reject_bookmarks(queryset)
+        self.message_user(request, f'Rejected {len(ids)} bookmark(s).')
+
+    @admin.action(description='Replace title and description with the fetched ones', permissions=['change'])
+    def use_fetched_metadata(self, request, queryset):
+        changed = []
+        for bookmark in queryset.filter(metadata__error='').exclude(metadata__title='').select_related('metadata'):
+            bookmark.title = bookmark.metadata.title[:Bookmark._meta.get_field('title').max_length]
+            bookmark.description = (bookmark.metadata.description or bookmark.description)[:Bookmark._meta.get_field('description').max_length]
+            bookmark.lsh_bands = bookmark_lsh_bands(bookmark.title, bookmark.description, bookmark.url)
+            changed.append(bookmark)
+        Bookmark.objects.bulk_update(changed, ['title', 'description', 'lsh_bands'])
+        # bulk_update() skips model signals: reindex search, refresh cached pages
+        bookmarks_changed.send(sender=Bookmark, ids=[b.id for b in changed], action='edited')
+        self.message_user(request, f'Updated {len(changed)} bookmark(s) from their fetched metadata.')
+
+    @admin.action(description='Fetch link metadata again (background job)')
+    def fetch_metadata(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
+        jobs.enqueue_many(link_metadata.JOB_KIND, [({'id': i}, None) for i in ids])
+        self.message_user(request, f'Queued {len(ids)} bookmark(s) for fetching.')
+
+    @admin.action(description='Not near duplicates: remove from their group', permissions=['change'])
+    def not_near_duplicates(self, request, queryset):
+        updated = queryset.filter(near_duplicate_of__isnull=False).update(near_duplicate_of=None)
+        self.message_user(request, f'Removed {updated} bookmark(s) from their near-duplicate group.')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    '''
+    Background jobs (see bookmarks.jobs); mostly for looking at failures and retrying them.
+    '''
+    list_display = ('id', 'kind', 'status', 'attempts', 'run_at', 'finished_at', 'short_error')
+    list_filter = ('status',)
+    search_fields = ('kind', 'key')
+    readonly_fields = [f.name for f in Job._meta.fields]
+    list_per_page = 100
+    actions = ['retry_selected']
+
+    @admin.display(description='Last error')
+    def short_error(self, obj):
+        return obj.last_error[:80]
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_selected(self, request, queryset):
+        updated = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None, locked_by='',
+        )
+        self.message_user(request, f'Queued {updated} job(s) again.')
\ No newline at end of file
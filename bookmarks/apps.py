@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class BookmarksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookmarks'
+
+    def ready(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+        from . import checks, db, metrics, signals # noqa: F401 (connects receivers and registers checks)
+
+        # SQLite pragmas (WAL, ...) on every connection
+        connection_created.connect(db.configure)
+        for connection in connections.all(initialized_only=True):
+            db.configure(connection)
+
+        # Time SQL for request metrics on every connection, including ones opened later
+        connection_created.connect(metrics.install)
+        for connection in connections.all():
+            metrics.install(connection)
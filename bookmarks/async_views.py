@@ -0,0 +1,171 @@
+'''
+Native async versions of the public read endpoints (health, list, detail) for ASGI servers.
+
+Selected with BOOKMARKS['ASYNC_VIEWS'] (see bookmarks.urls). Each view is the DRF view from
+bookmarks.views with an async dispatch on top, so filters, keyset pagination, throttles,
+X-RateLimit-* headers, the response cache and the rendered bytes are all the same. The
+difference is that nothing here blocks the event loop: queries go through the async ORM,
+throttle and cache round-trips are awaited, and the response is rendered in the view so
+Django does not need another thread hop to render it.
+'''
+import inspect
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+from django.template.response import SimpleTemplateResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.response import Response
+from . import conf, db, fastread, views
+from . import cache as response_cache
+
+class AsyncAPIViewMixin:
+    '''
+    Async dispatch for DRF views: content negotiation, permissions, throttles, handler and
+    error handling as in APIView.dispatch(), with awaitable throttles and handlers.
+
+    Authentication is skipped (the endpoints are public and throttled by client IP), so no
+    session or user lookup ever runs on the event loop.
+    '''
+    def get_authenticators(self):
+        return []
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        # The async ORM's threads inherit the replica choice (see bookmarks.db)
+        with db.replica_reads(request):
+            try:
+                self.format_kwarg = self.get_format_suffix(**kwargs)
+                request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+                self.check_permissions(request)
+                await self.acheck_throttles(request)
+
+                if request.method.lower() in self.http_method_names:
+                    handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+                else:
+                    handler = self.http_method_not_allowed
+                response = handler(request, *args, **kwargs)
+                if inspect.isawaitable(response): # options() and friends are inherited sync methods
+                    response = await response
+            except Exception as exc:
+                response = self.handle_exception(exc)
+
+            self.response = self.finalize_response(request, response, *args, **kwargs)
+            return await self.arender(self.response)
+
+    async def acheck_throttles(self, request):
+        throttle_durations = []
+        for throttle in self.get_throttles():
+            if not await throttle.aallow_request(request, self):
+                throttle_durations.append(throttle.wait())
+
+        if throttle_durations:
+            durations = [duration for duration in throttle_durations if duration is not None]
+            raise Throttled(max(durations, default=None))
+
+    async def arender(self, response):
+        # Rendered here: Django would otherwise render a TemplateResponse in a worker thread
+        if isinstance(response, SimpleTemplateResponse):
+            response.render()
+            await self.after_render(response)
+        return response
+
+    async def after_render(self, response):
+        pass
+
+class AsyncCachedResponseMixin:
+    '''
+    CachedResponseMixin for async views; the entry is written once the response is rendered.
+    '''
+    cache_key = None # set when a miss should be stored
+
+    async def cached(self, handler, request, *args, **kwargs):
+        self.cache_key = None
+        caching, conditional = response_cache.is_enabled(), response_cache.is_conditional()
+        if not (caching or conditional):
+            return await handler(request, *args, **kwargs)
+
+        version = await response_cache.aversion()
+        if conditional and (not_modified := response_cache.not_modified(request, version)) is not None:
+            return not_modified
+
+        lagging = response_cache.replica_may_lag(version)
+        response = None
+        if caching:
+            key = await response_cache.amake_key(request, version.generation)
+            response = await response_cache.alookup(key)
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+            if caching:
+                response['X-Cache'] = 'MISS'
+                if not lagging:
+                    self.cache_key = key
+        if conditional and not lagging:
+            response_cache.set_validators(response, version)
+        return response
+
+    async def after_render(self, response):
+        await super().after_render(response)
+        if self.cache_key is not None:
+            await response_cache.astore(self.cache_key, response)
+
+class HealthCheckView(AsyncAPIViewMixin, views.HealthCheckView):
+    async def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+class BookmarkListView(AsyncCachedResponseMixin, AsyncAPIViewMixin, views.BookmarkListView):
+    async def get(self, request, *args, **kwargs):
+        return await self.cached(self.alist, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        if conf.get('FAST_READ'):
+            fields = self.get_sparse_fields()
+            response = await self.apaginated(fastread.values(queryset, fields), lambda rows: fastread.aserialize(rows, fields))
+        else:
+            response = await self.apaginated(queryset, self.aserialize)
+
+        if 'tags' in request.query_params.get('facets', '').split(','):
+            response.data['facets'] = {'tags': await sync_to_async(self.tag_facets)(queryset)}
+        return response
+
+    async def afilter_queryset(self, queryset):
+        # Backends that need the database provide afilter_queryset(); the others are pure
+        for backend in list(self.filter_backends):
+            backend = backend()
+            afilter = getattr(backend, 'afilter_queryset', None)
+            if afilter is not None:
+                queryset = await afilter(self.request, queryset, self)
+            else:
+                queryset = backend.filter_queryset(self.request, queryset, self)
+        return queryset
+
+    async def apaginated(self, queryset, serialize):
+        page = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        if page is None:
+            return Response(await serialize([row async for row in queryset]))
+        return self.get_paginated_response(await serialize(page))
+
+    async def aserialize(self, rows):
+        # Tags (when requested) were prefetched with the rows, so the serializer does no queries
+        return self.get_serializer(rows, many=True).data
+
+class BookmarkDetailView(AsyncCachedResponseMixin, AsyncAPIViewMixin, views.BookmarkDetailView):
+    async def get(self, request, *args, **kwargs):
+        return await self.cached(self.aretrieve, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg]}
+        if conf.get('FAST_READ'):
+            fields = self.get_sparse_fields()
+            row = await aget_object_or_404(fastread.values(queryset, fields), **lookup)
+            self.check_object_permissions(request, row)
+            return Response((await fastread.aserialize([row], fields))[0])
+
+        instance = await aget_object_or_404(queryset, **lookup)
+        self.check_object_permissions(request, instance)
+        return Response(self.get_serializer(instance).data)
@@ -0,0 +1,169 @@
+'''
+Set-based helpers for writing many bookmarks at once (batch submit, import, moderation).
+Each helper issues a fixed number of queries however many rows it handles.
+'''
+from collections import Counter
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from . import domain_counts, jobs, near_duplicates, tag_index
+from .models import Bookmark, Tag, bookmark_lsh_bands, clean_slugs, url_domain, url_hash
+from .signals import bookmarks_changed, bulk_delete
+
+BookmarkTag = Bookmark.tags.through
+
+def existing_hashes(hashes):
+    '''
+    The url hashes (see bookmarks.models.url_hash) among `hashes` that are already stored;
+    one IN query on the unique url_hash index.
+    '''
+    hashes = set(hashes)
+    if not hashes:
+        return set()
+    return set(Bookmark.objects.filter(url_hash__in=hashes).values_list('url_hash', flat=True))
+
+def resolve_tags(slugs):
+    '''
+    slug -> Tag for the slugs that exist.
+    '''
+    slugs = set(slugs)
+    if not slugs:
+        return {}
+    return {t.slug: t for t in Tag.objects.filter(slug__in=slugs)}
+
+def ensure_tags(slugs):
+    '''
+    resolve_tags(), creating the missing tags first (named after their slug).
+    Returns (slug -> Tag, set of created slugs).
+    '''
+    slugs = set(slugs)
+    known = resolve_tags(slugs)
+    missing = slugs - known.keys()
+    if missing:
+        Tag.objects.bulk_create([Tag(name=s, slug=s) for s in sorted(missing)], ignore_conflicts=True)
+        known = resolve_tags(slugs)
+        tag_index.record(tags=True) # bulk_create skips the Tag signals
+    return known, missing
+
+def attach_tags(pairs):
+    '''
+    Insert (bookmark_id, tag_id) through-table rows in one statement (per 499 rows on SQLite,
+    whose bind-parameter limit Django batches by); existing pairs are skipped.
+    '''
+    rows = [BookmarkTag(bookmark_id=b, tag_id=t) for b, t in pairs]
+    if rows:
+        BookmarkTag.objects.bulk_create(rows, ignore_conflicts=True)
+
+def create_bookmarks(bookmarks, submitted=False):
+    '''
+    Insert unsaved Bookmark instances, skipping urls that are already stored or repeated
+    earlier in the list. Instances may carry `known_tags` (Tag objects) to attach.
+    With submitted=True the SUBMIT_JOBS are enqueued for them in the same transaction, and
+    likely copies of stored bookmarks are flagged (see bookmarks.near_duplicates).
+    Returns a list aligned with `bookmarks`: the saved instance, or None for a duplicate.
+    '''
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                results = _create_bookmarks(bookmarks)
+                if submitted:
+                    jobs.submitted(b.id for b in results if b is not None)
+                    near_duplicates.flag(b for b in results if b is not None)
+                return results
+        except IntegrityError:
+            # Lost a race with a concurrent insert of the same url; re-check and retry once
+            if attempt:
+                raise
+
+def _create_bookmarks(bookmarks):
+    for bookmark in bookmarks:
+        # bulk_create skips save()
+        bookmark.domain = url_domain(bookmark.url)
+        bookmark.url_hash = url_hash(bookmark.url)
+        bookmark.lsh_bands = bookmark_lsh_bands(bookmark.title, bookmark.description, bookmark.url)
+    taken = existing_hashes(b.url_hash for b in bookmarks)
+    results = [None] * len(bookmarks)
+    for i, bookmark in enumerate(bookmarks):
+        if bookmark.url_hash in taken:
+            continue
+        taken.add(bookmark.url_hash)
+        results[i] = bookmark
+
+    pending = [b for b in results if b is not None]
+    if pending:
+        Bookmark.objects.bulk_create(pending)
+        domain_counts.created(pending) # approvals are counted when bookmarks_changed is sent
+        attach_tags((b.id, t.id) for b in pending for t in getattr(b, 'known_tags', ()))
+    return results
+
+def submit_bookmarks(items, submitted_ip=None):
+    '''
+    Create moderated (is_approved=False) bookmarks from validated submissions.
+
+    `items` are BookmarkWriteSerializer-style dicts (canonical url, title, description, tags).
+    Returns a list aligned with `items`: the created Bookmark, or None for a duplicate
+    (already stored, or repeated earlier in the same batch). Known tags are attached,
+    unknown ones go to pending_tags, exactly like a single submission.
+    '''
+    slugs = [clean_slugs(d.get('tags', [])) for d in items]
+    known = resolve_tags(s for item_slugs in slugs for s in item_slugs)
+
+    bookmarks = []
+    for data, item_slugs in zip(items, slugs):
+        bookmark = Bookmark(
+            title=data['title'].strip(),
+            url=data['url'],
+            description=data['description'].strip(),
+            pending_tags=[s for s in item_slugs if s not in known],
+            is_approved=False,
+            submitted_ip=submitted_ip,
+        )
+        bookmark.known_tags = [known[s] for s in item_slugs if s in known]
+        bookmarks.append(bookmark)
+    return create_bookmarks(bookmarks, submitted=True)
+
+def approve_bookmarks(queryset, user=None):
+    '''
+    Approve the unapproved bookmarks in `queryset`, promoting their pending_tags: missing tags
+    are created, every pending tag is attached and pending_tags is cleared, in one transaction.
+    Returns (approved ids, created tag slugs).
+    '''
+    with transaction.atomic():
+        rows = list(queryset.filter(is_approved=False).order_by('id').values_list('id', 'pending_tags'))
+        if not rows:
+            return [], set()
+        ids = [bookmark_id for bookmark_id, _ in rows]
+        pending = {bookmark_id: clean_slugs(slugs or ()) for bookmark_id, slugs in rows}
+        known, created = ensure_tags(s for slugs in pending.values() for s in slugs)
+        attach_tags((bookmark_id, known[s].id) for bookmark_id, slugs in pending.items() for s in slugs if s in known)
+
+        Bookmark.objects.filter(id__in=ids).update(
+            is_approved=True,
+            approved_at=timezone.now(),
+            approved_by=user,
+            pending_tags=[],
+        )
+        # .update() skips model signals; notify search index, counts etc. explicitly
+        bookmarks_changed.send(sender=Bookmark, ids=ids, action='approved')
+    return ids, created
+
+def reject_bookmarks(queryset):
+    '''
+    Delete the bookmarks in `queryset`. Approved ones are unpublished first, so counts and
+    indexes follow; QuerySet.delete() then removes the rows (one DELETE per 100) and cascades
+    to tags and metadata; near duplicates stay in the queue, ungrouped. Returns the deleted ids.
+    '''
+    with transaction.atomic():
+        rows = list(queryset.order_by('id').values_list('id', 'is_approved', 'domain'))
+        if not rows:
+            return []
+        ids = [bookmark_id for bookmark_id, _, _ in rows]
+        public = [bookmark_id for bookmark_id, approved, _ in rows if approved]
+        if public:
+            Bookmark.objects.filter(id__in=public).update(is_approved=False, approved_at=None, approved_by=None)
+            bookmarks_changed.send(sender=Bookmark, ids=public, action='rejected')
+        totals = Counter(domain for _, _, domain in rows)
+        domain_counts.adjust({domain: (0, -n) for domain, n in totals.items()})
+        # The per-instance delete receivers would redo the work above one row at a time
+        with bulk_delete():
+            Bookmark.objects.filter(id__in=ids).delete()
+    return ids
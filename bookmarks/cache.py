@@ -0,0 +1,229 @@
+'''
+Rendered-response cache for the public read endpoints.
+
+Entries are keyed on the absolute path, the normalized query string and a global generation
+counter. Any change to public data bumps the generation, which orphans every cached page at
+once; stale entries simply expire. Use a cache backend shared by all workers (Redis, Memcached,
+database...) so a bump in one process is seen by the others.
+
+The generation and the time of the last bump are also the HTTP validators of these endpoints
+(ETag and Last-Modified, see not_modified()): a client or CDN revalidating a page it holds gets
+a 304 after one cache read, without the view's queries. A page read from a replica shortly
+after a bump may predate it, so it gets neither (see replica_may_lag()).
+'''
+import hashlib, os, time
+from collections import namedtuple
+from asgiref.sync import sync_to_async
+from urllib.parse import urlencode
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from . import conf, db
+
+GENERATION_KEY = 'bookmarks:generation'
+CHANGED_KEY = 'bookmarks:changed_at'
+KEY_PREFIX = 'bookmarks:response'
+
+# The data version: generation counter, and when it was last bumped (epoch seconds)
+Version = namedtuple('Version', 'generation changed_at')
+
+_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+# Counters are per process; a forked worker starts from zero (see bookmarks.metrics)
+os.register_at_fork(after_in_child=lambda: _stats.update(dict.fromkeys(_stats, 0)))
+
+# Backends that never block; async code calls them directly rather than through a thread
+IN_PROCESS_BACKENDS = (LocMemCache, DummyCache)
+# Backends each worker process has its own copy of: a bump in one is never seen by the others
+PER_PROCESS_BACKENDS = (LocMemCache,)
+
+def get_cache():
+    return caches[conf.get('RESPONSE_CACHE_ALIAS')]
+
+async def call_async(cache, method, *args):
+    '''
+    await cache.a<method>(*args), or the plain method for in-process backends.
+    '''
+    if isinstance(cache, IN_PROCESS_BACKENDS):
+        return getattr(cache, method)(*args)
+    return await getattr(cache, 'a' + method)(*args)
+
+def is_shared():
+    '''
+    True when every worker process sees the same RESPONSE_CACHE_ALIAS cache.
+    '''
+    return not isinstance(get_cache(), PER_PROCESS_BACKENDS)
+
+def enabled(name):
+    '''
+    The BOOKMARKS[name] switch of a feature that needs a shared cache: None means is_shared().
+    '''
+    value = conf.get(name)
+    return is_shared() if value is None else bool(value)
+
+def is_enabled():
+    return enabled('RESPONSE_CACHE')
+
+def is_conditional():
+    # The validators are the generation counter: a per-process one would answer 304 to pages
+    # another process has since changed
+    return enabled('CONDITIONAL_GET')
+
+def generation():
+    cache = get_cache()
+    gen = cache.get(GENERATION_KEY)
+    if gen is None:
+        # Start from the clock so a lost counter never revives entries from an old generation
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        gen = cache.get(GENERATION_KEY)
+    return gen
+
+async def ageneration():
+    cache = get_cache()
+    gen = await call_async(cache, 'get', GENERATION_KEY)
+    if gen is None:
+        await call_async(cache, 'add', GENERATION_KEY, int(time.time() * 1000), None)
+        gen = await call_async(cache, 'get', GENERATION_KEY)
+    return gen
+
+def _version(cache, values):
+    if GENERATION_KEY not in values:
+        values[GENERATION_KEY] = generation()
+    if CHANGED_KEY not in values:
+        # Unknown (a new or flushed cache): count from now, so no earlier copy is taken as current
+        cache.add(CHANGED_KEY, time.time(), None)
+        values[CHANGED_KEY] = cache.get(CHANGED_KEY)
+    return Version(values[GENERATION_KEY], values[CHANGED_KEY])
+
+def version():
+    '''
+    The current Version, in one cache round trip.
+    '''
+    cache = get_cache()
+    return _version(cache, cache.get_many([GENERATION_KEY, CHANGED_KEY]))
+
+async def aversion():
+    cache = get_cache()
+    values = await call_async(cache, 'get_many', [GENERATION_KEY, CHANGED_KEY])
+    if len(values) == 2:
+        return Version(values[GENERATION_KEY], values[CHANGED_KEY])
+    # A new or flushed cache: rare enough to go through version()'s blocking calls
+    return version() if isinstance(cache, IN_PROCESS_BACKENDS) else await sync_to_async(version)()
+
+def _bump():
+    cache = get_cache()
+    _stats['invalidations'] += 1
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+    cache.set(CHANGED_KEY, time.time(), None)
+
+def bump():
+    '''
+    Invalidate every cached response.
+    '''
+    _bump()
+    # Again once the change commits: a request that read the old rows after the first bump
+    # would otherwise have cached them, and handed out validators, under the new generation
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(_bump)
+
+# Comma-separated sets: ?fields=url,id is the same page as ?fields=id,url
+SET_PARAMS = ('fields', 'include')
+
+def _normalize(name, value):
+    if name in SET_PARAMS:
+        return ','.join(sorted({v.strip() for v in value.split(',') if v.strip()}))
+    return value
+
+def _digest(request):
+    params = sorted((k, _normalize(k, v)) for k, values in request.GET.lists() for v in values)
+    raw = request.build_absolute_uri(request.path) + '?' + urlencode(params)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def make_key(request, gen=None):
+    '''
+    Same resource + same query parameters (in any order) -> same key.
+    '''
+    return f'{KEY_PREFIX}:{generation() if gen is None else gen}:{_digest(request)}'
+
+async def amake_key(request, gen=None):
+    return f'{KEY_PREFIX}:{await ageneration() if gen is None else gen}:{_digest(request)}'
+
+def replica_may_lag(version):
+    '''
+    True when this request reads from a replica (bookmarks.db) and the data at `version` is
+    less than READ_REPLICA_MAX_LAG seconds old: the replica may not have it yet, so what it
+    returns must not be cached or validated as `version`.
+    '''
+    return db.read_alias() is not None and time.time() - version.changed_at < conf.get('READ_REPLICA_MAX_LAG')
+
+# Conditional GET
+def set_validators(response, version):
+    '''
+    ETag, Last-Modified and Cache-Control of a 200 or 304 for data at `version`.
+    '''
+    if response.status_code not in (200, 304):
+        return
+    response['ETag'] = f'"{version.generation}"'
+    response['Last-Modified'] = http_date(version.changed_at)
+    patch_cache_control(response, public=True, max_age=conf.get('CACHE_CONTROL_MAX_AGE'), must_revalidate=True)
+
+def not_modified(request, version):
+    '''
+    A 304 when the request's If-None-Match / If-Modified-Since match `version`, else None.
+    '''
+    response = get_conditional_response(request, etag=f'"{version.generation}"', last_modified=int(version.changed_at))
+    if response is not None:
+        set_validators(response, version)
+    return response
+
+def _hit(entry):
+    if entry is None:
+        _stats['misses'] += 1
+        return None
+    _stats['hits'] += 1
+    status, content_type, content = entry
+    response = HttpResponse(content, content_type=content_type, status=status)
+    response['X-Cache'] = 'HIT'
+    return response
+
+def lookup(key):
+    return _hit(get_cache().get(key))
+
+async def alookup(key):
+    return _hit(await call_async(get_cache(), 'get', key))
+
+def store_on_render(key, response):
+    '''
+    Save the rendered bytes of a successful response once DRF has rendered it.
+    '''
+    response['X-Cache'] = 'MISS'
+    if response.status_code != 200:
+        return
+
+    def _store(rendered):
+        get_cache().set(key, (rendered.status_code, rendered['Content-Type'], rendered.content), conf.get('RESPONSE_CACHE_TIMEOUT'))
+        _stats['stores'] += 1
+
+    response.add_post_render_callback(_store)
+
+async def astore(key, response):
+    '''
+    store_on_render() for async views, which render the response themselves.
+    '''
+    if response.status_code != 200:
+        return
+    await call_async(get_cache(), 'set', key, (response.status_code, response['Content-Type'], response.content), conf.get('RESPONSE_CACHE_TIMEOUT'))
+    _stats['stores'] += 1
+
+def stats():
+    '''
+    Per-process hit/miss counters.
+    '''
+    total = _stats['hits'] + _stats['misses']
+    return {**_stats, 'hit_ratio': (_stats['hits'] / total) if total else 0.0}
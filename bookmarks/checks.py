@@ -0,0 +1,29 @@
+'''
+System checks (`manage.py check`, runserver, migrate) for app settings that only work when all
+worker processes share a cache.
+'''
+from django.core.checks import Warning, register
+from . import cache, conf
+
+# Settings that default to "on when RESPONSE_CACHE_ALIAS is shared", and what goes wrong when
+# they are forced on over a per-process cache
+SHARED_CACHE_SETTINGS = [
+    ('RESPONSE_CACHE', "a change made by another process does not invalidate this worker's cached pages, which stay stale for RESPONSE_CACHE_TIMEOUT"),
+    ('CONDITIONAL_GET', 'the ETag of a page another process has changed stays the same, so clients holding the old copy get 304'),
+    ('TAG_INDEX', "changes made by another process never reach this worker's tag index, so ?tags= pages lag until its next rebuild (TAG_INDEX_REBUILD_AFTER)"),
+]
+
+@register()
+def shared_cache(app_configs, **kwargs):
+    if cache.is_shared():
+        return []
+    alias = conf.get('RESPONSE_CACHE_ALIAS')
+    return [
+        Warning(
+            f'BOOKMARKS[{name!r}] is True, but the {alias!r} cache (RESPONSE_CACHE_ALIAS) is local to each process: {consequence}.',
+            hint=f'Point RESPONSE_CACHE_ALIAS at a cache shared by the workers (Redis, Memcached, database...), or leave {name} unset so it is only on then. Run a single worker otherwise.',
+            id=f'bookmarks.W00{i}',
+        )
+        for i, (name, consequence) in enumerate(SHARED_CACHE_SETTINGS, 1)
+        if conf.get(name) is True
+    ]
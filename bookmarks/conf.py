@@ -0,0 +1,106 @@
+'''
+App settings, overridable from a BOOKMARKS dict in Django settings, e.g.
+    BOOKMARKS = {'RESPONSE_CACHE_TIMEOUT': 60}
+'''
+from django.conf import settings
+
+DEFAULTS = {
+    # Rendered-response cache for the public list/detail endpoints (see bookmarks.cache). None:
+    # on when RESPONSE_CACHE_ALIAS is shared between processes (not LocMemCache); True forces it
+    'RESPONSE_CACHE': None,
+    'RESPONSE_CACHE_ALIAS': 'default',
+    'RESPONSE_CACHE_TIMEOUT': 300,
+    # ETag/Last-Modified on the same endpoints, from the cache's data version (304s skip the
+    # view), and the max-age of their Cache-Control (revalidated after that). None: on when
+    # RESPONSE_CACHE_ALIAS is shared, like RESPONSE_CACHE
+    'CONDITIONAL_GET': None,
+    'CACHE_CONTROL_MAX_AGE': 0,
+    # Where throttles keep their counters: None for the Django cache, or a store class path
+    # such as 'bookmarks.throttle_store.SQLiteThrottleStore' (see bookmarks.throttle_store)
+    'THROTTLE_STORE': None,
+    'THROTTLE_STORE_OPTIONS': {},
+    # Serve list/detail from .values() rows instead of BookmarkReadSerializer (see bookmarks.fastread)
+    'FAST_READ': True,
+    # Route health/list/detail to the native async views (bookmarks.async_views); for ASGI servers.
+    # Read when the URLconf is loaded
+    'ASYNC_VIEWS': False,
+    # Serve ?tags= pages from the per-worker in-memory tag index (see bookmarks.tag_index). It
+    # follows changes through a log in RESPONSE_CACHE_ALIAS, so None means on when that cache is
+    # shared between processes. Each worker also rebuilds it once it is TAG_INDEX_REBUILD_AFTER
+    # seconds old, which bounds drift from changes the log missed
+    'TAG_INDEX': None,
+    'TAG_INDEX_REBUILD_AFTER': 3600,
+    # Most slugs accepted by ?tags=
+    'MULTI_TAG_MAX': 10,
+    # Most tags returned by ?facets=tags on the list endpoint
+    'TAG_FACETS_LIMIT': 20,
+    # Most items accepted by /v1/bookmarks/submit/batch/
+    'BATCH_SUBMIT_MAX_ITEMS': 500,
+    # Most bookmark ids accepted by one /v1/moderation/ request
+    'MODERATION_MAX_ITEMS': 5000,
+    # Rows per query for the streaming NDJSON export
+    'EXPORT_CHUNK_SIZE': 1000,
+    # Background jobs (see bookmarks.jobs). SUBMIT_JOBS are the job kinds enqueued for every
+    # new submission (single and batch), with payload {'id': <bookmark id>}
+    'SUBMIT_JOBS': ['fetch_metadata'],
+    'JOB_MAX_ATTEMPTS': 5,
+    # Retry n waits about JOB_RETRY_DELAY * 2**(n-1) seconds (jittered), at most JOB_RETRY_MAX_DELAY
+    'JOB_RETRY_DELAY': 10.0,
+    'JOB_RETRY_MAX_DELAY': 3600.0,
+    # A running job whose worker has not finished it after this many seconds is queued again
+    'JOB_TIMEOUT': 300.0,
+    # Finished jobs (and so their idempotency keys) are kept this many seconds
+    'JOB_RETENTION': 7 * 24 * 3600,
+    # Link metadata fetcher (see bookmarks.link_metadata): requests in flight per process and
+    # per Bookmark.domain, seconds per page (redirects included), and body bytes read per page
+    'METADATA_CONCURRENCY': 100,
+    'METADATA_PER_DOMAIN': 4,
+    'METADATA_TIMEOUT': 10.0,
+    'METADATA_MAX_BYTES': 256 * 1024,
+    'METADATA_MAX_REDIRECTS': 5,
+    'METADATA_USER_AGENT': 'Mozilla/5.0 (compatible; bookmarks-metadata/1.0)',
+    # Submitted URLs come from anonymous users: refuse loopback, private and link-local
+    # addresses unless this is True. Also applies to link checks, as does METADATA_USER_AGENT
+    'METADATA_ALLOW_PRIVATE': False,
+    # Dead-link sweep (see bookmarks.link_health): requests in flight per sweep and per
+    # Bookmark.domain, and seconds between two requests to one domain
+    'LINK_CHECK_CONCURRENCY': 200,
+    'LINK_CHECK_PER_DOMAIN': 2,
+    'LINK_CHECK_DOMAIN_DELAY': 0.5,
+    'LINK_CHECK_TIMEOUT': 10.0,
+    # A link is checked again once its last check is this many seconds old
+    'LINK_CHECK_INTERVAL': 7 * 24 * 3600,
+    # Consecutive failed checks before a link counts as dead (one success revives it)
+    'LINK_DEAD_AFTER': 3,
+    # Flag submissions that look like a stored bookmark (see bookmarks.near_duplicates): word
+    # overlap (Jaccard) at or above NEAR_DUPLICATE_THRESHOLD. Each worker keeps an in-memory
+    # index, rebuilt from the database once it is NEAR_DUPLICATE_REBUILD_AFTER seconds old
+    'NEAR_DUPLICATES': True,
+    'NEAR_DUPLICATE_THRESHOLD': 0.6,
+    'NEAR_DUPLICATE_REBUILD_AFTER': 3600,
+    # Run on every new SQLite connection (see bookmarks.db): WAL so reads and the writer do not
+    # block each other, fsync at checkpoints only, a 256 MB memory map and a 64 MB page cache
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,
+        'temp_store': 'memory',
+    },
+    # Database aliases the public read views read from (see bookmarks.db.ReplicaRouter), how
+    # long a client that wrote reads from the primary instead, and how far behind the primary
+    # the replicas may be (pages read from one that soon after a change are not cached)
+    'READ_REPLICAS': [],
+    'READ_REPLICA_STICKY_SECONDS': 10,
+    'READ_REPLICA_MAX_LAG': 10,
+    # Request metrics served at /v1/metrics/ (see bookmarks.metrics). With several worker
+    # processes, set METRICS_DIR to a directory they share so the endpoint reports the whole host.
+    # Only clients in METRICS_ALLOWED_NETWORKS (by REMOTE_ADDR) and staff users may scrape it
+    'METRICS': True,
+    'METRICS_ALLOWED_NETWORKS': ['127.0.0.0/8', '::1/128'],
+    'METRICS_DIR': None,
+    'METRICS_FLUSH_INTERVAL': 5.0,
+}
+
+def get(name):
+    return getattr(settings, 'BOOKMARKS', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,144 @@
+'''
+Database layer: SQLite tuning for every connection, and read replicas for the public read views.
+
+configure() runs the SQLITE_PRAGMAS on each new SQLite connection (connected to
+connection_created by the app's ready()). The defaults put the file in WAL mode, so readers
+never wait for the writer and the writer never waits for readers, with synchronous=NORMAL
+(durable at each checkpoint rather than each commit), a memory-mapped file and a larger page
+cache.
+
+ReplicaRouter sends the reads of the public read views (ReplicaReadsMixin, and the async
+views) to one of READ_REPLICAS, picked once per request so its queries see one snapshot.
+Everything else, writes, the admin and background jobs included, stays on the primary.
+A client that has just written is pinned to the primary for READ_REPLICA_STICKY_SECONDS by a
+cookie (ReadYourWritesMiddleware), so it reads its own writes however far the replicas lag.
+State a worker keeps from those reads (the tag index) is read from the primary (primary_reads),
+and pages read from a replica within READ_REPLICA_MAX_LAG seconds of a change are neither
+cached nor given validators (bookmarks.cache.replica_may_lag).
+'''
+import random, sqlite3, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from . import conf
+
+STICKY_COOKIE = 'bookmarks_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_alias = ContextVar('bookmarks_read_alias', default=None)
+
+def configure(connection, **kwargs):
+    '''
+    Apply SQLITE_PRAGMAS to a new connection. Run on the raw connection, so they are not
+    counted as the request's queries.
+    '''
+    if connection.vendor != 'sqlite' or connection.connection is None:
+        return
+    for name, value in conf.get('SQLITE_PRAGMAS').items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+def is_pinned(request):
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+@contextmanager
+def replica_reads(request):
+    '''
+    Send the reads made inside the block to a read replica, unless there are none or the
+    client wrote recently.
+    '''
+    replicas = conf.get('READ_REPLICAS')
+    if not replicas or request.method not in SAFE_METHODS or is_pinned(request):
+        yield None
+        return
+    token = _read_alias.set(random.choice(replicas))
+    try:
+        yield _read_alias.get()
+    finally:
+        _read_alias.reset(token)
+
+def read_alias():
+    '''
+    The replica this request reads from, or None for the primary.
+    '''
+    return _read_alias.get()
+
+@contextmanager
+def primary_reads():
+    '''
+    Send the reads made inside the block to the primary, even within replica_reads().
+    '''
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+class ReplicaRouter:
+    '''
+    DATABASE_ROUTERS entry. Without READ_REPLICAS configured it routes nothing.
+    '''
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows read from a replica are the primary's rows
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return False if db in conf.get('READ_REPLICAS') else None
+
+class ReplicaReadsMixin:
+    '''
+    For sync DRF read views: their queries go to a replica (see replica_reads()).
+    '''
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return super().dispatch(request, *args, **kwargs)
+
+class ReadYourWritesMiddleware:
+    '''
+    Pins a client to the primary for READ_REPLICA_STICKY_SECONDS after each successful write.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and conf.get('READ_REPLICAS'):
+            seconds = conf.get('READ_REPLICA_STICKY_SECONDS')
+            response.set_cookie(STICKY_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+def copy_database(source, target):
+    '''
+    Copy the SQLite file `source` over `target` with the online backup API: a consistent
+    snapshot, taken while other connections keep reading and writing `source`.
+    '''
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+        dst.execute('PRAGMA journal_mode = wal')
+    finally:
+        dst.close()
+        src.close()
@@ -0,0 +1,105 @@
+'''
+Denormalized per-domain counts (DomainStat): approved bookmarks per domain, for /v1/domains/,
+and all bookmarks per domain, for the admin's domain filter.
+
+Counts are adjusted with relative F() updates as bookmarks are created, approved, unapproved,
+deleted or moved to another domain (see bookmarks.signals), so neither reader ever groups or
+scans the bookmark table. `reconcile()` repairs any drift.
+'''
+from collections import defaultdict
+from django.db.models import Count, F, Q
+from .models import Bookmark, DomainStat
+
+def adjust(deltas):
+    '''
+    Apply {domain: (approved_delta, total_delta)}. Missing rows are created first; then one
+    UPDATE per distinct delta pair (usually just one).
+    '''
+    deltas = {domain: delta for domain, delta in deltas.items() if domain and any(delta)}
+    if not deltas:
+        return
+    DomainStat.objects.bulk_create([DomainStat(domain=d) for d in deltas], ignore_conflicts=True)
+    by_delta = defaultdict(list)
+    for domain, delta in deltas.items():
+        by_delta[delta].append(domain)
+    for (approved, total), domains in by_delta.items():
+        DomainStat.objects.filter(domain__in=domains).update(
+            approved_count=F('approved_count') + approved,
+            total_count=F('total_count') + total,
+        )
+
+def move(before, after):
+    '''
+    Count one bookmark going from `before` to `after`, each a (domain, is_approved) pair or
+    None (not stored).
+    '''
+    deltas = defaultdict(lambda: (0, 0))
+    for state, sign in ((before, -1), (after, 1)):
+        if state is not None:
+            domain, approved = state
+            a, t = deltas[domain]
+            deltas[domain] = (a + sign * bool(approved), t + sign)
+    adjust(deltas)
+
+def created(bookmarks):
+    '''
+    Count freshly bulk-inserted bookmarks in the totals (approval is counted by publish()).
+    '''
+    deltas = defaultdict(int)
+    for bookmark in bookmarks:
+        deltas[bookmark.domain] += 1
+    adjust({domain: (0, n) for domain, n in deltas.items()})
+
+def publish(bookmark_ids, sign=1):
+    '''
+    Count (sign=1) or uncount (sign=-1) bookmarks that became (un)approved, one grouped query.
+    '''
+    if not bookmark_ids:
+        return
+    rows = Bookmark.objects.filter(id__in=list(bookmark_ids)).values('domain').annotate(n=Count('id')).values_list('domain', 'n')
+    adjust({domain: (sign * n, 0) for domain, n in rows})
+
+def true_counts():
+    '''
+    {domain: (approved, total)} straight from the bookmark table.
+    '''
+    rows = Bookmark.objects.order_by().values('domain').annotate(
+        approved=Count('id', filter=Q(is_approved=True)),
+        total=Count('id'),
+    ).values_list('domain', 'approved', 'total')
+    return {domain: (approved, total) for domain, approved, total in rows if domain}
+
+def drift():
+    '''
+    {domain: (stored, actual)} for every domain whose stored (approved, total) pair is wrong.
+    '''
+    actual = true_counts()
+    stored = {d: (a, t) for d, a, t in DomainStat.objects.values_list('domain', 'approved_count', 'total_count')}
+    return {
+        domain: (stored.get(domain, (0, 0)), actual.get(domain, (0, 0)))
+        for domain in stored.keys() | actual.keys()
+        if stored.get(domain, (0, 0)) != actual.get(domain, (0, 0))
+    }
+
+def reconcile():
+    '''
+    Recompute every count from the bookmark table and fix the ones that drifted.
+    Returns drift() as it was before the repair.
+    '''
+    drifted = drift()
+    DomainStat.objects.bulk_create([DomainStat(domain=d) for d in drifted], ignore_conflicts=True)
+    by_counts = defaultdict(list)
+    for domain, (_, counts) in drifted.items():
+        by_counts[counts].append(domain)
+    for (approved, total), domains in by_counts.items():
+        DomainStat.objects.filter(domain__in=domains).update(approved_count=approved, total_count=total)
+    return drifted
+
+def top_domains(limit, field='approved_count'):
+    '''
+    The `limit` domains with the highest `field` count, busiest first.
+    '''
+    return list(
+        DomainStat.objects.filter(**{f'{field}__gt': 0}).order_by(f'-{field}', 'domain')
+        .values_list('domain', flat=True)[:limit]
+    )
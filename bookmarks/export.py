@@ -0,0 +1,44 @@
+'''
+Streaming export of the public (approved) corpus, as NDJSON lines shaped like BookmarkReadSerializer.
+
+Rows are read in keyset-ordered chunks on (created_at, id), so memory stays flat and
+every chunk is an index range scan plus one query for the chunk's tag slugs.
+'''
+import json, zlib
+from django.db.models import Q
+from . import fastread
+from .models import Bookmark
+
+def iter_rows(since=None, chunk_size=1000):
+    '''
+    Yield lists of approved bookmark dicts, oldest first, `chunk_size` at a time.
+    '''
+    qs = Bookmark.objects.filter(is_approved=True)
+    if since is not None:
+        qs = qs.filter(created_at__gt=since)
+    qs = qs.order_by('created_at', 'id').values(*fastread.FIELDS)
+
+    last = None
+    while True:
+        page = qs
+        if last is not None:
+            created_at, id_ = last
+            page = page.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=id_), created_at__gte=created_at)
+        rows = list(page[:chunk_size])
+        if not rows:
+            return
+        last = (rows[-1]['created_at'], rows[-1]['id'])
+        yield fastread.serialize(rows)
+
+def ndjson_chunks(rows):
+    for chunk in rows:
+        yield ''.join(json.dumps(r, ensure_ascii=False, separators=(',', ':')) + '\n' for r in chunk).encode('utf-8')
+
+def gzip_chunks(chunks):
+    '''
+    Compress a byte stream as gzip, flushing after every chunk so clients see rows as they are produced.
+    '''
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
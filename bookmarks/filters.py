@@ -0,0 +1,115 @@
+from django.db.models import Count
+from rest_framework.exceptions import ParseError
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+from . import conf, search, tag_index
+from .models import Bookmark, clean_slugs
+from .pagination import KeysetPagination
+
+BookmarkTag = Bookmark.tags.through
+
+class FullTextSearchFilter(SearchFilter):
+    '''
+    ?search= backed by the full-text index (see bookmarks.search): prefix matching on every term,
+    ranked by relevance unless the client asked for an explicit ?ordering=.
+    Falls back to SearchFilter's icontains lookups when no index exists for the database.
+    '''
+    ordering_param = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not text.strip():
+            return queryset
+
+        matched = search.filter_queryset(queryset, text)
+        if matched is None:
+            return super().filter_queryset(request, queryset, view)
+        if 'search_rank' in matched.query.annotations and not request.query_params.get(self.ordering_param):
+            matched = matched.order_by('-search_rank')
+        return matched
+
+    async def afilter_queryset(self, request, queryset, view):
+        # The index check is the only database access; do it first so filter_queryset() is pure
+        if request.query_params.get(self.search_param, '').strip():
+            await search.ais_available(queryset.db)
+        return self.filter_queryset(request, queryset, view)
+
+class MultiTagFilter(BaseFilterBackend):
+    '''
+    ?tags=python,django&match=all (every tag, the default) or match=any (at least one).
+
+    When the page can be resolved from the in-memory tag index (see bookmarks.tag_index),
+    the queryset is narrowed to exactly the ids of that page. Otherwise (other filters,
+    other orderings, ?count=true, legacy ?page=, index not ready) it falls back to one
+    IN subquery on the through table, which never duplicates rows.
+    '''
+    tags_param = 'tags'
+    match_param = 'match'
+    ordering = ['created_at', 'id']
+
+    def get_slugs(self, request):
+        slugs = clean_slugs(request.query_params.get(self.tags_param, '').split(','))
+        max_tags = conf.get('MULTI_TAG_MAX')
+        if len(slugs) > max_tags:
+            raise ParseError(f'At most {max_tags} tags')
+        return slugs
+
+    def get_match(self, request):
+        match = request.query_params.get(self.match_param, 'all')
+        if match not in ('all', 'any'):
+            raise ParseError('match must be "all" or "any"')
+        return match
+
+    def filter_queryset(self, request, queryset, view):
+        slugs = self.get_slugs(request)
+        if not slugs:
+            return queryset
+        match = self.get_match(request)
+
+        page = self.index_plan(request, queryset, view)
+        index = tag_index.get_index()
+        if page is not None and index.sync():
+            return queryset.filter(id__in=index.page(slugs, match, **page))
+        return self.sql_filter(queryset, slugs, match)
+
+    async def afilter_queryset(self, request, queryset, view):
+        slugs = self.get_slugs(request)
+        if not slugs:
+            return queryset
+        match = self.get_match(request)
+
+        page = self.index_plan(request, queryset, view)
+        index = tag_index.get_index()
+        if page is not None and await index.async_sync():
+            return queryset.filter(id__in=index.page(slugs, match, **page))
+        return self.sql_filter(queryset, slugs, match)
+
+    def sql_filter(self, queryset, slugs, match):
+        pairs = BookmarkTag.objects.filter(tag__slug__in=slugs)
+        if match == 'all':
+            pairs = pairs.values('bookmark_id').annotate(n=Count('tag_id')).filter(n=len(slugs))
+        return queryset.filter(id__in=pairs.values('bookmark_id'))
+
+    def index_plan(self, request, queryset, view):
+        '''
+        Arguments for TagIndex.page() that resolve the requested page (plus one row, for the
+        next link), or None when the index cannot answer this request.
+        '''
+        if not tag_index.is_enabled() or not getattr(view, 'use_tag_index', False):
+            return None
+        # Any other filter would drop rows from a precomputed page
+        if any(request.query_params.get(p) for p in getattr(view, 'filter_params', ()) if p != self.tags_param):
+            return None
+        paginator = getattr(view, 'paginator', None)
+        if not isinstance(paginator, KeysetPagination):
+            return None
+        plan = paginator.plan(request, queryset)
+        if plan is None:
+            return None
+        keys, position, reverse, page_size = plan
+        if [name for name, _ in keys] != self.ordering:
+            return None
+
+        after = None
+        if position is not None:
+            after = (tag_index.stamp(position[0]), position[1]) # checked by decode_cursor
+        return {'descending': keys[0][1] != reverse, 'after': after, 'limit': page_size + 1}
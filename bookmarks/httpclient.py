@@ -0,0 +1,281 @@
+'''
+A small asyncio HTTP/1.1 client on the standard library, shared by the link fetchers
+(bookmarks.link_metadata, bookmarks.link_health):
+
+- keep-alive connections are pooled per origin and reused across pages of the same site
+- Pool.slot(domain) caps requests in flight per domain and overall, and can space out
+  requests to the same domain; a busy domain never holds up the others
+- bodies are read up to a byte limit; a connection with unread body is closed, not reused
+- hosts that resolve to loopback, private or link-local addresses are refused unless the
+  pool allows them (the URLs come from anonymous users)
+'''
+import asyncio, contextlib, ipaddress, socket, ssl
+from collections import OrderedDict, namedtuple
+from urllib.parse import quote, urljoin, urlsplit
+
+Response = namedtuple('Response', 'url status headers body') # url: after redirects
+
+REDIRECTS = {301, 302, 303, 307, 308}
+
+class FetchError(Exception):
+    def __init__(self, message, retry=False):
+        super().__init__(message)
+        self.retry = retry
+
+class Pool:
+    '''
+    Idle keep-alive connections per origin (scheme, host, port), and the politeness limits:
+    `concurrency` requests in flight overall, `per_domain` per domain, at least `delay` seconds
+    between the starts of two requests to one domain. One pool serves one event loop.
+
+    State is only kept for domains with requests waiting or in flight, and at most
+    `concurrency` idle connections are kept (least recently used closed first), so a pool can
+    serve a sweep over millions of URLs.
+    '''
+    def __init__(self, concurrency, per_domain, delay=0.0, allow_private=False, user_agent=''):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.max_idle = concurrency
+        self.per_domain = per_domain
+        self.delay = delay
+        self.allow_private = allow_private
+        self.user_agent = user_agent
+        self.domains = {} # domain -> [semaphore, requests waiting or in flight, earliest next start]
+        self.idle = OrderedDict() # origin -> [(reader, writer)], least recently used first
+        self.idle_count = 0
+        self.opened = self.reused = 0 # connections, for tests and benchmarks
+        self._ssl = None
+
+    @contextlib.asynccontextmanager
+    async def slot(self, domain):
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = [asyncio.Semaphore(self.per_domain), 0, 0.0]
+        state[1] += 1
+        try:
+            # Wait for the domain first, so requests queued behind a busy domain hold no global slot
+            async with state[0]:
+                if self.delay:
+                    now = asyncio.get_running_loop().time()
+                    start = max(now, state[2])
+                    state[2] = start + self.delay
+                    await asyncio.sleep(start - now)
+                async with self.slots:
+                    yield
+        finally:
+            state[1] -= 1
+            if not state[1]:
+                if self.delay and state[2] > asyncio.get_running_loop().time():
+                    # Keep the spacing for the next request to this domain
+                    asyncio.get_running_loop().call_at(state[2], self._forget, domain, state)
+                else:
+                    self._forget(domain, state)
+
+    def _forget(self, domain, state):
+        if not state[1] and self.domains.get(domain) is state:
+            del self.domains[domain]
+
+    async def connect(self, origin):
+        '''
+        (reader, writer, reused): an idle connection to `origin` if one is left, else a new one.
+        '''
+        idle = self.idle.get(origin, ())
+        while idle:
+            reader, writer = idle.pop()
+            self.idle_count -= 1
+            if not idle:
+                del self.idle[origin]
+            if not writer.is_closing() and not reader.at_eof():
+                self.reused += 1
+                return reader, writer, True
+            writer.close()
+
+        scheme, host, port = origin
+        address = await _resolve(host, port, self.allow_private)
+        if scheme == 'https' and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        tls = self._ssl if scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(address, port, ssl=tls, server_hostname=host if tls else None)
+        self.opened += 1
+        return reader, writer, False
+
+    def release(self, origin, reader, writer):
+        idle = self.idle.setdefault(origin, [])
+        self.idle.move_to_end(origin)
+        if len(idle) >= self.per_domain:
+            writer.close()
+            return
+        idle.append((reader, writer))
+        self.idle_count += 1
+        if self.idle_count > self.max_idle:
+            oldest = next(iter(self.idle))
+            _, stale = self.idle[oldest].pop(0)
+            self.idle_count -= 1
+            if not self.idle[oldest]:
+                del self.idle[oldest]
+            stale.close()
+
+    async def close(self):
+        writers = [writer for idle in self.idle.values() for _, writer in idle]
+        self.idle.clear()
+        self.idle_count = 0
+        for writer in writers:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for writer in writers), return_exceptions=True)
+
+def _is_public(address):
+    try:
+        return ipaddress.ip_address(address.split('%')[0]).is_global
+    except ValueError:
+        return False
+
+async def _resolve(host, port, allow_private):
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as exc:
+        raise FetchError(f'DNS lookup failed: {exc.strerror or exc}', retry=exc.errno == socket.EAI_AGAIN)
+    addresses = [info[4][0] for info in infos]
+    if not allow_private:
+        addresses = [a for a in addresses if _is_public(a)]
+        if not addresses:
+            raise FetchError(f'{host} does not resolve to a public address')
+    return addresses[0]
+
+async def _read_body(reader, headers, max_bytes):
+    '''
+    (body, complete): at most max_bytes of the body; complete when all of it was read.
+    '''
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        chunks, size = [], 0
+        while True:
+            line = await reader.readline()
+            try:
+                length = int(line.split(b';')[0].strip(), 16)
+            except ValueError:
+                raise FetchError('Malformed chunked body')
+            if length == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass # trailers
+                return b''.join(chunks), True
+            if size + length > max_bytes:
+                chunks.append(await reader.readexactly(max_bytes - size))
+                return b''.join(chunks), False
+            chunks.append(await reader.readexactly(length))
+            size += length
+            await reader.readexactly(2) # CRLF after each chunk
+
+    if 'content-length' in headers:
+        try:
+            length = int(headers['content-length'])
+        except ValueError:
+            raise FetchError('Malformed Content-Length')
+        return await reader.readexactly(min(length, max_bytes)), length <= max_bytes
+
+    # Delimited by the end of the connection
+    chunks, size = [], 0
+    while size < max_bytes:
+        chunk = await reader.read(max_bytes - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b''.join(chunks), False
+
+async def _read_response(reader, method, max_bytes):
+    '''
+    (status, headers, body, reusable) of one response.
+    '''
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError('Connection closed before the response')
+    version, _, rest = line.decode('latin-1').partition(' ')
+    try:
+        status = int(rest[:3])
+    except ValueError:
+        raise FetchError('Malformed response')
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise FetchError('Too many response headers')
+    keep_alive = bool(line) and version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+    if method == 'HEAD' or status in (204, 304) or status < 200:
+        return status, headers, b'', keep_alive
+    body, complete = await _read_body(reader, headers, max_bytes)
+    return status, headers, body, keep_alive and complete
+
+async def request(pool, url, method='GET', max_bytes=0, headers=None):
+    '''
+    One request on a pooled connection: (status, headers, body), body cut at max_bytes.
+    '''
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise FetchError(f'Unsupported URL: {url[:100]}')
+    try:
+        host = parts.hostname.encode('idna').decode('ascii')
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except (UnicodeError, ValueError):
+        raise FetchError(f'Invalid host: {parts.netloc[:100]}')
+    origin = (parts.scheme, host, port)
+    target = quote(parts.path or '/', safe="/%!$&'()*+,;=:@~") + (f'?{quote(parts.query, safe="%!$&()*+,;=:@/?~")}' if parts.query else '')
+    lines = [
+        f'{method} {target} HTTP/1.1',
+        f'Host: {host if parts.port is None else f"{host}:{port}"}',
+        f'User-Agent: {pool.user_agent}',
+        'Accept-Encoding: identity',
+        *(f'{name}: {value}' for name, value in (headers or {}).items()),
+    ]
+    data = ('\r\n'.join(lines) + '\r\n\r\n').encode('ascii')
+
+    for attempt in (1, 2):
+        reader, writer, reused = await pool.connect(origin)
+        try:
+            writer.write(data)
+            status, response_headers, body, reusable = await _read_response(reader, method, max_bytes)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            if reused and attempt == 1:
+                continue # the server closed the idle connection first; retry on a new one
+            raise
+        except BaseException:
+            writer.close()
+            raise
+        if reusable:
+            pool.release(origin, reader, writer)
+        else:
+            writer.close()
+        return status, response_headers, body
+
+async def follow(pool, url, method='GET', max_bytes=0, headers=None, max_redirects=5):
+    '''
+    request() that follows redirects; returns the final Response.
+    '''
+    for _ in range(max_redirects + 1):
+        status, response_headers, body = await request(pool, url, method, max_bytes, headers)
+        if status in REDIRECTS and response_headers.get('location'):
+            url = urljoin(url, response_headers['location'])
+            continue
+        return Response(url, status, response_headers, body)
+    raise FetchError('Too many redirects')
+
+# What follow() raises when a page cannot be fetched
+ERRORS = (asyncio.TimeoutError, FetchError, OSError, EOFError, ValueError)
+
+def describe(exc):
+    '''
+    (message, retry) for one of ERRORS; retry when the failure may pass later.
+    '''
+    if isinstance(exc, asyncio.TimeoutError):
+        return 'Timed out', True
+    if isinstance(exc, FetchError):
+        return str(exc), exc.retry
+    if isinstance(exc, ssl.SSLError):
+        return f'TLS: {exc.reason or exc}', False
+    if isinstance(exc, (OSError, EOFError)):
+        return f'{type(exc).__name__}: {exc}', True
+    return f'Malformed response: {exc}', False # e.g. a header line over the stream limit
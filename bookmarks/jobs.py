@@ -0,0 +1,237 @@
+'''
+Durable background jobs, stored in the database (the Job model); no external broker.
+
+Code enqueues work with `enqueue()`/`enqueue_many()`, normally inside the transaction that
+writes the rows the job refers to, so a job is never lost and never points at a rolled-back
+row. `manage.py bookmarks_worker` processes claim due jobs and run them through the handler
+registered for their kind:
+
+- batching: a worker claims up to `batch_size` due jobs of one kind and passes all their
+  payloads to the handler in one call, so a handler can do one query (or one round of
+  requests) per batch instead of per job
+- retries: a failed job is queued again with exponential backoff (JOB_RETRY_DELAY) until it
+  has run JOB_MAX_ATTEMPTS times; then it stays `failed` with its last error
+- idempotency: enqueueing a `key` that is already stored is a no-op
+- crash safety: jobs left `running` by a worker that died are queued again after JOB_TIMEOUT,
+  so a job can run more than once and handlers must be idempotent
+
+Claiming is a conditional UPDATE (status='queued' -> 'running'), so concurrent workers never
+run the same job, with or without row locks (SQLite has none).
+'''
+import logging, os, random, socket, threading, time
+from importlib import import_module
+from collections import namedtuple
+from datetime import timedelta
+from django.db import OperationalError, close_old_connections
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from . import conf, metrics
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+Handler = namedtuple('Handler', 'func batch_size')
+_handlers = {}
+
+# Modules that register handlers when imported; loaded on first use, so web processes that
+# only enqueue jobs never import them (or the HTTP client they bring in)
+HANDLER_MODULES = ['bookmarks.link_metadata']
+
+# Seconds between housekeeping passes (reap() and purge()) of a running worker
+MAINTENANCE_INTERVAL = 60.0
+
+def handler(kind, batch_size=1):
+    '''
+    Register `func(payloads)` as the handler of `kind` jobs. It gets the payloads of up to
+    `batch_size` jobs and returns None when all of them succeeded, or {index: error} for the
+    ones that failed. Raising fails the whole batch.
+    '''
+    def register(func):
+        _handlers[kind] = Handler(func, batch_size)
+        return func
+    return register
+
+def load_handlers():
+    for name in HANDLER_MODULES:
+        import_module(name)
+
+def handlers():
+    load_handlers()
+    return dict(_handlers)
+
+# Producing
+def enqueue(kind, payload=None, key=None, delay=0):
+    enqueue_many(kind, [(payload, key)], delay=delay)
+
+def enqueue_many(kind, items, delay=0):
+    '''
+    One job of `kind` per (payload, key) item, in one INSERT; keys already stored are skipped.
+    '''
+    run_at = timezone.now() + timedelta(seconds=delay)
+    jobs = [Job(kind=kind, payload=payload or {}, key=key, run_at=run_at) for payload, key in items]
+    if jobs:
+        Job.objects.bulk_create(jobs, ignore_conflicts=True)
+
+def submitted(bookmark_ids):
+    '''
+    Enqueue the SUBMIT_JOBS for newly submitted bookmarks (one INSERT per job kind).
+    '''
+    bookmark_ids = list(bookmark_ids)
+    for kind in conf.get('SUBMIT_JOBS') if bookmark_ids else ():
+        enqueue_many(kind, [({'id': i}, f'{kind}:{i}') for i in bookmark_ids])
+
+# Consuming
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'[-64:]
+
+def backoff(attempts):
+    '''
+    Seconds to wait before retry number `attempts` (1-based), with jitter so failed batches spread out.
+    '''
+    delay = min(conf.get('JOB_RETRY_MAX_DELAY'), conf.get('JOB_RETRY_DELAY') * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def claim(worker, kinds=None):
+    '''
+    Mark up to one batch of due jobs of a single kind as running for `worker`.
+    Returns (kind, jobs): (None, []) when nothing is due, (kind, []) when another worker won the race.
+    '''
+    load_handlers()
+    kinds = [k for k in (kinds or _handlers) if k in _handlers]
+    if not kinds:
+        return None, []
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    kind = kinds[0] if len(kinds) == 1 else due.filter(kind__in=kinds).values_list('kind', flat=True).first()
+    if kind is None:
+        return None, []
+
+    ids = list(due.filter(kind=kind).values_list('id', flat=True)[:_handlers[kind].batch_size])
+    if not ids:
+        return None, []
+    claimed = Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+        status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return kind, []
+    return kind, list(Job.objects.filter(id__in=ids, status=Job.RUNNING, locked_by=worker).order_by('run_at', 'id'))
+
+def run(kind, jobs):
+    '''
+    Run one claimed batch and record each job's outcome. Returns {'done': n, 'retried': n, 'failed': n}.
+    '''
+    started = time.perf_counter()
+    try:
+        failures = _handlers[kind].func([job.payload for job in jobs]) or {}
+    except Exception as exc:
+        logger.exception('%s: batch of %d job(s) failed', kind, len(jobs))
+        failures = dict.fromkeys(range(len(jobs)), exc)
+
+    now = timezone.now()
+    done = [job.id for i, job in enumerate(jobs) if i not in failures]
+    Job.objects.filter(id__in=done).update(status=Job.DONE, finished_at=now, locked_by='', last_error='')
+
+    failed = []
+    for i, error in failures.items():
+        job = jobs[i]
+        job.last_error = str(error)[:2000] or type(error).__name__
+        job.locked_by = ''
+        if job.attempts >= conf.get('JOB_MAX_ATTEMPTS'):
+            job.status, job.finished_at = Job.FAILED, now
+        else:
+            job.status, job.run_at = Job.QUEUED, now + timedelta(seconds=backoff(job.attempts))
+        failed.append(job)
+    if failed:
+        Job.objects.bulk_update(failed, ['status', 'run_at', 'finished_at', 'locked_by', 'last_error'])
+
+    outcome = {
+        'done': len(done),
+        'retried': sum(job.status == Job.QUEUED for job in failed),
+        'failed': sum(job.status == Job.FAILED for job in failed),
+    }
+    for result, n in outcome.items():
+        if n:
+            metrics.inc('bookmarks_jobs_total', (('kind', kind), ('result', result)), n)
+    metrics.observe('bookmarks_job_batch_duration_seconds', (('kind', kind),), time.perf_counter() - started)
+    return outcome
+
+def reap():
+    '''
+    Queue again the jobs whose worker has held them longer than JOB_TIMEOUT (it most likely died);
+    the ones out of attempts are failed instead. Returns the number of jobs released.
+    '''
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=conf.get('JOB_TIMEOUT')))
+    failed = stale.filter(attempts__gte=conf.get('JOB_MAX_ATTEMPTS')).update(
+        status=Job.FAILED, finished_at=now, locked_by='', last_error='Timed out',
+    )
+    return failed + stale.update(status=Job.QUEUED, run_at=now, locked_by='', last_error='Timed out')
+
+def purge():
+    '''
+    Delete jobs that finished successfully more than JOB_RETENTION seconds ago.
+    '''
+    cutoff = timezone.now() - timedelta(seconds=conf.get('JOB_RETENTION'))
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+def work(worker=None, kinds=None, once=False, idle_sleep=1.0, stop=None):
+    '''
+    Claim and run batches until `stop` (a threading.Event) is set, or with once=True until
+    no job is due. Returns the number of jobs processed.
+    '''
+    worker = worker or worker_id()
+    stop = stop or threading.Event()
+    processed, last_maintenance = 0, None
+    while not stop.is_set():
+        try:
+            if last_maintenance is None or time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+                reap()
+                purge()
+                last_maintenance = time.monotonic()
+            kind, batch = claim(worker, kinds)
+        except OperationalError as exc:
+            # SQLite: another process held the write lock for longer than the busy timeout
+            logger.warning('Could not claim jobs: %s', exc)
+            close_old_connections()
+            stop.wait(idle_sleep)
+            continue
+
+        if batch:
+            run(kind, batch)
+            processed += len(batch)
+            metrics.maybe_flush()
+        elif kind is None:
+            if once:
+                break
+            close_old_connections() # idle: do not hold a connection past CONN_MAX_AGE
+            stop.wait(idle_sleep)
+    return processed
+
+# Visibility
+def stats():
+    '''
+    {kind: {'queued': n, 'running': n, 'failed': n, 'oldest_due_seconds': s}} for unfinished jobs;
+    one grouped query per status, each served by that status's partial index.
+    '''
+    now = timezone.now()
+    out = {}
+    for status in (Job.QUEUED, Job.RUNNING, Job.FAILED):
+        rows = Job.objects.filter(status=status).order_by().values('kind').annotate(n=Count('id'), oldest=Min('run_at'))
+        for row in rows:
+            entry = out.setdefault(row['kind'], {Job.QUEUED: 0, Job.RUNNING: 0, Job.FAILED: 0, 'oldest_due_seconds': 0.0})
+            entry[status] = row['n']
+            if status == Job.QUEUED:
+                entry['oldest_due_seconds'] = round(max(0.0, (now - row['oldest']).total_seconds()), 3)
+    return out
+
+def gauges():
+    '''
+    stats() as gauges for metrics.render().
+    '''
+    depth, lag = {}, {}
+    for kind, entry in stats().items():
+        for status in (Job.QUEUED, Job.RUNNING, Job.FAILED):
+            depth[(('kind', kind), ('status', status))] = entry[status]
+        lag[(('kind', kind),)] = entry['oldest_due_seconds']
+    return {'bookmarks_jobs': depth, 'bookmarks_jobs_oldest_due_seconds': lag}
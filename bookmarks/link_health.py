@@ -0,0 +1,192 @@
+'''
+Link health: a sweep over approved bookmarks that finds dead links.
+
+`manage.py bookmarks_check_links` (run it from cron) checks approved bookmarks that were never
+checked first (by id), then the ones whose last check is older than LINK_CHECK_INTERVAL, oldest
+first. Both orders are keysets served by partial indexes, and a checked row leaves them, so:
+
+- memory stays at one window of rows (--batch-size), however big the corpus
+- an interrupted sweep resumes where it stopped; at most the unsaved results are checked again
+- --max-time bounds a run; the next run carries on
+
+Each URL gets a HEAD request, and a GET for its first byte (Range: bytes=0-0) when HEAD fails,
+since plenty of servers answer HEAD wrongly. Requests go through one httpclient.Pool for the
+whole sweep: LINK_CHECK_CONCURRENCY in flight, LINK_CHECK_PER_DOMAIN per Bookmark.domain, and
+LINK_CHECK_DOMAIN_DELAY seconds between two requests to one domain. So that one big domain
+cannot fill the window, it gets at most a tenth of it; its other rows wait for the next run.
+
+Status, latency, error and check time are stored on the bookmark. A link is dead
+(Bookmark.link_dead, see ?dead= on the list endpoint) after LINK_DEAD_AFTER consecutive failed
+checks: 4xx/5xx, DNS and connection errors, timeouts. 429 counts neither way; one success
+revives the link. Run one sweep at a time.
+'''
+import asyncio, time
+from collections import Counter, namedtuple
+from datetime import timedelta
+from asgiref.sync import async_to_sync, sync_to_async
+from django.utils import timezone
+from . import conf, httpclient
+from .models import Bookmark
+from .signals import bookmarks_changed
+
+Check = namedtuple('Check', 'status latency_ms error') # status None: no response
+
+# Stored on Bookmark by record()
+FIELDS = ('link_status', 'link_error', 'link_latency_ms', 'link_checked_at', 'link_failures', 'link_dead')
+# Row shape read by due()
+ROW = ('id', 'url', 'domain', 'link_failures', 'link_dead', 'link_checked_at')
+# Too many requests: the server is fine, we were too eager
+INCONCLUSIVE = {429}
+# Results stored per UPDATE round
+FLUSH_EVERY = 100
+
+def new_pool(**options):
+    return httpclient.Pool(**{
+        'concurrency': conf.get('LINK_CHECK_CONCURRENCY'),
+        'per_domain': conf.get('LINK_CHECK_PER_DOMAIN'),
+        'delay': conf.get('LINK_CHECK_DOMAIN_DELAY'),
+        'allow_private': conf.get('METADATA_ALLOW_PRIVATE'),
+        'user_agent': conf.get('METADATA_USER_AGENT'),
+        **options,
+    })
+
+async def check(pool, url, domain=''):
+    '''
+    Check one URL: HEAD, then a one-byte GET when HEAD fails. Never raises.
+    '''
+    async with pool.slot(domain):
+        started = time.perf_counter()
+        timeout = conf.get('LINK_CHECK_TIMEOUT')
+        try:
+            response = await asyncio.wait_for(httpclient.follow(pool, url, 'HEAD'), timeout)
+            if response.status >= 400 and response.status not in INCONCLUSIVE:
+                response = await asyncio.wait_for(
+                    httpclient.follow(pool, response.url, 'GET', headers={'Range': 'bytes=0-0'}), timeout,
+                )
+        except httpclient.ERRORS as exc:
+            error, _ = httpclient.describe(exc)
+            return Check(None, round((time.perf_counter() - started) * 1000), error[:300])
+    return Check(response.status, round((time.perf_counter() - started) * 1000), '')
+
+def failed(result):
+    '''
+    True (failed), False (passed) or None (inconclusive) for a Check.
+    '''
+    if result.status in INCONCLUSIVE:
+        return None
+    return result.status is None or result.status >= 400
+
+# Sweep
+def due(limit, after=None, cutoff=None):
+    '''
+    Up to `limit` approved bookmarks to check, as ROW tuples, following the keyset `after`
+    (the last row of the previous call): never checked first, then checked before `cutoff`.
+    '''
+    approved = Bookmark.objects.filter(is_approved=True)
+    cutoff = cutoff or timezone.now() - timedelta(seconds=conf.get('LINK_CHECK_INTERVAL'))
+    rows = []
+    if after is None or after[-1] is None:
+        unchecked = approved.filter(link_checked_at__isnull=True).order_by('id')
+        if after is not None:
+            unchecked = unchecked.filter(id__gt=after[0])
+        rows = list(unchecked.values_list(*ROW)[:limit])
+        if len(rows) == limit:
+            return rows
+        after = None
+    stale = approved.filter(link_checked_at__lt=cutoff).order_by('link_checked_at', 'id')
+    if after is not None:
+        checked_at, last_id = after[-1], after[0]
+        stale = stale.filter(link_checked_at__gte=checked_at).exclude(link_checked_at=checked_at, id__lte=last_id)
+    return rows + list(stale.values_list(*ROW)[:limit - len(rows)])
+
+def record(results, now=None):
+    '''
+    Store [(row, Check)]; returns Counter(checked=, dead=, revived=).
+    '''
+    now = now or timezone.now()
+    dead_after = conf.get('LINK_DEAD_AFTER')
+    bookmarks, flipped, counts = [], [], Counter(checked=len(results))
+    for (bookmark_id, _, _, failures, dead, _), result in results:
+        outcome = failed(result)
+        if outcome is not None:
+            failures = failures + 1 if outcome else 0
+        now_dead = failures >= dead_after
+        if now_dead != dead:
+            flipped.append(bookmark_id)
+            counts['dead' if now_dead else 'revived'] += 1
+        bookmarks.append(Bookmark(
+            id=bookmark_id, link_status=result.status, link_error=result.error, link_latency_ms=result.latency_ms,
+            link_checked_at=now, link_failures=min(failures, 32767), link_dead=now_dead,
+        ))
+    Bookmark.objects.bulk_update(bookmarks, FIELDS)
+    if flipped:
+        # ?dead= pages changed; bulk_update() sends no model signals
+        bookmarks_changed.send(sender=Bookmark, ids=flipped, action='link_checked')
+    return counts
+
+async def _sweep(batch_size, limit, max_seconds, progress):
+    load = sync_to_async(due, thread_sensitive=True)
+    save = sync_to_async(record, thread_sensitive=True)
+    cutoff = timezone.now() - timedelta(seconds=conf.get('LINK_CHECK_INTERVAL'))
+    deadline = None if max_seconds is None else time.monotonic() + max_seconds
+    pool = new_pool()
+    totals, pending, in_flight, finished = Counter(), [], set(), []
+    after, exhausted, loaded = None, False, 0
+    per_domain = Counter() # checks started and not finished
+    max_per_domain = max(pool.per_domain, batch_size // 10)
+
+    async def run(row):
+        return row, await check(pool, row[1], row[2])
+
+    try:
+        while True:
+            stopping = deadline is not None and time.monotonic() >= deadline
+            while not stopping and len(in_flight) < batch_size:
+                if not pending:
+                    size = batch_size if limit is None else min(batch_size, limit - loaded)
+                    if exhausted or size <= 0:
+                        break
+                    pending = (await load(size, after, cutoff))[::-1]
+                    loaded += len(pending)
+                    exhausted = len(pending) < size
+                    if not pending:
+                        break
+                    after = pending[0]
+                row = pending.pop()
+                if per_domain[row[2]] >= max_per_domain:
+                    totals['skipped'] += 1 # one domain may not fill the window; next run
+                    continue
+                per_domain[row[2]] += 1
+                in_flight.add(asyncio.ensure_future(run(row)))
+            if not in_flight:
+                break
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                row, result = task.result()
+                per_domain[row[2]] -= 1
+                if not per_domain[row[2]]:
+                    del per_domain[row[2]]
+                finished.append((row, result))
+            if len(finished) >= FLUSH_EVERY:
+                totals.update(await save(finished))
+                finished = []
+                if progress:
+                    progress(totals)
+    finally:
+        if finished:
+            totals.update(await save(finished))
+        for task in in_flight:
+            task.cancel()
+        await pool.close()
+    if progress:
+        progress(totals)
+    return dict(totals)
+
+def sweep(batch_size=1000, limit=None, max_seconds=None, progress=None):
+    '''
+    Check due links until none is left, `limit` were loaded, or `max_seconds` passed.
+    `batch_size` rows are read per query and at most that many checks are pending at once.
+    Returns {'checked': n, 'dead': n, 'revived': n, 'skipped': n}.
+    '''
+    # Database calls go back to this thread (sync_to_async), so they share its connection
+    return async_to_sync(_sweep)(batch_size, limit, max_seconds, progress)
@@ -0,0 +1,192 @@
+'''
+Link metadata: fetch each bookmark's page and keep what it says about itself (<title>, meta
+description, canonical URL, where redirects end) in LinkMetadata, so moderators do not have to
+open every submission by hand.
+
+Pages are fetched concurrently with bookmarks.httpclient (pooled keep-alive connections):
+
+- at most METADATA_PER_DOMAIN requests are in flight per Bookmark.domain, and
+  METADATA_CONCURRENCY overall
+- each page (redirects included) has METADATA_TIMEOUT seconds, and at most METADATA_MAX_BYTES
+  of a body are read (parsing stops at </head>)
+- URLs that resolve to loopback, private or link-local addresses are refused unless
+  METADATA_ALLOW_PRIVATE
+
+Fetching runs in the 'fetch_metadata' background job, which is in the default SUBMIT_JOBS, and
+in `manage.py bookmarks_fetch_metadata` for existing bookmarks.
+'''
+import asyncio, codecs, re
+from collections import namedtuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+from django.utils import timezone
+from . import conf, httpclient, jobs
+from .models import Bookmark, LinkMetadata
+
+JOB_KIND = 'fetch_metadata'
+
+# LinkMetadata fields filled from a fetch
+FIELDS = ('status_code', 'final_url', 'canonical_url', 'title', 'description', 'content_type', 'error')
+# retry: the fetch failed in a way that may pass later (timeout, refused connection)
+Metadata = namedtuple('Metadata', FIELDS + ('retry',), defaults=(None, '', '', '', '', '', '', False))
+
+HTML_TYPES = {'text/html', 'application/xhtml+xml'}
+_HEAD_END = re.compile(rb'</head\s*>|<body[\s>]', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.I)
+
+# HTML
+class _HeadParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.meta = {}
+        self.canonical = None
+        self._title = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: value or '' for name, value in attrs}
+        if tag == 'title' and self.title is None:
+            self._title = []
+        elif tag == 'meta':
+            name = (attrs.get('name') or attrs.get('property') or '').lower()
+            if name in ('description', 'og:description', 'og:title') and name not in self.meta:
+                self.meta[name] = attrs.get('content', '')
+        elif tag == 'link' and self.canonical is None and 'canonical' in attrs.get('rel', '').lower().split():
+            self.canonical = attrs.get('href') or None
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title is not None:
+            self.title, self._title = ''.join(self._title), None
+
+    def handle_data(self, data):
+        if self._title is not None:
+            self._title.append(data)
+
+    def close(self):
+        super().close()
+        if self._title is not None: # cut off by METADATA_MAX_BYTES, maybe inside </title>
+            self.title = ''.join(self._title).rpartition('</')[0] or ''.join(self._title)
+
+def _decode(body, content_type_params):
+    charset = None
+    for param in content_type_params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = value.strip().strip('"\'')
+    if not charset:
+        match = _META_CHARSET.search(body[:2048])
+        charset = match and match.group(1).decode('ascii')
+    try:
+        codecs.lookup(charset or 'utf-8')
+    except LookupError:
+        charset = None
+    return body.decode(charset or 'utf-8', errors='replace')
+
+def _clean(text, length):
+    return ' '.join((text or '').split())[:length]
+
+def parse(url, status, headers, body):
+    '''
+    Metadata of the final response: status and type always, title and friends for HTML pages.
+    '''
+    content_type, _, params = headers.get('content-type', '').partition(';')
+    content_type = content_type.strip().lower()
+    metadata = Metadata(status_code=status, final_url=url[:2000], content_type=content_type[:100])
+    if status >= 400:
+        return metadata._replace(error=f'HTTP {status}')
+    if content_type and content_type not in HTML_TYPES:
+        return metadata
+
+    end = _HEAD_END.search(body)
+    parser = _HeadParser()
+    parser.feed(_decode(body[:end.start()] if end else body, params))
+    parser.close()
+    canonical = urljoin(url, parser.canonical.strip()) if parser.canonical else ''
+    if urlsplit(canonical).scheme not in ('http', 'https'):
+        canonical = ''
+    return metadata._replace(
+        title=_clean(parser.title or parser.meta.get('og:title'), 300),
+        description=_clean(parser.meta.get('description') or parser.meta.get('og:description'), 1000),
+        canonical_url=canonical[:2000],
+    )
+
+# Fetching
+def new_pool(**options):
+    '''
+    An httpclient.Pool with the METADATA_* settings, overridden by `options`.
+    '''
+    return httpclient.Pool(**{
+        'concurrency': conf.get('METADATA_CONCURRENCY'),
+        'per_domain': conf.get('METADATA_PER_DOMAIN'),
+        'allow_private': conf.get('METADATA_ALLOW_PRIVATE'),
+        'user_agent': conf.get('METADATA_USER_AGENT'),
+        **options,
+    })
+
+async def fetch(pool, url, domain=''):
+    '''
+    Metadata of `url` after redirects. Never raises: failures are described in .error.
+    '''
+    async with pool.slot(domain or urlsplit(url).hostname or ''):
+        try:
+            response = await asyncio.wait_for(httpclient.follow(
+                pool, url, max_bytes=conf.get('METADATA_MAX_BYTES'), max_redirects=conf.get('METADATA_MAX_REDIRECTS'),
+                headers={'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.1'},
+            ), conf.get('METADATA_TIMEOUT'))
+        except httpclient.ERRORS as exc:
+            error, retry = httpclient.describe(exc)
+            return Metadata(error=error[:300], retry=retry)
+    return parse(*response)
+
+async def fetch_all(targets, pool=None):
+    '''
+    Metadata for each (url, domain) of `targets`, in order.
+    '''
+    own = pool is None
+    pool = pool or new_pool()
+    try:
+        return await asyncio.gather(*(fetch(pool, url, domain) for url, domain in targets))
+    finally:
+        if own:
+            await pool.close()
+
+# Storing
+def store(results):
+    '''
+    Save {bookmark_id: Metadata}, two INSERTs at most. A retryable failure never replaces
+    metadata fetched earlier.
+    '''
+    now = timezone.now()
+    rows = {True: [], False: []}
+    for bookmark_id, metadata in results.items():
+        row = LinkMetadata(bookmark_id=bookmark_id, fetched_at=now, **{f: getattr(metadata, f) for f in FIELDS})
+        rows[metadata.retry].append(row)
+    if rows[False]:
+        LinkMetadata.objects.bulk_create(
+            rows[False], update_conflicts=True, unique_fields=['bookmark'], update_fields=[*FIELDS, 'fetched_at'],
+        )
+    if rows[True]:
+        LinkMetadata.objects.bulk_create(rows[True], ignore_conflicts=True)
+
+def enrich(ids):
+    '''
+    Fetch and store the metadata of bookmarks `ids` (ids no longer stored are skipped).
+    Returns {bookmark_id: Metadata}.
+    '''
+    rows = list(Bookmark.objects.filter(id__in=ids).order_by('id').values_list('id', 'url', 'domain'))
+    if not rows:
+        return {}
+    results = asyncio.run(fetch_all([(url, domain) for _, url, domain in rows]))
+    results = {bookmark_id: metadata for (bookmark_id, _, _), metadata in zip(rows, results)}
+    store(results)
+    return results
+
+@jobs.handler(JOB_KIND, batch_size=200)
+def fetch_metadata_job(payloads):
+    # Retryable failures go back to the queue (with backoff); the rest are final results
+    results = enrich([payload['id'] for payload in payloads])
+    return {
+        i: results[payload['id']].error
+        for i, payload in enumerate(payloads)
+        if payload['id'] in results and results[payload['id']].retry
+    }
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from bookmarks import link_health
+
+class Command(BaseCommand):
+    help = 'Check approved bookmarks for dead links: never checked first, then the least recently checked.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows read per query, and most checks in flight')
+        parser.add_argument('--limit', type=int, default=None, help='Check at most this many bookmarks')
+        parser.add_argument('--max-time', type=float, default=None, help='Stop starting checks after this many seconds')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(totals):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(
+                f"{totals['checked']} checked ({totals['dead']} dead, {totals['revived']} revived), "
+                f"{totals['checked'] / elapsed * 60:.0f}/min"
+            )
+
+        totals = link_health.sweep(
+            batch_size=options['batch_size'], limit=options['limit'], max_seconds=options['max_time'], progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {totals.get('checked', 0)} link(s): {totals.get('dead', 0)} newly dead, "
+            f"{totals.get('revived', 0)} revived, {totals.get('skipped', 0)} skipped."
+        ))
@@ -0,0 +1,64 @@
+import csv, gzip, io, itertools, json, sys, time
+from django.core.management.base import BaseCommand
+from bookmarks import fastread
+from bookmarks.models import Bookmark
+
+FIELDS = ['id', 'title', 'url', 'description', 'tags', 'pending_tags', 'is_approved', 'approved_at', 'created_at']
+
+def _open(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', newline='', write_through=True)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+class Command(BaseCommand):
+    help = 'Stream bookmarks to NDJSON or CSV in constant memory (readable by bookmarks_import).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file ('-' for stdout; .gz is compressed)")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--approved-only', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--progress-every', type=int, default=100_000, help='Rows between progress lines (0 to disable)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.removesuffix('.gz').endswith('.csv') else 'ndjson')
+        progress_every = options['progress_every']
+        chunk_size = options['chunk_size']
+
+        qs = Bookmark.objects.order_by('id')
+        if options['approved_only']:
+            qs = qs.filter(is_approved=True)
+        rows = qs.values(*[f for f in FIELDS if f != 'tags']).iterator(chunk_size=chunk_size)
+
+        started = time.perf_counter()
+        written = 0
+        next_report = progress_every
+        with _open(path) as out:
+            writer = csv.DictWriter(out, fieldnames=FIELDS) if fmt == 'csv' else None
+            if writer:
+                writer.writeheader()
+
+            while chunk := list(itertools.islice(rows, chunk_size)):
+                tags = fastread.tag_slugs(r['id'] for r in chunk) # one query per chunk
+                for r in chunk:
+                    r['tags'] = tags.get(r['id'], [])
+                    for field in ('approved_at', 'created_at'):
+                        r[field] = r[field].isoformat() if r[field] else None
+                    if writer:
+                        writer.writerow({**r, 'tags': ','.join(r['tags']), 'pending_tags': ','.join(r['pending_tags'])})
+                    else:
+                        out.write(json.dumps({f: r[f] for f in FIELDS}, ensure_ascii=False) + '\n')
+                written += len(chunk)
+
+                if progress_every and written >= next_report:
+                    elapsed = time.perf_counter() - started
+                    self.stderr.write(f'... {written} row(s) in {elapsed:.1f}s ({written / elapsed:,.0f} rows/s)')
+                    next_report += progress_every
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {written} row(s) in {elapsed:.1f}s ({written / elapsed if elapsed else 0:,.0f} rows/s).'
+        ))
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand
+from bookmarks import link_metadata
+from bookmarks.models import Bookmark
+
+class Command(BaseCommand):
+    help = 'Fetch link metadata (title, description, canonical URL, redirects) for existing bookmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refetch bookmarks that already have metadata')
+        parser.add_argument('--pending', action='store_true', help='Only unapproved bookmarks')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Bookmarks fetched concurrently per batch')
+
+    def handle(self, *args, **options):
+        bookmarks = Bookmark.objects.order_by('id')
+        if not options['all']:
+            bookmarks = bookmarks.filter(metadata__isnull=True)
+        if options['pending']:
+            bookmarks = bookmarks.filter(is_approved=False)
+
+        fetched = failed = 0
+        started = time.perf_counter()
+        last_id = 0
+        while True:
+            # Keyset batches: stored metadata moves rows out of the filter while it runs
+            ids = list(bookmarks.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            last_id = ids[-1]
+            results = link_metadata.enrich(ids)
+            fetched += len(results)
+            failed += sum(bool(m.error) for m in results.values())
+            elapsed = time.perf_counter() - started
+            self.stderr.write(f'{fetched} fetched ({failed} with errors), {fetched / elapsed * 60:.0f}/min')
+
+        self.stdout.write(self.style.SUCCESS(f'Fetched metadata for {fetched} bookmark(s), {failed} with errors.'))
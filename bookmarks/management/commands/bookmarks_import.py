@@ -0,0 +1,140 @@
+import csv, gzip, io, itertools, json, sys, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from bookmarks import bulk
+from bookmarks.models import Bookmark
+from bookmarks.serializers import _canon_url
+from bookmarks.signals import bookmarks_changed
+
+def _open(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def _read_rows(handle, fmt):
+    '''
+    Yield (line number, dict) pairs. CSV list columns (tags, pending_tags) are comma separated.
+    '''
+    if fmt == 'csv':
+        for n, row in enumerate(csv.DictReader(handle), start=2):
+            yield n, row
+    else:
+        for n, line in enumerate(handle, start=1):
+            if line.strip():
+                yield n, json.loads(line)
+
+def _list(value):
+    if isinstance(value, str):
+        return value.split(',')
+    return value or []
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+class Command(BaseCommand):
+    help = (
+        'Stream bookmarks from NDJSON or CSV (as written by bookmarks_export) into the database '
+        'in chunks, skipping urls that are already stored.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file ('-' for stdin; .gz is decompressed)")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--create-tags', action='store_true', help='Create unknown tags instead of leaving them in pending_tags')
+        parser.add_argument('--progress-every', type=int, default=100_000, help='Rows between progress lines (0 to disable)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.removesuffix('.gz').endswith('.csv') else 'ndjson')
+        self.create_tags = options['create_tags']
+        self.counts = {'read': 0, 'created': 0, 'duplicate': 0, 'invalid': 0}
+        self.started = time.perf_counter()
+        progress_every = options['progress_every']
+        next_report = progress_every
+
+        try:
+            with _open(path) as handle:
+                rows = _read_rows(handle, fmt)
+                while chunk := list(itertools.islice(rows, options['batch_size'])):
+                    self.import_chunk(chunk)
+                    if progress_every and self.counts['read'] >= next_report:
+                        self.report()
+                        next_report += progress_every
+        except (OSError, json.JSONDecodeError, csv.Error) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        self.report(done=True)
+
+    def import_chunk(self, chunk):
+        self.counts['read'] += len(chunk)
+        parsed = []
+        for n, row in chunk:
+            bookmark = self.build(row)
+            if bookmark is None:
+                self.counts['invalid'] += 1
+                self.stderr.write(f'line {n}: skipped invalid row')
+                continue
+            parsed.append(bookmark)
+
+        # One tag query (plus one insert with --create-tags) per chunk
+        slugs = {s for b in parsed for s in b.submitted_tags}
+        if self.create_tags:
+            known, _ = bulk.ensure_tags(slugs)
+        else:
+            known = bulk.resolve_tags(slugs)
+        for b in parsed:
+            b.known_tags = [known[s] for s in b.submitted_tags if s in known]
+            b.pending_tags = list(dict.fromkeys(b.pending_tags + [s for s in b.submitted_tags if s not in known]))
+
+        results = bulk.create_bookmarks(parsed)
+        created = [b for b in results if b is not None]
+        self.counts['created'] += len(created)
+        self.counts['duplicate'] += len(results) - len(created)
+
+        approved = [b.id for b in created if b.is_approved]
+        if approved:
+            bookmarks_changed.send(sender=Bookmark, ids=approved, action='created')
+
+    def build(self, row):
+        '''
+        Unsaved Bookmark from an input row, or None if it cannot be imported.
+        '''
+        try:
+            url = (row.get('url') or '').strip()
+            if not url.startswith(('http://', 'https://')) or len(url) > 200:
+                return None
+            bookmark = Bookmark(
+                title=(row.get('title') or '').strip()[:120],
+                url=_canon_url(url),
+                description=(row.get('description') or '').strip()[:500],
+                pending_tags=bulk.clean_slugs(_list(row.get('pending_tags'))),
+                is_approved=_flag(row.get('is_approved', False)),
+            )
+            if row.get('created_at'):
+                bookmark.created_at = parse_datetime(row['created_at'])
+            if row.get('approved_at'):
+                bookmark.approved_at = parse_datetime(row['approved_at'])
+            if not bookmark.title or bookmark.created_at is None:
+                return None
+        except (AttributeError, TypeError, ValueError):
+            return None
+        bookmark.submitted_tags = [s[:50] for s in bulk.clean_slugs(_list(row.get('tags')))]
+        return bookmark
+
+    def report(self, done=False):
+        elapsed = time.perf_counter() - self.started
+        c = self.counts
+        line = (
+            f"{'Imported' if done else '...'} {c['read']} row(s) in {elapsed:.1f}s "
+            f"({c['read'] / elapsed if elapsed else 0:,.0f} rows/s): "
+            f"{c['created']} created, {c['duplicate']} duplicate, {c['invalid']} invalid"
+        )
+        if done:
+            self.stdout.write(self.style.SUCCESS(line))
+        else:
+            self.stderr.write(line)
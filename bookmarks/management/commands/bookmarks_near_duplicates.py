@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from bookmarks import near_duplicates
+from bookmarks.models import Bookmark
+
+class Command(BaseCommand):
+    help = 'Flag pending bookmarks that look like an older bookmark (for submissions the index missed).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also approved bookmarks')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Bookmarks flagged per batch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        index = near_duplicates.get_index()
+        index.rebuild()
+        self.stderr.write(f'Index of {len(index)} bookmark(s) built in {time.perf_counter() - started:.1f}s')
+
+        bookmarks = Bookmark.objects.filter(near_duplicate_of__isnull=True, lsh_bands__isnull=False).order_by('id')
+        if not options['all']:
+            bookmarks = bookmarks.filter(is_approved=False)
+        bookmarks = bookmarks.only('id', 'title', 'description', 'url', 'lsh_bands')
+
+        checked = flagged = 0
+        last_id = 0
+        while True:
+            batch = list(bookmarks.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            checked += len(batch)
+            flagged += len(near_duplicates.flag(batch))
+            self.stderr.write(f'{checked} checked, {flagged} flagged')
+
+        self.stdout.write(self.style.SUCCESS(f'Flagged {flagged} of {checked} bookmark(s) as near duplicates.'))
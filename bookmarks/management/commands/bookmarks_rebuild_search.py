@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from bookmarks import cache as response_cache
+from bookmarks import search
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from approved bookmarks.'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('No full-text index for this database (run migrations; SQLite needs FTS5).')
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            count = search.rebuild()
+        response_cache.bump() # cached ?search= pages came from the old index
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} bookmark(s) in {elapsed:.2f}s.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from bookmarks import cache as response_cache
+from bookmarks import domain_counts
+
+class Command(BaseCommand):
+    help = 'Recompute the per-domain counts (DomainStat) from the database and repair any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = domain_counts.drift() if options['dry_run'] else domain_counts.reconcile()
+
+        for domain, (stored, actual) in sorted(drifted.items()):
+            self.stdout.write(f'{domain}: approved {stored[0]} -> {actual[0]}, total {stored[1]} -> {actual[1]}')
+        if drifted and not options['dry_run']:
+            response_cache.bump()
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} domain count(s) {verb}.'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from bookmarks import cache as response_cache
+from bookmarks import tag_counts
+from bookmarks.models import Tag
+
+class Command(BaseCommand):
+    help = 'Recompute Tag.approved_count from the database and repair any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = tag_counts.drift() if options['dry_run'] else tag_counts.reconcile()
+
+        slugs = dict(Tag.objects.filter(id__in=drifted).values_list('id', 'slug'))
+        for tag_id, (stored, actual) in sorted(drifted.items()):
+            self.stdout.write(f'{slugs.get(tag_id, tag_id)}: {stored} -> {actual}')
+        if drifted and not options['dry_run']:
+            response_cache.bump()
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'{len(drifted)} tag count(s) {verb}.'))
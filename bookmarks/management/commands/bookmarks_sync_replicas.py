@@ -0,0 +1,28 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from bookmarks import conf, db
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database over every READ_REPLICAS file (local stand-in for replication).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=None, help='Keep copying, this many seconds apart')
+
+    def handle(self, *args, **options):
+        aliases = conf.get('READ_REPLICAS')
+        if not aliases:
+            raise CommandError('No READ_REPLICAS configured (set BOOKMARKS_READ_REPLICAS).')
+        databases = [settings.DATABASES[alias] for alias in ['default', *aliases]]
+        if any(d['ENGINE'] != 'django.db.backends.sqlite3' for d in databases):
+            raise CommandError('Only SQLite databases can be copied; replicate other backends with their own tools.')
+
+        primary, replicas = str(databases[0]['NAME']), [str(d['NAME']) for d in databases[1:]]
+        while True:
+            started = time.perf_counter()
+            for path in replicas:
+                db.copy_database(primary, path)
+            self.stdout.write(self.style.SUCCESS(f'Copied {primary} to {len(replicas)} replica(s) in {time.perf_counter() - started:.2f}s.'))
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
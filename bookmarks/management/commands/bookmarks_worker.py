@@ -0,0 +1,76 @@
+import multiprocessing, signal, threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from bookmarks import jobs
+
+def _serve(kinds, once, idle_sleep):
+    # One worker loop; SIGTERM/SIGINT finish the current batch and stop
+    stop = threading.Event()
+    previous = {signum: signal.signal(signum, lambda *args: stop.set()) for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        return jobs.work(kinds=kinds, once=once, idle_sleep=idle_sleep, stop=stop)
+    finally:
+        # Run in-process (call_command), the caller's handlers apply again afterwards
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+def _child(kinds, once, idle_sleep):
+    try:
+        _serve(kinds, once, idle_sleep)
+    finally:
+        connections.close_all()
+
+class Command(BaseCommand):
+    help = 'Run background jobs (see bookmarks.jobs) until stopped, or print the queue depth.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to fork (default 1: run in this process)')
+        parser.add_argument('--kinds', default='', help='Comma-separated job kinds to run (default: every registered kind)')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help='Seconds to wait when no job is due')
+        parser.add_argument('--stats', action='store_true', help='Print unfinished jobs per kind and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_stats()
+
+        kinds = [k.strip() for k in options['kinds'].split(',') if k.strip()] or None
+        unknown = set(kinds or ()) - jobs.handlers().keys()
+        if unknown:
+            raise CommandError(f'No handler registered for: {", ".join(sorted(unknown))}')
+        if not jobs.handlers():
+            self.stderr.write('No job handlers are registered; nothing will run.')
+
+        args = (kinds, options['once'], options['idle_sleep'])
+        if options['processes'] <= 1:
+            processed = _serve(*args)
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} job(s).'))
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=_child, args=args, daemon=True) for _ in range(options['processes'])]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate() # SIGTERM: finish the current batch, then exit
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS(f'{len(children)} worker process(es) stopped.'))
+
+    def print_stats(self):
+        stats = jobs.stats()
+        if not stats:
+            self.stdout.write('No unfinished jobs.')
+            return
+        self.stdout.write(f'{"kind":<32} {"queued":>8} {"running":>8} {"failed":>8} {"oldest due":>11}')
+        for kind, entry in sorted(stats.items()):
+            self.stdout.write(
+                f'{kind:<32} {entry["queued"]:>8} {entry["running"]:>8} {entry["failed"]:>8} {entry["oldest_due_seconds"]:>10.1f}s'
+            )
@@ -0,0 +1,341 @@
+'''
+Request metrics for the bookmarks endpoints, exposed in Prometheus text format.
+
+Recording is lock-free: every thread increments its own shard (plain dicts), and shards
+are only summed when metrics are read. Each worker process periodically writes its totals
+to BOOKMARKS['METRICS_DIR']/<pid>.json; the metrics endpoint sums those files, so any
+worker can answer a scrape for the whole host without an external service. Files of
+processes that are gone are removed when they are merged.
+
+What is recorded per route (the url name, e.g. bookmarks-list):
+- request latency, response size, SQL queries and SQL time (via a connection execute wrapper)
+- time spent in throttles and in JSON rendering (see `phase`)
+- throttle decisions per scope, and the response-cache hit/miss counters
+'''
+import bisect, contextlib, contextvars, glob, ipaddress, json, os, tempfile, threading, time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from . import conf
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (help, buckets); names without buckets are counters
+METRICS = {
+    'bookmarks_http_request_duration_seconds': ('Time from middleware entry to response.', LATENCY_BUCKETS),
+    'bookmarks_http_response_size_bytes': ('Body size of non-streaming responses.', SIZE_BUCKETS),
+    'bookmarks_db_queries_per_request': ('SQL statements executed per request.', COUNT_BUCKETS),
+    'bookmarks_db_duration_seconds': ('Total SQL time per request.', LATENCY_BUCKETS),
+    'bookmarks_db_query_duration_seconds': ('Duration of individual SQL statements.', LATENCY_BUCKETS),
+    'bookmarks_phase_duration_seconds': ('Time per request spent in throttling and serialization.', LATENCY_BUCKETS),
+    'bookmarks_throttle_decisions_total': ('Throttle checks by scope and result.', None),
+    'bookmarks_response_cache_total': ('Response cache lookups and writes by result.', None),
+    'bookmarks_jobs_total': ('Background jobs run by kind and result (done, retried, failed).', None),
+    'bookmarks_job_batch_duration_seconds': ('Time to run one batch of background jobs.', LATENCY_BUCKETS),
+}
+
+# Point-in-time values read when rendering (see render(gauges=...)); name -> help
+GAUGES = {
+    'bookmarks_jobs': 'Unfinished background jobs by kind and status.',
+    'bookmarks_jobs_oldest_due_seconds': 'How long the oldest due queued job has been waiting, by kind.',
+}
+
+_shards = []
+_shards_lock = threading.Lock() # only taken when a thread records for the first time
+_local = threading.local()
+_pid = os.getpid()
+_last_flush = 0.0
+_current = contextvars.ContextVar('bookmarks_request_metrics', default=None)
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None or _local.pid != _pid:
+        shard = ({}, {}) # counters, histograms
+        with _shards_lock:
+            _shards.append(shard)
+        _local.shard, _local.pid = shard, _pid
+    return shard
+
+def _after_fork():
+    # A child must not report its parent's counts under its own pid
+    global _shards, _shards_lock, _pid, _last_flush
+    _shards, _shards_lock, _pid, _last_flush = [], threading.Lock(), os.getpid(), 0.0
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def reset():
+    '''
+    Forget everything recorded by this process.
+    '''
+    with _shards_lock:
+        for counters, histograms in _shards:
+            counters.clear()
+            histograms.clear()
+
+# Recording
+def inc(name, labels=(), value=1):
+    counters = _shard()[0]
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+def observe(name, labels, value):
+    histograms = _shard()[1]
+    key = (name, labels)
+    buckets = METRICS[name][1]
+    h = histograms.get(key)
+    if h is None:
+        h = histograms[key] = [0] * (len(buckets) + 2) # one count per bucket, +Inf, then the sum
+    h[bisect.bisect_left(buckets, value)] += 1
+    h[-1] += value
+
+class RequestMetrics:
+    __slots__ = ('queries', 'phases')
+
+    def __init__(self):
+        self.queries = []
+        self.phases = {}
+
+@contextlib.contextmanager
+def phase(name):
+    '''
+    Add the time spent in the block to the current request's `name` phase (no-op outside a request).
+    '''
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.phases[name] = state.phases.get(name, 0.0) + time.perf_counter() - started
+
+def _time_query(execute, sql, params, many, context):
+    state = _current.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries.append(time.perf_counter() - started)
+
+def install(connection, **kwargs):
+    '''
+    Time every statement run on `connection` for the request in progress (see _current).
+
+    The wrapper stays on the connection for good: async views run their queries in other
+    threads, each with its own connection objects, which a per-request
+    connection.execute_wrapper() around the view would never see. Connected to
+    connection_created, and applied to the existing connections by the app's ready().
+    '''
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+class MetricsMiddleware:
+    '''
+    Times every request routed to the bookmarks app and counts its SQL statements.
+    Works for sync and async views alike; the request state travels in a context variable.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not conf.get('METRICS'):
+            return self.get_response(request)
+
+        state = RequestMetrics()
+        token = _current.set(state)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, state, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        if not conf.get('METRICS'):
+            return await self.get_response(request)
+
+        state = RequestMetrics()
+        token = _current.set(state)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, state, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, state, elapsed):
+        match = request.resolver_match
+        if match is not None and match.namespace == 'bookmarks':
+            self.record(match.url_name or match.view_name, request, response, state, elapsed)
+        maybe_flush()
+
+    def record(self, route, request, response, state, elapsed):
+        labels = (('route', route),)
+        observe('bookmarks_http_request_duration_seconds', labels + (('method', request.method), ('status', str(response.status_code))), elapsed)
+        if not response.streaming:
+            observe('bookmarks_http_response_size_bytes', labels, len(response.content))
+        observe('bookmarks_db_queries_per_request', labels, len(state.queries))
+        observe('bookmarks_db_duration_seconds', labels, sum(state.queries))
+        for duration in state.queries:
+            observe('bookmarks_db_query_duration_seconds', labels, duration)
+        for name, duration in state.phases.items():
+            observe('bookmarks_phase_duration_seconds', labels + (('phase', name),), duration)
+
+# Reading
+def _label_text(labels):
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    return ','.join(f'{k}="{escape(v)}"' for k, v in labels)
+
+def snapshot():
+    '''
+    This process's totals as JSON-able dicts: {'counters': {name: {labels: value}}, 'histograms': {...}}.
+    '''
+    from . import cache as response_cache
+    out = {'counters': {}, 'histograms': {}}
+    with _shards_lock:
+        shards = list(_shards)
+    for counters, histograms in shards:
+        for (name, labels), value in list(counters.items()):
+            series = out['counters'].setdefault(name, {})
+            key = _label_text(labels)
+            series[key] = series.get(key, 0) + value
+        for (name, labels), h in list(histograms.items()):
+            series = out['histograms'].setdefault(name, {})
+            key = _label_text(labels)
+            series[key] = [a + b for a, b in zip(series[key], h)] if key in series else list(h)
+
+    stats = response_cache.stats() # kept by bookmarks.cache itself
+    out['counters']['bookmarks_response_cache_total'] = {
+        _label_text((('result', name),)): stats[name] for name in ('hits', 'misses', 'stores', 'invalidations')
+    }
+    return out
+
+def merge(snapshots):
+    total = {'counters': {}, 'histograms': {}}
+    for snap in snapshots:
+        for name, series in snap.get('counters', {}).items():
+            merged = total['counters'].setdefault(name, {})
+            for key, value in series.items():
+                merged[key] = merged.get(key, 0) + value
+        for name, series in snap.get('histograms', {}).items():
+            merged = total['histograms'].setdefault(name, {})
+            for key, h in series.items():
+                merged[key] = [a + b for a, b in zip(merged[key], h)] if key in merged else list(h)
+    return total
+
+def flush():
+    '''
+    Write this process's snapshot to METRICS_DIR/<pid>.json (atomically).
+    '''
+    global _last_flush
+    directory = conf.get('METRICS_DIR')
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, os.path.join(directory, f'{os.getpid()}.json'))
+    _last_flush = time.monotonic()
+
+def maybe_flush():
+    if conf.get('METRICS_DIR') and time.monotonic() - _last_flush >= conf.get('METRICS_FLUSH_INTERVAL'):
+        flush()
+
+def collect():
+    '''
+    Totals for the host: every worker's last snapshot, with this process's numbers fresh.
+    '''
+    directory = conf.get('METRICS_DIR')
+    if not directory:
+        return snapshot()
+    flush()
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        if not _is_running(path):
+            with contextlib.suppress(OSError):
+                os.remove(path) # a worker that exited (or was restarted under a new pid)
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue # being replaced or truncated; it will be back on the next scrape
+    return merge(snapshots)
+
+def _is_running(path):
+    # Snapshot files are named after the pid of the worker that writes them (see flush)
+    try:
+        pid = int(os.path.basename(path)[:-len('.json')])
+    except ValueError:
+        return True
+    if os.name != 'posix':
+        return True # no signal 0 to probe with
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass # alive, under another user
+    return True
+
+def is_allowed(request):
+    '''
+    Whether `request` may read the metrics: staff, or a client address in METRICS_ALLOWED_NETWORKS.
+    '''
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(net, strict=False) for net in conf.get('METRICS_ALLOWED_NETWORKS'))
+
+def render(data=None, gauges=None):
+    '''
+    Prometheus text exposition format (version 0.0.4).
+    `gauges` are current values, {name: {labels: value}}, for names listed in GAUGES.
+    '''
+    data = collect() if data is None else data
+    lines = []
+    for name, (help_text, buckets) in METRICS.items():
+        kind = 'histogram' if buckets else 'counter'
+        series = data['histograms' if buckets else 'counters'].get(name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(series.items()):
+            if not buckets:
+                lines.append(f'{name}{{{labels}}} {value}')
+                continue
+            prefix = f'{labels},' if labels else ''
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {value[-1]}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    for name, help_text in GAUGES.items():
+        series = (gauges or {}).get(name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in sorted(series.items()):
+            lines.append(f'{name}{{{_label_text(labels)}}} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,52 @@
+from django.db import migrations, transaction
+from django.db.utils import DatabaseError
+
+FTS_TABLE = 'bookmarks_bookmark_fts'
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    Bookmark = apps.get_model('bookmarks', 'Bookmark')
+    table = Bookmark._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"title, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+        except DatabaseError:
+            return # SQLite built without FTS5; search falls back to icontains
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+            f'SELECT id, title, description FROM {table} WHERE is_approved'
+        )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE TABLE {FTS_TABLE} ('
+            f'bookmark_id bigint PRIMARY KEY REFERENCES {table} (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(f'CREATE INDEX {FTS_TABLE}_document_idx ON {FTS_TABLE} USING GIN (document)')
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (bookmark_id, document) '
+            f"SELECT id, setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', description), 'B') "
+            f'FROM {table} WHERE is_approved'
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0003_bookmark_uniq_lower_url'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+def populate(apps, schema_editor):
+    Tag = apps.get_model('bookmarks', 'Tag')
+    counts = Tag.objects.annotate(n=Count('bookmarks', filter=Q(bookmarks__is_approved=True))).values_list('id', 'n')
+    for tag_id, n in counts:
+        if n:
+            Tag.objects.filter(id=tag_id).update(approved_count=n)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0005_bookmark_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='approved_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-approved_count', 'name'], name='bookmarks_t_approve_4c2f1e_idx'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
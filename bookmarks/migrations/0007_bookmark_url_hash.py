@@ -0,0 +1,95 @@
+import hashlib, sys
+from urllib.parse import unquote, urlsplit, urlunsplit
+from django.db import migrations, models
+
+# Frozen copy of bookmarks.models.url_hash() and canonical_url() as of this migration, so later
+# changes to them do not change what it backfills
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'ref_src'}
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+def _ascii_host(host):
+    if host.isascii():
+        return host
+    try:
+        return host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return host
+
+def canonical_url(raw):
+    parts = urlsplit(raw.strip())
+    scheme = parts.scheme.lower()
+
+    userinfo, at, hostport = parts.netloc.lower().rpartition('@')
+    if hostport.startswith('['): # IPv6 literal
+        host, _, port = hostport.partition(']')
+        host, port = host + ']', port.lstrip(':')
+    else:
+        host, _, port = hostport.partition(':')
+    netloc = userinfo + at + _ascii_host(host.rstrip('.'))
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += ':' + port
+
+    path = parts.path
+    if path in ('', '/'):
+        path = ''
+
+    pieces = []
+    for piece in parts.query.split('&'):
+        name = unquote(piece.partition('=')[0]).lower()
+        if piece and name not in TRACKING_PARAMS and not name.startswith(TRACKING_PREFIXES):
+            pieces.append(piece)
+    pieces.sort(key=lambda p: p.partition('=')[0])
+
+    return urlunsplit((scheme, netloc, path, '&'.join(pieces), ''))
+
+def url_hash(url):
+    return hashlib.sha256(canonical_url(url.lower()).encode('utf-8')).hexdigest()
+
+def backfill(apps, schema_editor):
+    '''
+    Hash every stored url. Rows that the extended canonicalization now folds into an older
+    row (same url up to tracking parameters, query order, ...) keep a NULL hash and are listed.
+    '''
+    Bookmark = apps.get_model('bookmarks', 'Bookmark')
+    seen, batch, duplicates = set(), [], []
+    for bookmark in Bookmark.objects.order_by('id').only('id', 'url').iterator(chunk_size=2000):
+        value = url_hash(bookmark.url)
+        if value in seen:
+            duplicates.append(bookmark.id)
+            continue
+        seen.add(value)
+        bookmark.url_hash = value
+        batch.append(bookmark)
+        if len(batch) >= 2000:
+            Bookmark.objects.bulk_update(batch, ['url_hash'])
+            batch = []
+    Bookmark.objects.bulk_update(batch, ['url_hash'])
+    if duplicates:
+        sys.stdout.write(f'\n  {len(duplicates)} bookmark(s) duplicate an older url and were left without url_hash: {duplicates[:50]}\n')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0006_tag_approved_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookmark',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='bookmark',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        # url_hash is case-insensitive too, and covers more variants
+        migrations.RemoveConstraint(
+            model_name='bookmark',
+            name='uniq_lower_url',
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+def populate(apps, schema_editor):
+    Bookmark = apps.get_model('bookmarks', 'Bookmark')
+    DomainStat = apps.get_model('bookmarks', 'DomainStat')
+    rows = Bookmark.objects.order_by().exclude(domain='').values('domain').annotate(
+        approved=Count('id', filter=Q(is_approved=True)),
+        total=Count('id'),
+    )
+    DomainStat.objects.bulk_create(
+        [DomainStat(domain=r['domain'], approved_count=r['approved'], total_count=r['total']) for r in rows.iterator()],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0007_bookmark_url_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DomainStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255, unique=True)),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('total_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['domain'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['domain', 'created_at'], name='bookmark_approved_domain_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='domainstat',
+            index=models.Index(fields=['-approved_count', 'domain'], name='bookmarks_d_approve_b55ba7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='domainstat',
+            index=models.Index(fields=['-total_count', 'domain'], name='bookmarks_d_total_c_14b942_idx'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
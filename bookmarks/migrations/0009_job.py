@@ -0,0 +1,32 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0008_domainstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('key', models.CharField(blank=True, max_length=200, null=True, unique=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=64)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['run_at'], name='job_queued_idx'), models.Index(condition=models.Q(('status', 'queued')), fields=['kind', 'run_at'], name='job_queued_kind_idx'), models.Index(condition=models.Q(('status', 'running')), fields=['locked_at'], name='job_running_idx'), models.Index(condition=models.Q(('status', 'done')), fields=['finished_at'], name='job_done_idx'), models.Index(condition=models.Q(('status', 'failed')), fields=['kind'], name='job_failed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0009_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LinkMetadata',
+            fields=[
+                ('bookmark', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='metadata', serialize=False, to='bookmarks.bookmark')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('final_url', models.URLField(blank=True, max_length=2000)),
+                ('canonical_url', models.URLField(blank=True, max_length=2000)),
+                ('title', models.CharField(blank=True, max_length=300)),
+                ('description', models.CharField(blank=True, max_length=1000)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('error', models.CharField(blank=True, max_length=300)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'link metadata',
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0010_linkmetadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_checked_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_dead',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_error',
+            field=models.CharField(blank=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_failures',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_latency_ms',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='link_status',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(condition=models.Q(('is_approved', True), ('link_dead', False)), fields=['created_at'], name='bookmark_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(condition=models.Q(('is_approved', True), ('link_dead', True)), fields=['created_at'], name='bookmark_dead_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['link_checked_at', 'id'], name='bookmark_link_checked_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+import hashlib, random, re, struct
+from urllib.parse import unquote, urlsplit
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of bookmarks.models.bookmark_lsh_bands() and its parameters as of this migration,
+# so later tuning of the shingling, bands or hashes does not change what it backfills
+
+WORD = re.compile(r'\w+')
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'is', 'it', 'of', 'on', 'or',
+    'the', 'this', 'to', 'with', 'amp', 'www', 'index', 'html', 'htm', 'php', 'aspx',
+}
+LSH_BANDS, LSH_ROWS = 8, 4
+MERSENNE = (1 << 61) - 1
+PERMUTATIONS = [
+    (rng.randrange(1, MERSENNE), rng.randrange(MERSENNE)) for rng in [random.Random(20240611)] for _ in range(LSH_BANDS * LSH_ROWS)
+]
+
+def bookmark_lsh_bands(title, description, url):
+    text = f'{title} {description} {unquote(urlsplit(url).path)}'.lower()
+    tokens = {w for w in WORD.findall(text) if w not in STOP_WORDS}
+    if not tokens:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'little') for t in tokens]
+    mins = [min((a * h + b) % MERSENNE for h in hashes) for a, b in PERMUTATIONS]
+    return b''.join(
+        hashlib.blake2b(struct.pack(f'<{LSH_ROWS}Q', *mins[i:i + LSH_ROWS]), digest_size=4).digest()
+        for i in range(0, len(mins), LSH_ROWS)
+    )
+
+def backfill(apps, schema_editor):
+    '''
+    Compute lsh_bands for every stored bookmark. Existing rows are not flagged; see
+    `manage.py bookmarks_near_duplicates`.
+    '''
+    Bookmark = apps.get_model('bookmarks', 'Bookmark')
+    batch = []
+    for bookmark in Bookmark.objects.order_by('id').only('id', 'title', 'description', 'url').iterator(chunk_size=2000):
+        bookmark.lsh_bands = bookmark_lsh_bands(bookmark.title, bookmark.description, bookmark.url)
+        batch.append(bookmark)
+        if len(batch) >= 2000:
+            Bookmark.objects.bulk_update(batch, ['lsh_bands'])
+            batch = []
+    Bookmark.objects.bulk_update(batch, ['lsh_bands'])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0011_link_health'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookmark',
+            name='lsh_bands',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='near_duplicate_of',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='bookmarks.bookmark'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
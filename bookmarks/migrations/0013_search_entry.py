@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookmarks', '0012_near_duplicates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('bookmark', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='bookmarks.bookmark')),
+                ('document', models.TextField(db_column='bookmarks_bookmark_fts')),
+            ],
+            options={
+                'db_table': 'bookmarks_bookmark_fts',
+                'managed': False,
+            },
+        ),
+    ]
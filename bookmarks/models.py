@@ -1,15 +1,137 @@
+import hashlib, random, re, struct
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
-from urllib.parse import urlsplit
+from django.utils import timezone
+from urllib.parse import unquote, urlsplit, urlunsplit
 from django.core.exceptions import ValidationError
 
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'ref_src'}
+TRACKING_PREFIXES = ('utm_',)
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+def url_domain(url):
+    '''
+    https://www.google.com -> google.com
+    '''
+    host = urlsplit(url).netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+def _ascii_host(host):
+    # IDN hostnames -> punycode (bücher.example -> xn--bcher-kva.example)
+    if host.isascii():
+        return host
+    try:
+        return host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return host
+
+def canonical_url(raw):
+    '''
+    The form a submitted URL is stored in: lowercase scheme and host, IDN host in punycode,
+    no default port, no fragment, no trailing slash on the bare domain, and the query with
+    tracking parameters (utm_*, fbclid, ...) removed and the rest sorted by name.
+    Query pieces are kept as sent, never re-encoded.
+        HTTPS://Bücher.Example:443/?utm_source=x&b=2&a=1#top -> https://xn--bcher-kva.example?a=1&b=2
+    '''
+    parts = urlsplit(raw.strip())
+    scheme = parts.scheme.lower()
+
+    userinfo, at, hostport = parts.netloc.lower().rpartition('@')
+    if hostport.startswith('['): # IPv6 literal
+        host, _, port = hostport.partition(']')
+        host, port = host + ']', port.lstrip(':')
+    else:
+        host, _, port = hostport.partition(':')
+    netloc = userinfo + at + _ascii_host(host.rstrip('.'))
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc += ':' + port
+
+    path = parts.path
+    if path in ('', '/'):
+        path = '' # no trailing slash for domain root
+
+    pieces = []
+    for piece in parts.query.split('&'):
+        name = unquote(piece.partition('=')[0]).lower()
+        if piece and name not in TRACKING_PARAMS and not name.startswith(TRACKING_PREFIXES):
+            pieces.append(piece)
+    pieces.sort(key=lambda p: p.partition('=')[0]) # stable: repeated names keep their order
+
+    return urlunsplit((scheme, netloc, path, '&'.join(pieces), ''))
+
+def url_hash(url):
+    '''
+    Duplicate-detection key: sha256 of the canonical URL, case-insensitive like the old
+    lower(url) constraint, so every variant canonical_url() folds together maps to one value.
+    '''
+    return hashlib.sha256(canonical_url(url.lower()).encode('utf-8')).hexdigest()
+
+def clean_slugs(raw_tags):
+    '''
+    Strip/lowercase submitted tags, dropping blanks and repeats (first occurrence wins).
+    '''
+    return list(dict.fromkeys(s.strip().lower() for s in raw_tags if s and s.strip()))
+
+# Near-duplicate key (see bookmarks.near_duplicates): MinHash of the words of the title,
+# description and URL path, cut into LSH bands. The host is left out, so mirrors match.
+WORD = re.compile(r'\w+')
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'is', 'it', 'of', 'on', 'or',
+    'the', 'this', 'to', 'with', 'amp', 'www', 'index', 'html', 'htm', 'php', 'aspx',
+}
+LSH_BANDS, LSH_ROWS = 8, 4 # 32 hashes; pairs with Jaccard 0.6 share a band 80% of the time
+MERSENNE = (1 << 61) - 1
+_PERMUTATIONS = [
+    (rng.randrange(1, MERSENNE), rng.randrange(MERSENNE)) for rng in [random.Random(20240611)] for _ in range(LSH_BANDS * LSH_ROWS)
+]
+
+def text_tokens(title, description, url):
+    '''
+    The set of words near-duplicate detection compares, e.g. for an AMP copy on a mirror:
+        'How dicts work', '', 'https://mirror.example/amp/python-dicts' -> {'dicts', 'work', 'python'}
+    '''
+    text = f'{title} {description} {unquote(urlsplit(url).path)}'.lower()
+    return {w for w in WORD.findall(text) if w not in STOP_WORDS}
+
+def lsh_bands(tokens):
+    '''
+    LSH_BANDS 4-byte keys packed in bytes (None for no tokens): a band key is the hash of
+    LSH_ROWS MinHash values, so two token sets share a band with probability ~J**LSH_ROWS.
+    '''
+    if not tokens:
+        return None
+    hashes = [int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'little') for t in tokens]
+    mins = [min((a * h + b) % MERSENNE for h in hashes) for a, b in _PERMUTATIONS]
+    return b''.join(
+        hashlib.blake2b(struct.pack(f'<{LSH_ROWS}Q', *mins[i:i + LSH_ROWS]), digest_size=4).digest()
+        for i in range(0, len(mins), LSH_ROWS)
+    )
+
+def bookmark_lsh_bands(title, description, url):
+    return lsh_bands(text_tokens(title, description, url))
+
 # Create your models here.
 class Tag(models.Model):
     name = models.CharField(max_length=50)
     slug = models.SlugField(max_length=50, unique=True)
+    # Approved bookmarks carrying this tag; maintained incrementally (see bookmarks.tag_counts)
+    approved_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['-approved_count', 'name']),
+        ]
+
+    def save(self, *args, **kwargs):
+        # approved_count is changed with F() updates; never write back a stale in-memory value
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'approved_count']
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -21,39 +143,167 @@ class Bookmark(models.Model):
     description = models.CharField(max_length=500)
     tags = models.ManyToManyField(Tag, related_name='bookmarks')
     pending_tags = models.JSONField(default=list, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False) # not auto_now_add, so imports can keep it
     # Private (admin) fields
     is_approved = models.BooleanField(default=False)
     approved_at = models.DateTimeField(null=True, blank=True)
     approved_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
     submitted_ip = models.CharField(max_length=45, null=True, blank=True)
     domain = models.CharField(max_length=255, db_index=True, blank=True)
+    # url_hash(url); unique, so duplicate checks are one index lookup
+    url_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)
+    # Link health, kept by the dead-link sweep (see bookmarks.link_health)
+    link_status = models.PositiveSmallIntegerField(null=True, blank=True, editable=False) # None: no response (see link_error)
+    link_error = models.CharField(max_length=300, blank=True, editable=False)
+    link_latency_ms = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    link_checked_at = models.DateTimeField(null=True, blank=True, editable=False)
+    link_failures = models.PositiveSmallIntegerField(default=0, editable=False) # consecutive failed checks
+    link_dead = models.BooleanField(default=False, editable=False)
+    # Near-duplicate detection (see bookmarks.near_duplicates): bookmark_lsh_bands(title, description, url),
+    # and the oldest bookmark of the group this one was flagged into at submission
+    lsh_bands = models.BinaryField(null=True, editable=False)
+    near_duplicate_of = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.SET_NULL, related_name='near_duplicates', editable=False,
+    )
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['is_approved', '-created_at']),
+            # ?domain= pages: an index range scan in created_at order, however big the domain
+            models.Index(fields=['domain', 'created_at'], condition=Q(is_approved=True), name='bookmark_approved_domain_idx'),
+            # ?dead= pages
+            models.Index(fields=['created_at'], condition=Q(is_approved=True, link_dead=False), name='bookmark_live_idx'),
+            models.Index(fields=['created_at'], condition=Q(is_approved=True, link_dead=True), name='bookmark_dead_idx'),
+            # The sweep order: never checked (NULLs first, by id), then checked longest ago
+            models.Index(fields=['link_checked_at', 'id'], condition=Q(is_approved=True), name='bookmark_link_checked_idx'),
         ]
-        constraints = [
-            models.UniqueConstraint(models.functions.Lower('url'), name='uniq_lower_url', violation_error_message='URL already submitted')
-        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the approval state and domain as loaded, so signal handlers can tell what changed on save
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_is_approved = instance.__dict__.get('is_approved')
+        instance._loaded_domain = instance.__dict__.get('domain')
+        return instance
+
+    @property
+    def was_approved(self):
+        '''
+        Approval state when loaded from the database (False for new instances).
+        '''
+        return bool(getattr(self, '_loaded_is_approved', False))
+
+    @property
+    def loaded_domain(self):
+        '''
+        Domain when loaded from the database (the current one if unknown).
+        '''
+        return getattr(self, '_loaded_domain', None) or self.domain
 
     def save(self, *args, **kwargs):
         '''
-        Compute and set domain from url (overwrites any existing value).
+        Compute and set domain, url_hash and lsh_bands (overwrites any existing values).
         https://www.google.com -> google.com
         '''
         if self.url:
-            host = urlsplit(self.url).netloc.lower()
-            if host.startswith('www.'):
-                host = host[4:]
-            self.domain = host
+            self.domain = url_domain(self.url)
+            self.url_hash = url_hash(self.url)
+        self.lsh_bands = bookmark_lsh_bands(self.title, self.description, self.url)
         super().save(*args, **kwargs)
+        self._loaded_is_approved = self.is_approved
+        self._loaded_domain = self.domain
 
     def clean(self):
         super().clean()
         if self.url and not (self.url.startswith('http://') or self.url.startswith('https://')):
             raise ValidationError({'url': 'URL must start with http:// or https://'})
+        if self.url and Bookmark.objects.filter(url_hash=url_hash(self.url)).exclude(pk=self.pk).exists():
+            raise ValidationError({'url': 'URL already submitted'})
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+class DomainStat(models.Model):
+    '''
+    Bookmark counts per domain; maintained incrementally (see bookmarks.domain_counts).
+    '''
+    domain = models.CharField(max_length=255, unique=True)
+    approved_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['domain']
+        indexes = [
+            models.Index(fields=['-approved_count', 'domain']),
+            models.Index(fields=['-total_count', 'domain']),
+        ]
+
+    def __str__(self):
+        return self.domain
+
+class Job(models.Model):
+    '''
+    A unit of background work, run by `manage.py bookmarks_worker` (see bookmarks.jobs).
+    '''
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    # Idempotency key: enqueueing a key that is already stored is a no-op
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now) # not before; pushed back on retries
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            # Partial, so finished jobs never slow down claiming or reaping
+            models.Index(fields=['run_at'], condition=Q(status='queued'), name='job_queued_idx'),
+            models.Index(fields=['kind', 'run_at'], condition=Q(status='queued'), name='job_queued_kind_idx'),
+            models.Index(fields=['locked_at'], condition=Q(status='running'), name='job_running_idx'),
+            models.Index(fields=['finished_at'], condition=Q(status='done'), name='job_done_idx'),
+            models.Index(fields=['kind'], condition=Q(status='failed'), name='job_failed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+class LinkMetadata(models.Model):
+    '''
+    What a bookmarked page says about itself, fetched in the background for moderators (see bookmarks.link_metadata).
+    '''
+    bookmark = models.OneToOneField(Bookmark, primary_key=True, on_delete=models.CASCADE, related_name='metadata')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True) # None: no response (see error)
+    final_url = models.URLField(max_length=2000, blank=True) # where redirects ended
+    canonical_url = models.URLField(max_length=2000, blank=True)
+    title = models.CharField(max_length=300, blank=True)
+    description = models.CharField(max_length=1000, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    error = models.CharField(max_length=300, blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'link metadata'
+
+    def __str__(self):
+        return self.title or self.final_url or self.error
+
+class SearchEntry(models.Model):
+    '''
+    A row of the SQLite FTS5 index (see bookmarks.search), so searches can join it through the ORM.
+    Unmanaged: the migrations create the table, and bookmarks.search keeps it in step.
+    '''
+    bookmark = models.OneToOneField(Bookmark, primary_key=True, db_column='rowid', db_constraint=False, on_delete=models.DO_NOTHING, related_name='search_entry')
+    document = models.TextField(db_column='bookmarks_bookmark_fts') # FTS5's hidden column named after the table: the target of MATCH
+
+    class Meta:
+        managed = False
+        db_table = 'bookmarks_bookmark_fts'
\ No newline at end of file
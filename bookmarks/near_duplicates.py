@@ -0,0 +1,217 @@
+'''
+Near-duplicate submissions: mirrors, AMP pages and re-titled copies of a stored bookmark.
+
+Every bookmark stores lsh_bands (see bookmarks.models.bookmark_lsh_bands): a MinHash of the
+words of its title, description and URL path, cut into LSH_BANDS keys. Two bookmarks whose
+word sets overlap by Jaccard J share a key with probability 1 - (1 - J**LSH_ROWS)**LSH_BANDS
+(0.8 at J=0.6, 0.06 at J=0.3), so a lookup is one probe per band, never a scan of the table.
+
+Each worker keeps the keys in memory: per band, a sorted array of key << 32 | bookmark id
+(8 bytes per bookmark and band, found with bisect) plus a dict of the keys added since the
+last merge. It is built from the lsh_bands column in a background thread on first use, reads
+the rows added since (ids above the highest it has) before every lookup, and is rebuilt once
+NEAR_DUPLICATE_REBUILD_AFTER seconds old, which picks up edits and deletions. Candidates are
+confirmed against the database by primary key, so a stale entry never flags anything.
+
+A new submission whose words overlap an older bookmark's by NEAR_DUPLICATE_THRESHOLD or more
+gets near_duplicate_of set to the oldest bookmark of that group; the admin lists the groups.
+Submissions made while the index is first being built are not flagged; run
+`manage.py bookmarks_near_duplicates` to flag them afterwards.
+'''
+import struct, threading, time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from django.db.models import Max
+from . import conf
+from .models import LSH_BANDS, Bookmark, text_tokens
+
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+MERGE_AFTER = 10_000 # bookmarks added since the last merge
+MAX_ROWS_PER_SYNC = 10_000
+MAX_CANDIDATES = 50 # confirmed per submission, those sharing the most bands first
+
+_keys = struct.Struct(f'<{LSH_BANDS}I').unpack
+
+class NearDuplicateIndex:
+    # Builds run in a thread; submissions are not flagged until the first one is done
+    build_in_background = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = False
+        self.building = False
+        self.built_at = 0.0
+        self.max_id = 0
+        self.tables = [array('Q') for _ in range(LSH_BANDS)]
+        self.recent = [{} for _ in range(LSH_BANDS)] # key -> [bookmark ids], since the last merge
+        self.recent_count = 0
+
+    def __len__(self):
+        return len(self.tables[0]) + self.recent_count
+
+    # Loading
+    def load(self, rows, max_id):
+        '''
+        Replace the contents with `rows` of (bookmark_id, lsh_bands); `max_id` is the highest id they cover.
+        '''
+        columns = [array('Q') for _ in range(LSH_BANDS)]
+        for bookmark_id, bands in rows:
+            for column, key in zip(columns, _keys(bands)):
+                column.append(key << ID_BITS | bookmark_id)
+        tables = [array('Q', sorted(column)) for column in columns]
+        with self.lock:
+            self.tables, self.recent, self.recent_count = tables, [{} for _ in range(LSH_BANDS)], 0
+            self.max_id = max_id
+            self.built_at = time.monotonic()
+            self.ready = True
+
+    def rebuild(self):
+        max_id = Bookmark.objects.aggregate(m=Max('id'))['m'] or 0
+        rows = (
+            Bookmark.objects.filter(id__lte=max_id, lsh_bands__isnull=False)
+            .values_list('id', 'lsh_bands')
+            .iterator(chunk_size=10_000)
+        )
+        self.load(rows, max_id)
+
+    def _rebuild_later(self):
+        if self.building:
+            return
+        self.building = True
+
+        def run():
+            try:
+                self.rebuild()
+            finally:
+                self.building = False
+                if self.build_in_background:
+                    from django.db import connections
+                    connections.close_all() # this thread's connections
+
+        if self.build_in_background:
+            threading.Thread(target=run, name='bookmarks-near-duplicates', daemon=True).start()
+        else:
+            run()
+
+    def add(self, rows):
+        '''
+        Add `rows` of (bookmark_id, lsh_bands).
+        '''
+        with self.lock:
+            for bookmark_id, bands in rows:
+                for recent, key in zip(self.recent, _keys(bands)):
+                    recent.setdefault(key, []).append(bookmark_id)
+                self.recent_count += 1
+                self.max_id = max(self.max_id, bookmark_id)
+            if self.recent_count >= MERGE_AFTER:
+                # Two sorted runs: sorted() merges them in linear time
+                self.tables = [
+                    array('Q', sorted(table + array('Q', (key << ID_BITS | b for key, ids in recent.items() for b in ids))))
+                    for table, recent in zip(self.tables, self.recent)
+                ]
+                self.recent, self.recent_count = [{} for _ in range(LSH_BANDS)], 0
+
+    # Sync
+    def sync(self):
+        '''
+        Read the bookmarks added since the last call. Returns False when the index cannot be used yet.
+        '''
+        if not self.ready:
+            self._rebuild_later()
+            if not self.ready:
+                return False
+        elif time.monotonic() - self.built_at > conf.get('NEAR_DUPLICATE_REBUILD_AFTER'):
+            self._rebuild_later() # answers from the current contents meanwhile
+        self.add(
+            Bookmark.objects.filter(id__gt=self.max_id, lsh_bands__isnull=False)
+            .order_by('id').values_list('id', 'lsh_bands')[:MAX_ROWS_PER_SYNC]
+        )
+        return True
+
+    # Queries
+    def candidates(self, bands, before=None):
+        '''
+        Up to MAX_CANDIDATES ids sharing a band key with `bands` (ids below `before` only),
+        those sharing the most keys first.
+        '''
+        shared = Counter()
+        with self.lock:
+            for table, recent, key in zip(self.tables, self.recent, _keys(bands)):
+                i = bisect_left(table, key << ID_BITS)
+                end = (key + 1) << ID_BITS
+                while i < len(table) and table[i] < end:
+                    shared[table[i] & ID_MASK] += 1
+                    i += 1
+                shared.update(recent.get(key, ()))
+        if before is not None:
+            shared = Counter({b: n for b, n in shared.items() if b < before})
+        return [b for b, _ in shared.most_common(MAX_CANDIDATES)]
+
+def similarity(a, b):
+    '''
+    Jaccard overlap of two token sets (see bookmarks.models.text_tokens).
+    '''
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+def flag(bookmarks):
+    '''
+    Set near_duplicate_of on newly saved `bookmarks` that look like an older bookmark: one query
+    for the new rows, one to confirm the candidates, one UPDATE per group. Returns {id: group id}.
+    '''
+    if not conf.get('NEAR_DUPLICATES'):
+        return {}
+    index = get_index()
+    if not index.sync():
+        return {}
+    bookmarks = sorted((b for b in bookmarks if b.lsh_bands), key=lambda b: b.id)
+    found = {b.id: index.candidates(b.lsh_bands, before=b.id) for b in bookmarks}
+    candidate_ids = {c for ids in found.values() for c in ids}
+    if not candidate_ids:
+        return {}
+    stored = {
+        row[0]: (text_tokens(*row[1:4]), row[4])
+        for row in Bookmark.objects.filter(id__in=candidate_ids).values_list('id', 'title', 'description', 'url', 'near_duplicate_of_id')
+    }
+
+    threshold = conf.get('NEAR_DUPLICATE_THRESHOLD')
+    groups = {}
+    for bookmark in bookmarks:
+        tokens = text_tokens(bookmark.title, bookmark.description, bookmark.url)
+        best = None
+        for candidate_id in found[bookmark.id]:
+            if candidate_id not in stored:
+                continue # deleted, or edited since the index read it
+            other, group = stored[candidate_id]
+            score = similarity(tokens, other)
+            # Closest match; the older one on a tie
+            if score >= threshold and (best is None or (score, -candidate_id) > best[:2]):
+                best = (score, -candidate_id, groups.get(candidate_id) or group or candidate_id)
+        if best is not None:
+            groups[bookmark.id] = best[2]
+
+    members = defaultdict(list)
+    for bookmark_id, group in groups.items():
+        members[group].append(bookmark_id)
+    for group, ids in members.items():
+        Bookmark.objects.filter(id__in=ids).update(near_duplicate_of=group)
+    for bookmark in bookmarks:
+        if bookmark.id in groups:
+            bookmark.near_duplicate_of_id = groups[bookmark.id]
+    return groups
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NearDuplicateIndex()
+    return _index
+
+def reset():
+    global _index
+    _index = None
@@ -0,0 +1,237 @@
+import base64, binascii, json
+from datetime import date, datetime
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Helpers
+def _row_value(row, field):
+    # Rows are model instances, or dicts when the view pages a .values() queryset
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+class KeysetPagination(BasePagination):
+    '''
+    Opaque-cursor (keyset) pagination.
+
+    Seeks on the queryset ordering plus an `id` tie-breaker, e.g. (created_at, id),
+    so every page is an index range scan of page_size + 1 rows regardless of depth.
+    The total is only computed when the client asks for it with ?count=true.
+    Legacy ?page=N requests fall back to page number pagination.
+    '''
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    legacy_page_query_param = 'page'
+    tiebreaker = 'id'
+    default_ordering = ('-created_at',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw:
+            try:
+                size = int(raw)
+            except (TypeError, ValueError):
+                size = 0
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_ordering(self, queryset):
+        '''
+        Resolve the seek keys from the queryset's ordering (set by OrderingFilter or the view),
+        falling back to Meta.ordering. Always ends with the id tie-breaker.
+        '''
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering) or list(self.default_ordering)
+        if not all(isinstance(o, str) for o in ordering):
+            ordering = list(self.default_ordering)
+
+        # Field of each key, to check the values a cursor brings back (see decode_cursor)
+        self.key_fields = {}
+        keys = []
+        for o in ordering:
+            name = o.lstrip('-')
+            if name in ('pk', self.tiebreaker) or name in [k[0] for k in keys]:
+                continue
+            keys.append((name, o.startswith('-')))
+        descending = keys[0][1] if keys else True
+        keys.append((self.tiebreaker, descending))
+        for name, _ in keys:
+            annotation = queryset.query.annotations.get(name)
+            self.key_fields[name] = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+        return keys
+
+    # Cursor encoding
+    def encode_cursor(self, position, reverse):
+        payload = {'p': [_jsonable(v) for v in position]}
+        if reverse:
+            payload['r'] = 1
+        raw = json.dumps(payload, separators=(',', ':')).encode('ascii')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        '''
+        Returns (position, reverse) or None when no cursor was sent.
+        '''
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            payload = json.loads(raw)
+            position = payload['p']
+            if not isinstance(position, list) or len(position) != len(self.keys):
+                raise ValueError
+            position = [self._parse_value(name, value) for (name, _), value in zip(self.keys, position)]
+            return position, bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError, binascii.Error, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _parse_value(self, name, value):
+        # A tampered cursor must not reach the lookup (a bad date there is a 500)
+        if value is None or isinstance(value, (bool, dict, list)):
+            raise ValueError
+        value = self.key_fields[name].to_python(value)
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    def _seek(self, position, reverse):
+        '''
+        Rows strictly after `position` in the current direction:
+            k1 > p1 OR (k1 = p1 AND k2 > p2) ...
+        The leading field is also bounded inclusively so the planner can use a range scan.
+        '''
+        clauses = Q()
+        equal = {}
+        for (name, desc), value in zip(self.keys, position):
+            op = 'lt' if desc != reverse else 'gt'
+            clauses |= Q(**equal, **{f'{name}__{op}': value})
+            equal[name] = value
+        lead, desc = self.keys[0]
+        return Q(**{f"{lead}__{'lte' if desc != reverse else 'gte'}": position[0]}) & clauses
+
+    def plan(self, request, queryset):
+        '''
+        (keys, position, reverse, page_size) that paginate_queryset() will use for `queryset`,
+        or None for legacy ?page= and counted requests. Lets a filter precompute just the page.
+        '''
+        params = request.query_params
+        if (self.legacy_page_query_param in params and self.cursor_query_param not in params) or self.wants_count(request):
+            return None
+        self.keys = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        position, reverse = cursor if cursor else (None, False)
+        return self.keys, position, reverse, self.get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self._start(request)
+        if not page_size:
+            return None
+        if self.legacy is not None:
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.count = queryset.count() if self.wants_count(request) else None
+        return self._finish(list(self._window(queryset, request, page_size)), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        '''
+        paginate_queryset() for async views, through the async ORM.
+        '''
+        page_size = self._start(request)
+        if not page_size:
+            return None
+        if self.legacy is not None:
+            return await sync_to_async(self.legacy.paginate_queryset)(queryset, request, view)
+
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        return self._finish([row async for row in self._window(queryset, request, page_size)], page_size)
+
+    def _start(self, request):
+        self.request = request
+        self.legacy = None
+        page_size = self.get_page_size(request)
+
+        # Keep old ?page=N links working
+        params = request.query_params
+        if page_size and self.legacy_page_query_param in params and self.cursor_query_param not in params:
+            self.legacy = PageNumberPagination()
+            self.legacy.page_size = page_size
+        return page_size
+
+    def _window(self, queryset, request, page_size):
+        # The page_size + 1 rows after the cursor; the extra one tells whether there is more
+        self.keys = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        self.position, self.reverse = cursor if cursor else (None, False)
+
+        order_by = [('-' if desc != self.reverse else '') + name for name, desc in self.keys]
+        queryset = queryset.order_by(*order_by)
+        if self.position is not None:
+            queryset = queryset.filter(self._seek(self.position, self.reverse))
+        return queryset[:page_size + 1]
+
+    def _finish(self, rows, page_size):
+        position, reverse = self.position, self.reverse
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # Walking backwards, the extra row means there is a previous page (and vice versa)
+        has_next = position is not None if reverse else has_more
+        has_previous = has_more if reverse else position is not None
+
+        self.next_position = self.previous_position = None
+        if rows:
+            if has_next:
+                self.next_position = self._position(rows[-1])
+            if has_previous:
+                self.previous_position = self._position(rows[0])
+        return rows
+
+    def _position(self, row):
+        return [_row_value(row, name) for name, _ in self.keys]
+
+    def _link(self, position, reverse):
+        if position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.legacy_page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+    def get_next_link(self):
+        return self._link(self.next_position, False)
+
+    def get_previous_link(self):
+        return self._link(self.previous_position, True)
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+
+        body = {}
+        if self.count is not None:
+            body['count'] = self.count
+        body['next'] = self.get_next_link()
+        body['previous'] = self.get_previous_link()
+        body['results'] = data
+        return Response(body)
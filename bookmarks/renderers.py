@@ -0,0 +1,62 @@
+import math
+from rest_framework.renderers import JSONRenderer
+from . import metrics
+
+try:
+    import orjson
+except ImportError: # optional; falls back to DRF's json.dumps rendering
+    orjson = None
+
+def _has_non_finite(data):
+    '''
+    True when a NaN or infinite float appears anywhere in `data` (dicts, lists, tuples).
+    '''
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+class FastJSONRenderer(JSONRenderer):
+    '''
+    JSONRenderer that encodes with orjson when it is installed.
+
+    Output is byte-for-byte what JSONRenderer produces for the compact, unicode, strict
+    settings this project uses: datetimes and anything else orjson does not handle natively
+    go through DRF's encoder, and U+2028/U+2029 are escaped the same way. Indented output
+    (e.g. Accept: application/json; indent=4) and other settings use the stock renderer.
+    '''
+    line_separators = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.phase('serialize'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.strict and _has_non_finite(data):
+            # orjson writes them as null; strict JSONRenderer raises ValueError
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError: # e.g. integers beyond 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for raw, escaped in self.line_separators:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
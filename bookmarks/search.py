@@ -0,0 +1,160 @@
+'''
+Full-text index over approved bookmarks (title + description).
+
+- SQLite: an FTS5 virtual table whose rowid is the bookmark id.
+- PostgreSQL: a side table holding a weighted tsvector, with a GIN index.
+- Anything else: no index; callers fall back to icontains search.
+
+Only approved bookmarks are indexed, so the index is exactly the public corpus.
+'''
+import re
+from asgiref.sync import sync_to_async
+from django.db import connections, router
+from django.db.models import FloatField, Lookup
+from django.db.models.expressions import RawSQL
+from .models import Bookmark, SearchEntry
+
+FTS_TABLE = SearchEntry._meta.db_table
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 16
+
+_available = {} # (alias, db name) -> bool
+
+def _connection():
+    return connections[router.db_for_write(Bookmark)]
+
+def is_available(connection=None):
+    '''
+    True when the current database has a full-text index table we know how to query.
+    '''
+    connection = connection or _connection()
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return False
+    key = (connection.alias, str(connection.settings_dict.get('NAME')))
+    if key not in _available:
+        with connection.cursor() as cursor:
+            _available[key] = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _available[key]
+
+async def ais_available(alias):
+    '''
+    is_available() for async code; only the first check per database touches it.
+    '''
+    connection = connections[alias]
+    if connection.vendor not in ('sqlite', 'postgresql') or (alias, str(connection.settings_dict.get('NAME'))) in _available:
+        return is_available(connection)
+    return await sync_to_async(lambda: is_available(connections[alias]))()
+
+def terms(text):
+    '''
+    Split user input into index terms; punctuation and operators are dropped.
+    '''
+    return [t.lower() for t in TOKEN_RE.findall(text or '')][:MAX_TERMS]
+
+def match_query(vendor, words):
+    '''
+    Build a backend query where every term must match, each as a prefix:
+        "djan web" -> SQLite: "djan"* "web"*   PostgreSQL: djan:* & web:*
+    '''
+    if vendor == 'sqlite':
+        return ' '.join(f'"{w}"*' for w in words)
+    return ' & '.join(f'{w}:*' for w in words)
+
+# Queries
+@SearchEntry._meta.get_field('document').register_lookup
+class Match(Lookup):
+    '''
+    search_entry__document__match=query: FTS5's `<table> MATCH ?`.
+    '''
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+def filter_queryset(queryset, text):
+    '''
+    Restrict `queryset` to bookmarks matching `text` and annotate `search_rank` (higher is better).
+    Returns None when the index is unavailable so the caller can fall back.
+    '''
+    connection = connections[queryset.db]
+    if not is_available(connection):
+        return None
+    words = terms(text)
+    if not words:
+        return queryset
+    q = match_query(connection.vendor, words)
+    table = Bookmark._meta.db_table
+
+    if connection.vendor == 'sqlite':
+        # Join the FTS table (through SearchEntry) so bm25() (lower-is-better; title hits weigh double) is computed in the
+        # same scan as MATCH; a correlated per-row subquery would re-run the MATCH for every hit
+        return queryset.filter(search_entry__document__match=q).annotate(
+            search_rank=RawSQL(f'-bm25({FTS_TABLE}, 2.0, 1.0)', (), output_field=FloatField()),
+        )
+
+    matches = RawSQL(f"SELECT bookmark_id FROM {FTS_TABLE} WHERE document @@ to_tsquery('simple', %s)", (q,))
+    rank = RawSQL(
+        f"SELECT ts_rank(document, to_tsquery('simple', %s)) FROM {FTS_TABLE} "
+        f'WHERE bookmark_id = "{table}"."id"',
+        (q,), output_field=FloatField(),
+    )
+    return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+# Maintenance
+def _chunks(ids, size=500):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def _insert_sql(vendor, where):
+    table = Bookmark._meta.db_table
+    if vendor == 'sqlite':
+        return (
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+            f'SELECT id, title, description FROM {table} WHERE is_approved {where}'
+        )
+    return (
+        f'INSERT INTO {FTS_TABLE} (bookmark_id, document) '
+        f"SELECT id, setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', description), 'B') "
+        f'FROM {table} WHERE is_approved {where}'
+    )
+
+def _delete_sql(vendor):
+    return f"DELETE FROM {FTS_TABLE} WHERE {'rowid' if vendor == 'sqlite' else 'bookmark_id'} IN "
+
+def index_bookmarks(ids):
+    '''
+    Re-index the given bookmarks: approved ones are (re)inserted, everything else is removed.
+    '''
+    connection = _connection()
+    if not ids or not is_available(connection):
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(_delete_sql(connection.vendor) + f'({marks})', chunk)
+            cursor.execute(_insert_sql(connection.vendor, f'AND id IN ({marks})'), chunk)
+
+def remove_bookmarks(ids):
+    connection = _connection()
+    if not ids or not is_available(connection):
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(_delete_sql(connection.vendor) + f'({marks})', chunk)
+
+def rebuild(connection=None):
+    '''
+    Drop and repopulate the whole index from approved bookmarks. Returns the number of indexed rows.
+    '''
+    connection = connection or _connection()
+    if not is_available(connection):
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_insert_sql(connection.vendor, ''))
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
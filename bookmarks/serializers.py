@@ -1,26 +1,26 @@
-from urllib.parse import urlsplit, urlunsplit
 from django.db import IntegrityError
 from rest_framework import serializers
 from rest_framework.exceptions import ParseError
-from .models import Tag, Bookmark
+from . import conf
+from .models import Tag, Bookmark, DomainStat, canonical_url, url_hash
 
-# Helper to catch duplicate urls
+# Helper to catch duplicate urls (see bookmarks.models.canonical_url)
 def _canon_url(raw: str) -> str:
-    raw = raw.strip()
-    parts = urlsplit(raw)
-    scheme = parts.scheme.lower()
-    netloc = parts.netloc.lower()
+    return canonical_url(raw)
 
-    if scheme == 'http' and netloc.endswith(':80'):
-        netloc = netloc[:-3]
-    if scheme == 'https' and netloc.endswith(':443'):
-        netloc = netloc[:-4]
+class TagSerializer(serializers.ModelSerializer):
+    count = serializers.IntegerField(source='approved_count', read_only=True)
 
-    path = parts.path
-    if path in ('', '/'):
-        path = '' # no trailing slash for domain root
+    class Meta:
+        model = Tag
+        fields = ['name', 'slug', 'count']
+
+class DomainSerializer(serializers.ModelSerializer):
+    count = serializers.IntegerField(source='approved_count', read_only=True)
 
-    return urlunsplit((scheme, netloc, path, parts.query, ''))
+    class Meta:
+        model = DomainStat
+        fields = ['domain', 'count']
 
 class BookmarkReadSerializer(serializers.ModelSerializer):
     tags = serializers.SlugRelatedField(many=True, slug_field='slug', read_only=True)
@@ -29,6 +29,13 @@ class BookmarkReadSerializer(serializers.ModelSerializer):
         model = Bookmark
         fields = ['id', 'title', 'url', 'description', 'tags', 'created_at']
 
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields=[...]: a sparse fieldset (?fields=); the rest are dropped from the output
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class BookmarkWriteSerializer(serializers.ModelSerializer):
     website = serializers.CharField(write_only=True, required=False, allow_blank=True)
     tags = serializers.ListField(
@@ -55,8 +62,8 @@ class BookmarkWriteSerializer(serializers.ModelSerializer):
 
         canon = _canon_url(value)
 
-        # Pre-check to give 400 if duplicate url
-        if Bookmark.objects.filter(url__iexact=canon).exists():
+        # Pre-check to give 400 if duplicate url (one lookup on the unique url_hash index)
+        if Bookmark.objects.filter(url_hash=url_hash(canon)).exists():
             raise ParseError('URL already submitted')
 
         return canon
@@ -93,6 +100,33 @@ class BookmarkWriteSerializer(serializers.ModelSerializer):
 
         return bookmark
 
+class BookmarkBatchItemSerializer(BookmarkWriteSerializer):
+    '''
+    One entry of a batch submission. Same fields and cleaning as BookmarkWriteSerializer,
+    but problems are reported per item, and the duplicate check is left to the batch
+    (one query for every item, see bookmarks.bulk).
+    '''
+    def validate(self, attrs):
+        if attrs.get('website'):
+            raise serializers.ValidationError('Invalid submission')
+        attrs.pop('website', None)
+        return attrs
+
+    def validate_url(self, value):
+        if not value.startswith(('http://', 'https://')):
+            raise serializers.ValidationError('URL must start with http:// or https://')
+        return _canon_url(value)
+
+class ModerationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=['approve', 'reject'])
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        max_items = conf.get('MODERATION_MAX_ITEMS')
+        if len(value) > max_items:
+            raise serializers.ValidationError(f'At most {max_items} ids per request')
+        return list(dict.fromkeys(value))
+
 class BookmarkSubmissionSerializer(serializers.ModelSerializer):
     tags = serializers.SlugRelatedField(many=True, slug_field='slug', read_only=True)
     pending_tags = serializers.ListField(child=serializers.CharField(), read_only=True)
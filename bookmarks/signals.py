@@ -0,0 +1,212 @@
+import contextvars, functools
+from contextlib import contextmanager
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+from .models import Bookmark, Tag
+from . import cache as response_cache
+from . import search
+from . import domain_counts
+from . import tag_counts
+from . import tag_index
+
+# Sent by bulk code paths that bypass model signals (queryset.update(), bulk_create()).
+# Arguments: ids (list of Bookmark ids), action ('approved', 'created', ...)
+bookmarks_changed = Signal()
+
+# Actions after which `ids` are public (approved) / no longer public
+PUBLISHED_ACTIONS = {'approved', 'created'}
+UNPUBLISHED_ACTIONS = {'unapproved', 'rejected', 'deleted'}
+
+def _is_public(bookmark):
+    # Approved now or before this save: the public API can see the change
+    return bookmark.is_approved or bookmark.was_approved
+
+# True while bulk code deletes bookmarks whose counts and indexes it has already adjusted
+_bulk_deleting = contextvars.ContextVar('bookmarks_bulk_deleting', default=False)
+
+@contextmanager
+def bulk_delete():
+    '''
+    Silence the per-instance Bookmark delete receivers below for a QuerySet.delete() whose
+    bookkeeping the caller does in bulk (see bulk.reject_bookmarks).
+    '''
+    token = _bulk_deleting.set(True)
+    try:
+        yield
+    finally:
+        _bulk_deleting.reset(token)
+
+def _per_instance(receiver_func):
+    @functools.wraps(receiver_func)
+    def wrapper(*args, **kwargs):
+        if not _bulk_deleting.get():
+            return receiver_func(*args, **kwargs)
+    return wrapper
+
+# Search index
+@receiver(post_save, sender=Bookmark)
+def _index_saved_bookmark(sender, instance, created, raw=False, **kwargs):
+    # New submissions are unapproved and never indexed
+    if raw or (created and not instance.is_approved):
+        return
+    search.index_bookmarks([instance.pk])
+
+@receiver(post_delete, sender=Bookmark)
+@_per_instance
+def _unindex_deleted_bookmark(sender, instance, **kwargs):
+    search.remove_bookmarks([instance.pk])
+
+@receiver(bookmarks_changed)
+def _index_changed_bookmarks(sender, ids, **kwargs):
+    search.index_bookmarks(ids)
+
+# Response cache
+@receiver(post_save, sender=Bookmark)
+@receiver(post_delete, sender=Bookmark)
+@_per_instance
+def _invalidate_on_bookmark_change(sender, instance, **kwargs):
+    if _is_public(instance):
+        response_cache.bump()
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def _invalidate_on_tag_change(sender, **kwargs):
+    response_cache.bump()
+
+@receiver(m2m_changed, sender=Bookmark.tags.through)
+def _invalidate_on_tags_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    # Forward changes on an unapproved bookmark are invisible to the public API
+    if not reverse and not _is_public(instance):
+        return
+    response_cache.bump()
+
+@receiver(bookmarks_changed)
+def _invalidate_on_bulk_change(sender, ids, **kwargs):
+    if ids:
+        response_cache.bump()
+
+# Tag counts (Tag.approved_count)
+@receiver(post_save, sender=Bookmark)
+def _count_tags_on_approval_change(sender, instance, created, raw=False, **kwargs):
+    # Tags are attached after the first save, so only approval flips matter here
+    if raw or created or instance.is_approved == instance.was_approved:
+        return
+    tag_counts.publish([instance.pk], 1 if instance.is_approved else -1)
+
+@receiver(pre_delete, sender=Bookmark)
+@_per_instance
+def _remember_tags_before_delete(sender, instance, **kwargs):
+    # The through rows are gone by post_delete
+    if instance.is_approved:
+        instance._counted_tag_ids = list(instance.tags.values_list('id', flat=True))
+
+@receiver(post_delete, sender=Bookmark)
+@_per_instance
+def _uncount_deleted_bookmark(sender, instance, **kwargs):
+    tag_ids = getattr(instance, '_counted_tag_ids', None)
+    if tag_ids:
+        tag_counts.adjust(dict.fromkeys(tag_ids, -1))
+
+@receiver(m2m_changed, sender=Bookmark.tags.through)
+def _count_tags_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    through = Bookmark.tags.through
+    if not reverse:
+        # instance is a Bookmark, pk_set are Tag ids
+        if not instance.is_approved:
+            return
+        if action == 'post_add':
+            tag_counts.adjust(dict.fromkeys(pk_set, 1)) # pk_set only holds newly added tags
+        elif action in ('pre_remove', 'pre_clear'):
+            # Only rows that really exist get removed; note them before they go
+            linked = through.objects.filter(bookmark_id=instance.pk)
+            if action == 'pre_remove':
+                linked = linked.filter(tag_id__in=pk_set)
+            instance._uncounted_tag_ids = list(linked.values_list('tag_id', flat=True))
+        elif action in ('post_remove', 'post_clear'):
+            tag_counts.adjust(dict.fromkeys(getattr(instance, '_uncounted_tag_ids', ()), -1))
+        return
+
+    # instance is a Tag, pk_set are Bookmark ids
+    if action == 'post_add':
+        added = Bookmark.objects.filter(id__in=pk_set, is_approved=True).count()
+        tag_counts.adjust({instance.pk: added})
+    elif action == 'pre_remove':
+        instance._uncounted = through.objects.filter(tag_id=instance.pk, bookmark_id__in=pk_set, bookmark__is_approved=True).count()
+    elif action == 'post_remove':
+        tag_counts.adjust({instance.pk: -getattr(instance, '_uncounted', 0)})
+    elif action == 'post_clear':
+        Tag.objects.filter(pk=instance.pk).update(approved_count=0)
+
+@receiver(bookmarks_changed)
+def _count_tags_on_bulk_change(sender, ids, action, **kwargs):
+    if action in PUBLISHED_ACTIONS:
+        tag_counts.publish(ids, 1)
+    elif action in UNPUBLISHED_ACTIONS:
+        tag_counts.publish(ids, -1)
+
+# Domain counts (DomainStat)
+@receiver(post_save, sender=Bookmark)
+def _count_domain_on_save(sender, instance, created, raw=False, **kwargs):
+    # Covers approval flips and url edits that move the bookmark to another domain
+    if raw:
+        return
+    before = None if created else (instance.loaded_domain, instance.was_approved)
+    domain_counts.move(before, (instance.domain, instance.is_approved))
+
+@receiver(post_delete, sender=Bookmark)
+@_per_instance
+def _uncount_deleted_domain(sender, instance, **kwargs):
+    domain_counts.move((instance.loaded_domain, instance.was_approved), None)
+
+@receiver(bookmarks_changed)
+def _count_domains_on_bulk_change(sender, ids, action, **kwargs):
+    if action in PUBLISHED_ACTIONS:
+        domain_counts.publish(ids, 1)
+    elif action in UNPUBLISHED_ACTIONS:
+        domain_counts.publish(ids, -1)
+
+# In-memory tag index (change log read by every worker)
+@receiver(post_save, sender=Bookmark)
+def _index_tags_on_approval_change(sender, instance, created, raw=False, **kwargs):
+    if raw or created or instance.is_approved == instance.was_approved:
+        return
+    tag_index.record_bookmarks([instance.pk])
+
+@receiver(post_delete, sender=Bookmark)
+@_per_instance
+def _unindex_deleted_bookmark_tags(sender, instance, **kwargs):
+    tag_ids = getattr(instance, '_counted_tag_ids', None) # noted by _remember_tags_before_delete
+    if tag_ids:
+        tag_index.record((instance.pk, t) for t in tag_ids)
+
+@receiver(m2m_changed, sender=Bookmark.tags.through)
+def _index_tags_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    through = Bookmark.tags.through
+    if not reverse:
+        if not instance.is_approved:
+            return
+        if action == 'post_add':
+            tag_index.record((instance.pk, t) for t in pk_set)
+        elif action in ('post_remove', 'post_clear'):
+            tag_index.record((instance.pk, t) for t in getattr(instance, '_uncounted_tag_ids', ()))
+        return
+
+    if action == 'pre_clear':
+        instance._unindexed_ids = list(through.objects.filter(tag_id=instance.pk).values_list('bookmark_id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        tag_index.record((b, instance.pk) for b in pk_set)
+    elif action == 'post_clear':
+        tag_index.record((b, instance.pk) for b in getattr(instance, '_unindexed_ids', ()))
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def _index_tag_change(sender, raw=False, **kwargs):
+    if not raw:
+        tag_index.record(tags=True)
+
+@receiver(bookmarks_changed)
+def _index_tags_on_bulk_change(sender, ids, action, **kwargs):
+    if action in PUBLISHED_ACTIONS or action in UNPUBLISHED_ACTIONS:
+        tag_index.record_bookmarks(ids)
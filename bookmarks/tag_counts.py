@@ -0,0 +1,93 @@
+'''
+Denormalized Tag.approved_count: the number of approved bookmarks carrying each tag.
+
+Counts are adjusted with relative F() updates as tags are attached/detached and bookmarks
+are approved, unapproved or deleted (see bookmarks.signals), so reading them is a plain
+column read instead of a GROUP BY over the through table. `reconcile()` repairs any drift.
+'''
+from collections import Counter, defaultdict
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from .models import Bookmark, Tag
+
+BookmarkTag = Bookmark.tags.through
+
+def adjust(deltas):
+    '''
+    Apply {tag_id: delta}. One UPDATE per distinct delta (usually just +1 or -1).
+    Decrements stop at 0, so a count that has drifted low (see reconcile()) never fails the
+    caller's write on the column's CHECK (>= 0).
+    '''
+    by_delta = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        count = F('approved_count') + delta
+        Tag.objects.filter(id__in=tag_ids).update(approved_count=count if delta > 0 else Greatest(count, 0))
+
+def tag_usage(bookmark_ids):
+    '''
+    tag_id -> how many of `bookmark_ids` carry it (one grouped query).
+    '''
+    rows = (
+        BookmarkTag.objects.filter(bookmark_id__in=list(bookmark_ids))
+        .values('tag_id').annotate(n=Count('id')).values_list('tag_id', 'n')
+    )
+    return Counter(dict(rows))
+
+def publish(bookmark_ids, sign=1):
+    '''
+    Count (sign=1) or uncount (sign=-1) the tags of bookmarks that became (un)approved.
+    '''
+    if bookmark_ids:
+        adjust({tag_id: sign * n for tag_id, n in tag_usage(bookmark_ids).items()})
+
+def true_counts():
+    return dict(
+        Tag.objects.annotate(n=Count('bookmarks', filter=Q(bookmarks__is_approved=True)))
+        .values_list('id', 'n')
+    )
+
+def drift():
+    '''
+    {tag_id: (stored, actual)} for every tag whose stored count is wrong.
+    '''
+    actual = true_counts()
+    return {
+        tag_id: (stored, actual[tag_id])
+        for tag_id, stored in Tag.objects.values_list('id', 'approved_count')
+        if stored != actual.get(tag_id, stored)
+    }
+
+def reconcile():
+    '''
+    Recompute every count from the through table and fix the ones that drifted.
+    Returns drift() as it was before the repair.
+    '''
+    drifted = drift()
+    by_count = defaultdict(list)
+    for tag_id, (_, count) in drifted.items():
+        by_count[count].append(tag_id)
+    for count, tag_ids in by_count.items():
+        Tag.objects.filter(id__in=tag_ids).update(approved_count=count)
+    return drifted
+
+def facets(bookmarks, limit):
+    '''
+    [{'slug', 'name', 'count'}] for the most used tags among the `bookmarks` queryset, in one query.
+    '''
+    rows = (
+        BookmarkTag.objects.filter(bookmark_id__in=bookmarks.order_by().values('id'))
+        .values('tag__slug', 'tag__name')
+        .annotate(count=Count('id'))
+        .order_by('-count', 'tag__name')[:limit]
+    )
+    return [{'slug': r['tag__slug'], 'name': r['tag__name'], 'count': r['count']} for r in rows]
+
+def top_tags(limit):
+    '''
+    facets() for the whole public corpus, straight from the stored counts.
+    '''
+    rows = Tag.objects.filter(approved_count__gt=0).order_by('-approved_count', 'name').values('slug', 'name', 'approved_count')[:limit]
+    return [{'slug': r['slug'], 'name': r['name'], 'count': r['approved_count']} for r in rows]
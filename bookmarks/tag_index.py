@@ -0,0 +1,328 @@
+'''
+In-memory tag index for ?tags=a,b&match=all|any on the list endpoint.
+
+Each worker keeps, per tag, the ids of its approved bookmarks in an array sorted by
+(created_at, id), the list endpoint's keyset order. A page is answered by seeking to the
+cursor with bisect and then intersecting (walk the shortest list, probe the others) or
+merging (heapq.merge) lazily until page_size + 1 ids are found; the database is only asked
+for those rows. Memory is about 16 bytes per (bookmark, tag) pair plus 8 per bookmark id.
+
+Keeping workers in sync: every change that can affect the index appends an entry to a
+change log in the shared cache (a version counter plus one key per version, written on
+commit). Before answering, a worker applies the entries it has not seen by re-reading just
+the affected rows. If the log has a gap (evicted keys, cache cleared) the worker rebuilds in
+a background thread and callers fall back to SQL until it is ready. A worker also rebuilds
+once its index is TAG_INDEX_REBUILD_AFTER seconds old (answering from it meanwhile), so a
+change the log missed is not served forever. The rows always come from the primary, even
+during a request that reads from a replica, so the index holds the version it records.
+'''
+import heapq, itertools, threading, time
+from array import array
+from asgiref.sync import sync_to_async
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Max
+from . import cache as response_cache, conf, db
+from .models import Bookmark, Tag
+
+BookmarkTag = Bookmark.tags.through
+
+VERSION_KEY = 'bookmarks:tag_index:version'
+CHANGE_KEY = 'bookmarks:tag_index:change:%d'
+CHANGE_TIMEOUT = 24 * 3600
+MAX_PAIRS_PER_CHANGE = 10_000 # bigger changes ask workers to rebuild instead
+MAX_CHANGES_PER_SYNC = 500
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+def stamp(value):
+    return (value - EPOCH) // MICROSECOND
+
+def is_enabled():
+    return response_cache.enabled('TAG_INDEX')
+
+# Change log (written by bookmarks.signals)
+def _cache():
+    return response_cache.get_cache()
+
+def current_version():
+    return _cache().get(VERSION_KEY)
+
+def _append(entry):
+    cache = _cache()
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY % version, entry, CHANGE_TIMEOUT)
+
+def record(pairs=(), tags=False):
+    '''
+    Note that the (bookmark_id, tag_id) `pairs` may have changed, and/or that tags were
+    created, renamed or deleted. Published when the current transaction commits.
+    '''
+    pairs = [(int(b), int(t)) for b, t in pairs]
+    if not pairs and not tags:
+        return
+    if len(pairs) > MAX_PAIRS_PER_CHANGE:
+        entry = {'rebuild': True}
+    else:
+        entry = {'pairs': pairs, 'tags': tags}
+    transaction.on_commit(lambda: _append(entry))
+
+def record_bookmarks(ids):
+    '''
+    record() every current tag of the given bookmarks (approval flips, bulk changes).
+    '''
+    ids = list(ids)
+    if ids:
+        record(BookmarkTag.objects.filter(bookmark_id__in=ids).values_list('bookmark_id', 'tag_id'))
+
+# Index
+class Postings:
+    '''
+    One tag's approved bookmarks: parallel arrays of created_at stamps and ids, sorted by (stamp, id),
+    so lookups are C-level bisects on plain integers.
+    '''
+    __slots__ = ('stamps', 'ids')
+
+    def __init__(self):
+        self.stamps = array('q')
+        self.ids = array('q')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, stamp_, bookmark_id):
+        self.stamps.append(stamp_)
+        self.ids.append(bookmark_id)
+
+    def position(self, stamp_, bookmark_id, right=False):
+        '''
+        Where (stamp_, bookmark_id) is or would go; with right=True, just past it.
+        '''
+        lo = bisect_left(self.stamps, stamp_)
+        hi = bisect_right(self.stamps, stamp_, lo)
+        if lo == hi:
+            return lo
+        # Rows sharing a created_at are ordered by id
+        return (bisect_right if right else bisect_left)(self.ids, bookmark_id, lo, hi)
+
+    def contains(self, stamp_, bookmark_id):
+        i = self.position(stamp_, bookmark_id)
+        return i < len(self.ids) and self.ids[i] == bookmark_id
+
+    def insert(self, stamp_, bookmark_id):
+        i = self.position(stamp_, bookmark_id)
+        if i < len(self.ids) and self.ids[i] == bookmark_id:
+            return
+        self.stamps.insert(i, stamp_)
+        self.ids.insert(i, bookmark_id)
+
+    def remove(self, stamp_, bookmark_id):
+        i = self.position(stamp_, bookmark_id)
+        if i < len(self.ids) and self.ids[i] == bookmark_id:
+            del self.stamps[i]
+            del self.ids[i]
+
+    def walk(self, after, descending):
+        '''
+        Ids strictly after the (stamp, id) key `after` (None: from the start), in the given direction.
+        '''
+        ids = self.ids
+        if descending:
+            end = self.position(*after) if after is not None else len(ids)
+            return (ids[i] for i in range(end - 1, -1, -1))
+        start = self.position(*after, right=True) if after is not None else 0
+        return (ids[i] for i in range(start, len(ids)))
+
+EMPTY = Postings()
+
+class TagIndex:
+    # Rebuilds run in a thread; callers use SQL until the index is ready
+    build_in_background = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ready = False
+        self.building = False
+        self.built_at = 0.0
+        self.version = None
+        self.stamps = array('q')
+        self.postings = {}
+        self.slug_ids = {}
+
+    def _key(self, bookmark_id):
+        return (self.stamps[bookmark_id], bookmark_id)
+
+    # Loading
+    def load(self, rows, slug_ids, max_id, version=None):
+        '''
+        Replace the contents with `rows` of (tag_id, bookmark_id, created_at) sorted by (created_at, bookmark_id).
+        '''
+        stamps = array('q', bytes(8 * (max_id + 1)))
+        postings = {}
+        last_id = last_stamp = None
+        for tag_id, bookmark_id, created_at in rows:
+            if bookmark_id != last_id: # rows of one bookmark are adjacent
+                last_id, last_stamp = bookmark_id, stamp(created_at)
+                stamps[bookmark_id] = last_stamp
+            tag = postings.get(tag_id)
+            if tag is None:
+                tag = postings[tag_id] = Postings()
+            tag.append(last_stamp, bookmark_id)
+        with self.lock:
+            self.stamps, self.postings, self.slug_ids = stamps, postings, slug_ids
+            self.version = version
+            self.built_at = time.monotonic()
+            self.ready = True
+
+    def rebuild(self):
+        _cache().add(VERSION_KEY, 0, None)
+        version = current_version() # changes after this point are replayed by the next sync
+        with db.primary_reads():
+            max_id = Bookmark.objects.aggregate(m=Max('id'))['m'] or 0
+            rows = (
+                BookmarkTag.objects.filter(bookmark__is_approved=True)
+                .order_by('bookmark__created_at', 'bookmark_id')
+                .values_list('tag_id', 'bookmark_id', 'bookmark__created_at')
+                .iterator(chunk_size=10_000)
+            )
+            self.load(rows, dict(Tag.objects.values_list('slug', 'id')), max_id, version)
+
+    def _rebuild_later(self, keep_serving=False):
+        # Under the lock, so concurrent requests of a threaded worker start one rebuild, not several
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+            if not keep_serving:
+                self.ready = False
+
+        def run():
+            try:
+                self.rebuild()
+            finally:
+                self.building = False
+                if self.build_in_background:
+                    from django.db import connections
+                    connections.close_all() # this thread's connections
+
+        if self.build_in_background:
+            threading.Thread(target=run, name='bookmarks-tag-index', daemon=True).start()
+        else:
+            run()
+
+    # Sync
+    def sync(self):
+        '''
+        Apply unseen change-log entries. Returns False when the index cannot be used right now.
+        '''
+        if not self.ready:
+            self._rebuild_later()
+            return self.ready
+        if time.monotonic() - self.built_at > conf.get('TAG_INDEX_REBUILD_AFTER'):
+            self._rebuild_later(keep_serving=True)
+        latest = current_version()
+        if latest == self.version:
+            return True
+        if latest is None or self.version is None or latest < self.version or latest - self.version > MAX_CHANGES_PER_SYNC:
+            self._rebuild_later()
+            return self.ready
+
+        keys = [CHANGE_KEY % v for v in range(self.version + 1, latest + 1)]
+        entries = _cache().get_many(keys)
+        if len(entries) < len(keys) or any(e.get('rebuild') for e in entries.values()):
+            self._rebuild_later()
+            return self.ready
+
+        pairs = {tuple(p) for e in entries.values() for p in e.get('pairs', ())}
+        self.refresh(pairs, reload_tags=any(e.get('tags') for e in entries.values()))
+        if not self.building:
+            # Otherwise the rebuild sets the version it started from, and these entries are
+            # replayed on top of it
+            self.version = latest
+        return True
+
+    async def async_sync(self):
+        '''
+        sync() for async views: the common up-to-date case is one awaited cache read.
+        '''
+        if (
+            self.ready and self.version is not None
+            and time.monotonic() - self.built_at <= conf.get('TAG_INDEX_REBUILD_AFTER')
+            and await response_cache.call_async(_cache(), 'get', VERSION_KEY) == self.version
+        ):
+            return True
+        return await sync_to_async(self.sync)()
+
+    def refresh(self, pairs, reload_tags=False):
+        '''
+        Make the given (bookmark_id, tag_id) pairs match the database.
+        '''
+        bookmark_ids = {b for b, _ in pairs}
+        truth = {}
+        with db.primary_reads():
+            for b, t, created_at in (
+                BookmarkTag.objects.filter(bookmark_id__in=bookmark_ids, bookmark__is_approved=True)
+                .values_list('bookmark_id', 'tag_id', 'bookmark__created_at')
+            ):
+                truth[(b, t)] = stamp(created_at)
+            slug_ids = dict(Tag.objects.values_list('slug', 'id')) if reload_tags else None
+
+        with self.lock:
+            # Remove with the old sort keys, update the keys, then insert what the database has
+            for b, t in pairs | truth.keys():
+                tag = self.postings.get(t)
+                if tag is not None and b < len(self.stamps):
+                    tag.remove(self.stamps[b], b)
+            max_id = max(bookmark_ids, default=0)
+            if max_id >= len(self.stamps):
+                self.stamps.extend(itertools.repeat(0, max_id + 1 - len(self.stamps)))
+            for (b, _), value in truth.items():
+                self.stamps[b] = value
+            for (b, t), value in truth.items():
+                self.postings.setdefault(t, Postings()).insert(value, b)
+            if slug_ids is not None:
+                self.slug_ids = slug_ids
+                for t in set(self.postings) - set(slug_ids.values()):
+                    del self.postings[t]
+
+    # Queries
+    def page(self, slugs, match='all', descending=True, after=None, limit=11):
+        '''
+        Up to `limit` bookmark ids carrying all/any of `slugs`, in (created_at, id) order
+        (newest first when `descending`), strictly after the `after` (stamp, id) key.
+        '''
+        with self.lock:
+            tag_ids = {self.slug_ids.get(s) for s in slugs}
+            if match == 'all':
+                if None in tag_ids:
+                    return []
+                # Walk the shortest list and probe the others
+                first, *rest = sorted((self.postings.get(t, EMPTY) for t in tag_ids), key=len)
+                stamps = self.stamps
+                found = (b for b in first.walk(after, descending) if all(tag.contains(stamps[b], b) for tag in rest))
+            else:
+                lists = [self.postings[t] for t in tag_ids if t in self.postings]
+                merged = heapq.merge(*(tag.walk(after, descending) for tag in lists), key=self._key, reverse=descending)
+                found = (b for b, _ in itertools.groupby(merged)) # a bookmark appears once per matching tag
+            return list(itertools.islice(found, limit))
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TagIndex()
+    return _index
+
+def reset():
+    global _index
+    _index = None
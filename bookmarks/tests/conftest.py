@@ -1,8 +1,113 @@
+import threading, time
 import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from django.core.cache import cache
 from django.utils import timezone
 
 @pytest.fixture
 def api_client():
     from rest_framework.test import APIClient
-    return APIClient()
\ No newline at end of file
+    return APIClient()
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    # Throttle history lives in the cache; start every test with a clean slate
+    cache.clear()
+    yield
+
+@pytest.fixture(autouse=True)
+def _isolated_throttle_store(settings, tmp_path):
+    # Shared (file-backed) throttle counters must not leak between tests or runs
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'THROTTLE_STORE_OPTIONS': {'path': str(tmp_path / 'throttle.sqlite3')}}
+
+@pytest.fixture(autouse=True)
+def _single_process(settings):
+    # The test process is the only worker, so its LocMem cache is as good as a shared one
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': True, 'CONDITIONAL_GET': True, 'TAG_INDEX': True}
+
+@pytest.fixture(autouse=True)
+def _fresh_tag_index(monkeypatch):
+    # Each test has its own database contents; build the index synchronously from them
+    from bookmarks import tag_index
+    monkeypatch.setattr(tag_index.TagIndex, 'build_in_background', False)
+    tag_index.reset()
+
+@pytest.fixture(autouse=True)
+def _fresh_near_duplicate_index(monkeypatch):
+    # Same for the near-duplicate index; ids are reused once a test's transaction rolls back
+    from bookmarks import near_duplicates
+    monkeypatch.setattr(near_duplicates.NearDuplicateIndex, 'build_in_background', False)
+    near_duplicates.reset()
+
+class StandIn(ThreadingHTTPServer):
+    '''
+    A local HTTP/1.1 server playing the web: routes are {path: (status, headers, body)}, and
+    head_routes override them for HEAD. Counts connections and the most requests in flight at
+    once, and logs (method, path, Range header) of every request.
+    '''
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.routes = {}
+        self.head_routes = {}
+        self.requests = []
+        self.delay = 0.0
+        self.connections = 0
+        self.in_flight = self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self.respond(self.server.routes)
+
+    def do_HEAD(self):
+        self.respond({**self.server.routes, **self.server.head_routes}, head=True)
+
+    def respond(self, routes, head=False):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, self.headers.get('Range')))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+            status, headers, body = routes.get(self.path, (404, {}, b'missing'))
+            self.send_response(status)
+            headers = {'Content-Type': 'text/html; charset=utf-8', 'Content-Length': str(len(body)), **headers}
+            for name, value in headers.items():
+                if value is not None:
+                    self.send_header(name, value)
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def web(settings):
+    settings.BOOKMARKS = {
+        **settings.BOOKMARKS, 'METADATA_ALLOW_PRIVATE': True, 'METADATA_TIMEOUT': 2.0,
+        'LINK_CHECK_TIMEOUT': 2.0, 'LINK_CHECK_DOMAIN_DELAY': 0.0,
+    }
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
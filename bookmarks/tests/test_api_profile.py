@@ -0,0 +1,69 @@
+import json, os, subprocess, sys
+import pytest
+from django.conf import settings as django_settings
+from django.contrib.auth import get_user_model
+from model_bakery import baker
+from bookmarks.models import Bookmark
+
+PROBE = '''
+import json, sys
+from io import BytesIO
+from config.wsgi_api import application
+from django.conf import settings
+
+# Off the API's hot path: imported by the views, job workers and admin that need them
+LAZY = (
+    'bookmarks.admin', 'django.contrib.sessions.middleware', 'django.contrib.messages.middleware', 'tailwind',
+    'bookmarks.bulk', 'bookmarks.export', 'bookmarks.httpclient', 'bookmarks.jobs', 'bookmarks.link_metadata',
+    'bookmarks.near_duplicates',
+)
+
+def status(path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'REMOTE_ADDR': '203.0.113.10',
+        'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+    }
+    got = []
+    b''.join(application(environ, lambda s, headers, exc_info=None: got.append(s)))
+    return int(got[0].split()[0])
+
+loaded = sorted(m for m in LAZY if sys.modules.get(m))
+from bookmarks import jobs # a job worker loads the handlers on first use
+
+print(json.dumps({
+    'apps': settings.INSTALLED_APPS,
+    'middleware': settings.MIDDLEWARE,
+    'health': status('/bookmarks/v1/health/'),
+    'admin': status('/admin/'),
+    'docs': status('/bookmarks/docs/'),
+    'loaded': loaded,
+    'handlers': sorted(jobs.handlers()),
+}))
+'''
+
+def test_api_entry_point_loads_only_the_api():
+    env = {k: v for k, v in os.environ.items() if k != 'DJANGO_SETTINGS_MODULE'}
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=django_settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert 'ready in' in result.stderr # the startup report
+    probe = json.loads(result.stdout)
+    assert probe['apps'] == ['django.contrib.contenttypes', 'django.contrib.auth', 'bookmarks']
+    assert not {m for m in probe['middleware'] if 'session' in m or 'csrf' in m or 'messages' in m}
+    assert (probe['health'], probe['admin'], probe['docs']) == (200, 404, 404)
+    assert probe['loaded'] == []
+    assert probe['handlers'] == ['fetch_metadata']
+
+@pytest.mark.django_db
+def test_api_urlconf_serves_reads_and_basic_auth_moderation(api_client, settings):
+    settings.ROOT_URLCONF = 'config.urls_api'
+    bookmark = baker.make('bookmarks.Bookmark', title='Pending')
+    assert api_client.get('/bookmarks/v1/bookmarks/').status_code == 200
+
+    get_user_model().objects.create_user(username='mod', password='secret', is_staff=True)
+    api_client.credentials(HTTP_AUTHORIZATION='Basic bW9kOnNlY3JldA==') # mod:secret
+    r = api_client.post('/bookmarks/v1/moderation/', {'action': 'approve', 'ids': [bookmark.id]}, format='json')
+    assert r.status_code == 200, r.json()
+    assert Bookmark.objects.get(pk=bookmark.pk).is_approved
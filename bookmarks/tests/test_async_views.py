@@ -0,0 +1,153 @@
+import importlib
+import pytest
+from datetime import timedelta
+from django.urls import clear_url_caches
+from django.utils import timezone
+from model_bakery import baker
+from bookmarks import async_views, db, metrics
+from bookmarks.throttling import BookmarksReadsThrottle
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def _reload_urls():
+    import bookmarks.urls, config.urls
+    importlib.reload(bookmarks.urls)
+    importlib.reload(config.urls)
+    clear_url_caches()
+
+@pytest.fixture
+def async_urls(settings):
+    '''
+    Route the read endpoints to bookmarks.async_views for the test.
+    '''
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'ASYNC_VIEWS': True}
+    _reload_urls()
+    yield
+    settings.BOOKMARKS = {k: v for k, v in settings.BOOKMARKS.items() if k != 'ASYNC_VIEWS'}
+    _reload_urls()
+
+@pytest.fixture
+def corpus():
+    python, web = baker.make('bookmarks.Tag', name='Python', slug='python'), baker.make('bookmarks.Tag', name='Web', slug='web')
+    now = timezone.now()
+    for i in range(15):
+        tags = [python] if i % 2 else [python, web]
+        baker.make('bookmarks.Bookmark', title=f'Django tip {i}', description='async views', is_approved=True, created_at=now - timedelta(minutes=i), tags=tags)
+    baker.make('bookmarks.Bookmark', title='Hidden', is_approved=False, tags=[python])
+    return [python, web]
+
+QUERIES = [
+    {},
+    {'page_size': 4},
+    {'tag': 'web'},
+    {'tags': 'python,web'},
+    {'tags': 'python,web', 'match': 'any', 'page_size': 3},
+    {'search': 'djan'},
+    {'ordering': 'created_at', 'count': 'true'},
+    {'page': 2},
+    {'facets': 'tags'},
+    {'fields': 'id,url,title', 'page_size': 4},
+    {'fields': 'url', 'include': 'tags', 'tags': 'python,web'},
+]
+
+def _fetch(api_client, query):
+    r = api_client.get(LIST_URL, query)
+    pages = [r.content]
+    while r.status_code == 200 and r.json().get('next'):
+        r = api_client.get(r.json()['next'])
+        pages.append(r.content)
+    return r.status_code, pages
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('fast_read', [True, False])
+def test_async_list_and_detail_match_sync_views(api_client, settings, corpus, fast_read):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False, 'FAST_READ': fast_read}
+    detail = f'{LIST_URL}{corpus[0].bookmarks.first().id}/'
+    expected = [_fetch(api_client, q) for q in QUERIES] + [api_client.get(detail).content]
+
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'ASYNC_VIEWS': True}
+    _reload_urls()
+    try:
+        assert async_views.BookmarkListView.view_is_async
+        got = [_fetch(api_client, q) for q in QUERIES] + [api_client.get(detail).content]
+    finally:
+        settings.BOOKMARKS = {k: v for k, v in settings.BOOKMARKS.items() if k != 'ASYNC_VIEWS'}
+        _reload_urls()
+    assert got == expected
+
+@pytest.mark.django_db
+def test_async_errors_match_drf(api_client, async_urls, corpus):
+    r = api_client.get(f'{LIST_URL}999999/')
+    assert r.status_code == 404
+    assert r.json() == {'detail': 'No Bookmark matches the given query.'}
+
+    r = api_client.get(LIST_URL, {'cursor': 'garbage'})
+    assert r.status_code == 404
+    assert r.json() == {'detail': 'Invalid cursor'}
+
+    r = api_client.get(LIST_URL, {'match': 'some', 'tags': 'python'})
+    assert r.status_code == 400
+
+    r = api_client.get(LIST_URL, {'fields': 'id,secret'})
+    assert r.status_code == 400
+
+    r = api_client.post(LIST_URL, {})
+    assert r.status_code == 405
+    assert r['Allow'] == 'GET, HEAD, OPTIONS'
+
+    r = api_client.get('/bookmarks/v1/health/')
+    assert r.status_code == 200
+    assert r.json() == {'status': 'ok'}
+
+@pytest.mark.django_db
+def test_async_views_throttle_with_rate_limit_headers(api_client, async_urls, corpus, monkeypatch):
+    monkeypatch.setattr(BookmarksReadsThrottle, 'rate', '2/min', raising=False)
+
+    statuses = [api_client.get(LIST_URL).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    r = api_client.get(LIST_URL)
+    assert r['X-RateLimit-Limit'] == '2'
+    assert r['X-RateLimit-Remaining'] == '0'
+    assert int(r['Retry-After']) > 0
+
+@pytest.mark.django_db
+def test_async_views_use_the_response_cache(api_client, async_urls, corpus, django_assert_num_queries):
+    first = api_client.get(LIST_URL)
+    assert first['X-Cache'] == 'MISS'
+
+    with django_assert_num_queries(0):
+        second = api_client.get(LIST_URL)
+    assert second['X-Cache'] == 'HIT'
+    assert second.content == first.content
+
+    baker.make('bookmarks.Bookmark', title='Newest', is_approved=True)
+    third = api_client.get(LIST_URL)
+    assert third['X-Cache'] == 'MISS'
+    assert third.json()['results'][0]['title'] == 'Newest'
+
+@pytest.mark.django_db
+def test_async_requests_are_recorded_in_metrics(api_client, async_urls, corpus, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    metrics.reset()
+    api_client.get(LIST_URL)
+
+    histograms = metrics.snapshot()['histograms']
+    queries = histograms['bookmarks_db_queries_per_request']['route="bookmarks-list"']
+    assert queries[-1] == 2 # the page and its tags
+
+@pytest.mark.django_db
+def test_async_views_read_from_replicas(api_client, async_urls, corpus, settings, monkeypatch):
+    # 'default' stands in for a replica; the async ORM's threads must see the request's pick
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'READ_REPLICAS': ['default'], 'RESPONSE_CACHE': False}
+    picked = []
+    monkeypatch.setattr(db.ReplicaRouter, 'db_for_read', lambda self, model, **hints: picked.append(db._read_alias.get()))
+    assert api_client.get(LIST_URL).status_code == 200
+    assert picked and set(picked) == {'default'}
+
+@pytest.mark.django_db
+def test_async_views_answer_conditional_gets(api_client, async_urls, corpus, django_assert_num_queries):
+    etag = api_client.get(LIST_URL)['ETag']
+    with django_assert_num_queries(0):
+        r = api_client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag)
+    assert r.status_code == 304 and r['ETag'] == etag
@@ -0,0 +1,153 @@
+import pytest
+from model_bakery import baker
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+@pytest.mark.django_db
+def test_repeat_list_request_is_served_from_cache(api_client, django_assert_num_queries):
+    '''
+    Second identical request: same bytes, no queries.
+    '''
+    t = baker.make('bookmarks.Tag', slug='django')
+    baker.make('bookmarks.Bookmark', title='Cached', is_approved=True, tags=[t])
+
+    first = api_client.get(LIST_URL, {'tag': 'django', 'ordering': '-created_at'})
+    assert first['X-Cache'] == 'MISS'
+    with django_assert_num_queries(0):
+        second = api_client.get(LIST_URL, {'ordering': '-created_at', 'tag': 'django'}) # params reordered
+    assert second['X-Cache'] == 'HIT'
+    assert second.content == first.content
+    assert 'X-RateLimit-Remaining' in second
+
+@pytest.mark.django_db
+def test_each_field_set_is_cached_separately(api_client, django_assert_num_queries):
+    baker.make('bookmarks.Bookmark', is_approved=True)
+    full = api_client.get(LIST_URL)
+    sparse = api_client.get(LIST_URL, {'fields': 'id,url'})
+    assert sparse['X-Cache'] == 'MISS' and sparse.content != full.content
+    with django_assert_num_queries(0):
+        again = api_client.get(LIST_URL, {'fields': 'url,id'}) # same set, other order
+    assert again['X-Cache'] == 'HIT' and again.content == sparse.content
+
+@pytest.mark.django_db
+def test_detail_is_cached_but_404_is_not(api_client):
+    b = baker.make('bookmarks.Bookmark', is_approved=True)
+    api_client.get(f'/bookmarks/v1/bookmarks/{b.id}/')
+    assert api_client.get(f'/bookmarks/v1/bookmarks/{b.id}/')['X-Cache'] == 'HIT'
+    api_client.get('/bookmarks/v1/bookmarks/999999/')
+    r = api_client.get('/bookmarks/v1/bookmarks/999999/')
+    assert r.status_code == 404
+    assert r.get('X-Cache') != 'HIT'
+
+@pytest.mark.django_db
+def test_cache_invalidated_by_edit_and_tag_changes(api_client):
+    b = baker.make('bookmarks.Bookmark', title='Before', is_approved=True)
+    api_client.get(LIST_URL)
+
+    b.title = 'After'
+    b.save()
+    r = api_client.get(LIST_URL)
+    assert r['X-Cache'] == 'MISS'
+    assert r.json()['results'][0]['title'] == 'After'
+
+    t = baker.make('bookmarks.Tag', slug='new')
+    b.tags.add(t)
+    r = api_client.get(LIST_URL)
+    assert r.json()['results'][0]['tags'] == ['new']
+
+    t.slug = 'renamed'
+    t.save()
+    assert api_client.get(LIST_URL).json()['results'][0]['tags'] == ['renamed']
+
+@pytest.mark.django_db
+def test_cache_invalidated_by_bulk_admin_approval(api_client, rf, admin_user):
+    from django.contrib.admin.sites import AdminSite
+    from bookmarks.admin import BookmarkAdmin
+    from bookmarks.models import Bookmark
+
+    b = baker.make('bookmarks.Bookmark', title='Pending', is_approved=False)
+    assert api_client.get(LIST_URL).json()['results'] == []
+
+    request = rf.post('/')
+    request.user = admin_user
+    ma = BookmarkAdmin(Bookmark, AdminSite())
+    ma.message_user = lambda *a, **k: None
+    ma.approve_selected(request, Bookmark.objects.filter(id=b.id))
+
+    assert [x['title'] for x in api_client.get(LIST_URL).json()['results']] == ['Pending']
+
+@pytest.mark.django_db
+def test_unapproved_submission_does_not_invalidate(api_client):
+    from bookmarks import cache as response_cache
+    baker.make('bookmarks.Bookmark', is_approved=True)
+    api_client.get(LIST_URL)
+    before = response_cache.generation()
+    baker.make('bookmarks.Bookmark', is_approved=False)
+    assert response_cache.generation() == before
+    assert api_client.get(LIST_URL)['X-Cache'] == 'HIT'
+
+@pytest.mark.django_db
+def test_cache_can_be_disabled(api_client, settings):
+    settings.BOOKMARKS = {'RESPONSE_CACHE': False}
+    api_client.get(LIST_URL)
+    assert 'X-Cache' not in api_client.get(LIST_URL)
+
+@pytest.mark.django_db
+def test_conditional_get_answers_304_without_queries(api_client, rf, admin_user, django_assert_num_queries):
+    from django.contrib.admin.sites import AdminSite
+    from bookmarks.admin import BookmarkAdmin
+    from bookmarks.models import Bookmark
+
+    b = baker.make('bookmarks.Bookmark', title='Listed', is_approved=True)
+    first = api_client.get(LIST_URL)
+    assert first['Cache-Control'] == 'public, max-age=0, must-revalidate'
+    etag, last_modified = first['ETag'], first['Last-Modified']
+
+    with django_assert_num_queries(0):
+        r = api_client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag)
+    assert r.status_code == 304 and r.content == b''
+    assert (r['ETag'], r['Last-Modified'], r['Cache-Control']) == (etag, last_modified, first['Cache-Control'])
+    assert 'X-RateLimit-Remaining' in r
+    assert api_client.get(LIST_URL, HTTP_IF_MODIFIED_SINCE=last_modified).status_code == 304
+    assert api_client.get(f'{LIST_URL}{b.id}/', HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    # An approval (here the admin action) changes the version
+    pending = baker.make('bookmarks.Bookmark', title='Pending', is_approved=False)
+    request = rf.post('/')
+    request.user = admin_user
+    ma = BookmarkAdmin(Bookmark, AdminSite())
+    ma.message_user = lambda *a, **k: None
+    ma.approve_selected(request, Bookmark.objects.filter(id=pending.id))
+    r = api_client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag)
+    assert r.status_code == 200 and r['ETag'] != etag
+    assert [x['title'] for x in r.json()['results']] == ['Pending', 'Listed']
+
+@pytest.mark.django_db
+def test_conditional_get_without_the_response_cache_and_off(api_client, settings):
+    b = baker.make('bookmarks.Bookmark', is_approved=True)
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    etag = api_client.get(LIST_URL)['ETag']
+    assert api_client.get(LIST_URL, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    missing = api_client.get(f'{LIST_URL}999999/')
+    assert missing.status_code == 404 and 'ETag' not in missing
+
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'CONDITIONAL_GET': False}
+    r = api_client.get(f'{LIST_URL}{b.id}/', HTTP_IF_NONE_MATCH=etag)
+    assert r.status_code == 200 and 'ETag' not in r
+
+@pytest.mark.django_db
+def test_caching_and_validators_default_to_on_only_with_a_shared_cache(api_client, settings, tmp_path):
+    from django.core import checks
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': None, 'CONDITIONAL_GET': None, 'TAG_INDEX': None}
+    r = api_client.get(LIST_URL) # LocMem: each worker would have its own
+    assert 'X-Cache' not in r and 'ETag' not in r
+    assert not [w for w in checks.run_checks() if w.id.startswith('bookmarks.')]
+
+    settings.CACHES = {**settings.CACHES, 'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': str(tmp_path)}}
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE_ALIAS': 'shared'}
+    r = api_client.get(LIST_URL)
+    assert r['X-Cache'] == 'MISS' and 'ETag' in r
+
+    # Forced on over LocMem: allowed (a single worker), with a warning
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': True, 'CONDITIONAL_GET': True, 'TAG_INDEX': True, 'RESPONSE_CACHE_ALIAS': 'default'}
+    assert [w.id for w in checks.run_checks() if w.id.startswith('bookmarks.')] == ['bookmarks.W001', 'bookmarks.W002', 'bookmarks.W003']
@@ -0,0 +1,59 @@
+import json
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('ext', ['ndjson', 'csv', 'ndjson.gz'])
+def test_export_import_round_trip(tmp_path, ext):
+    '''
+    Export everything, wipe, import: same urls, tags, moderation state and timestamps.
+    '''
+    from bookmarks.models import Bookmark, Tag
+    t = baker.make('bookmarks.Tag', slug='django', name='Django')
+    created = timezone.now() - timedelta(days=3)
+    baker.make('bookmarks.Bookmark', title='One', url='https://one.example', is_approved=True,
+               approved_at=created, created_at=created, tags=[t])
+    baker.make('bookmarks.Bookmark', title='Two', url='https://two.example', pending_tags=['new'])
+
+    path = str(tmp_path / f'dump.{ext}')
+    call_command('bookmarks_export', path, '--chunk-size', '1')
+    Bookmark.objects.all().delete()
+
+    call_command('bookmarks_import', path, '--batch-size', '1')
+    one = Bookmark.objects.get(url='https://one.example')
+    assert one.is_approved and one.created_at == created
+    assert one.domain == 'one.example'
+    assert list(one.tags.values_list('slug', flat=True)) == ['django']
+    two = Bookmark.objects.get(url='https://two.example')
+    assert not two.is_approved and two.pending_tags == ['new']
+    assert Tag.objects.count() == 1
+
+@pytest.mark.django_db
+def test_import_skips_duplicates_and_invalid_rows(tmp_path, capsys):
+    from bookmarks.models import Bookmark
+    baker.make('bookmarks.Bookmark', url='https://taken.example')
+    rows = [
+        {'title': 'A', 'url': 'https://a.example/', 'description': '', 'tags': ['x']},
+        {'title': 'A again', 'url': 'https://A.example', 'description': ''},
+        {'title': 'Taken', 'url': 'https://TAKEN.example', 'description': ''},
+        {'title': 'Bad', 'url': 'ftp://bad.example', 'description': ''},
+    ]
+    path = tmp_path / 'in.ndjson'
+    path.write_text('\n'.join(json.dumps(r) for r in rows))
+
+    call_command('bookmarks_import', str(path), '--create-tags')
+    out = capsys.readouterr().out
+    assert '1 created, 2 duplicate, 1 invalid' in out
+    a = Bookmark.objects.get(url='https://a.example')
+    assert list(a.tags.values_list('slug', flat=True)) == ['x']
+
+@pytest.mark.django_db
+def test_import_of_approved_rows_is_searchable(tmp_path, api_client):
+    path = tmp_path / 'in.ndjson'
+    path.write_text(json.dumps({'title': 'Imported gem', 'url': 'https://gem.example', 'description': '', 'is_approved': True}))
+    call_command('bookmarks_import', str(path))
+    r = api_client.get('/bookmarks/v1/bookmarks/', {'search': 'gem'})
+    assert [b['title'] for b in r.json()['results']] == ['Imported gem']
@@ -0,0 +1,109 @@
+import sqlite3, time
+import pytest
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from model_bakery import baker
+from bookmarks import cache as response_cache, db, tag_index
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+SUBMIT_URL = '/bookmarks/v1/bookmarks/submit/'
+SUBMISSION = {'title': 'New', 'url': 'https://new.example/', 'description': 'Fresh', 'tags': ['python']}
+
+@pytest.mark.django_db
+def test_sqlite_connections_get_the_pragmas(tmp_path):
+    wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': str(tmp_path / 'db.sqlite3')}, alias='pragmas')
+    with wrapper.cursor() as cursor:
+        pragmas = {}
+        for name in ('journal_mode', 'synchronous', 'cache_size', 'temp_store'):
+            cursor.execute(f'PRAGMA {name}')
+            pragmas[name] = cursor.fetchone()[0]
+    wrapper.close()
+    assert pragmas == {'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -64 * 1024, 'temp_store': 2}
+
+@pytest.fixture
+def routed(monkeypatch):
+    '''
+    The aliases ReplicaRouter picked for reads (None: the primary).
+    '''
+    picked = []
+    db_for_read = db.ReplicaRouter.db_for_read
+    monkeypatch.setattr(db.ReplicaRouter, 'db_for_read', lambda self, model, **hints: picked.append(db_for_read(self, model, **hints)) or picked[-1])
+    return picked
+
+@pytest.mark.django_db
+def test_public_reads_go_to_a_replica_until_the_client_writes(api_client, settings, routed):
+    # 'default' stands in for a replica: the router returns it only when it picks a replica
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'READ_REPLICAS': ['default'], 'RESPONSE_CACHE': False}
+    bookmark = baker.make('bookmarks.Bookmark', is_approved=True)
+    routed.clear()
+    assert api_client.get(LIST_URL).status_code == 200
+    assert api_client.get(f'{LIST_URL}{bookmark.id}/').status_code == 200
+    assert routed and set(routed) == {'default'}
+
+    # Writes, and the reads they make, stay on the primary; then the client is pinned to it
+    routed.clear()
+    r = api_client.post(SUBMIT_URL, SUBMISSION, format='json')
+    assert r.status_code == 201 and db.STICKY_COOKIE in r.cookies
+    assert api_client.get(LIST_URL).status_code == 200
+    assert routed and set(routed) == {None}
+
+    # Once the pin expires (or is garbled) reads go back to the replicas
+    routed.clear()
+    api_client.cookies[db.STICKY_COOKIE] = 'x'
+    assert api_client.get(LIST_URL).status_code == 200
+    assert set(routed) == {'default'}
+
+@pytest.mark.django_db
+def test_no_replicas_no_routing_and_no_cookie(api_client, routed):
+    r = api_client.post(SUBMIT_URL, SUBMISSION, format='json')
+    assert r.status_code == 201, r.json()
+    assert db.STICKY_COOKIE not in r.cookies
+    api_client.get(LIST_URL)
+    assert set(routed) == {None}
+
+@pytest.mark.django_db
+def test_tag_index_reads_from_the_primary_during_replica_reads(rf, settings, routed, django_capture_on_commit_callbacks):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'READ_REPLICAS': ['default']}
+    python = baker.make('bookmarks.Tag', name='Python', slug='python')
+    first = baker.make('bookmarks.Bookmark', is_approved=True, tags=[python])
+    index = tag_index.get_index()
+    with db.replica_reads(rf.get(LIST_URL)):
+        assert index.sync() # rebuild
+    with django_capture_on_commit_callbacks(execute=True):
+        second = baker.make('bookmarks.Bookmark', is_approved=True, tags=[python])
+    routed.clear()
+    with db.replica_reads(rf.get(LIST_URL)):
+        assert index.sync() # refresh
+    assert routed and set(routed) == {None}
+    assert set(index.page(['python'])) == {first.id, second.id}
+
+@pytest.mark.django_db
+def test_replica_pages_just_after_a_change_are_not_cached_or_validated(api_client, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'READ_REPLICAS': ['default'], 'READ_REPLICA_MAX_LAG': 10}
+    baker.make('bookmarks.Bookmark', is_approved=True)
+    response_cache.bump()
+    for _ in range(2):
+        r = api_client.get(LIST_URL)
+        assert r['X-Cache'] == 'MISS' and 'ETag' not in r
+
+    # The replicas have caught up
+    response_cache.get_cache().set(response_cache.CHANGED_KEY, time.time() - 10)
+    r = api_client.get(LIST_URL)
+    assert r['X-Cache'] == 'MISS' and 'ETag' in r
+    assert api_client.get(LIST_URL)['X-Cache'] == 'HIT'
+
+def test_copy_database(tmp_path):
+    primary, replica = str(tmp_path / 'primary.sqlite3'), str(tmp_path / 'replica.sqlite3')
+    conn = sqlite3.connect(primary)
+    conn.execute('PRAGMA journal_mode = wal')
+    conn.execute('CREATE TABLE t (x)')
+    conn.execute('INSERT INTO t VALUES (1)')
+    conn.commit()
+    db.copy_database(primary, replica) # while the primary is open
+    conn.execute('INSERT INTO t VALUES (2)')
+    conn.commit()
+    conn.close()
+    copy = sqlite3.connect(replica)
+    assert copy.execute('SELECT x FROM t').fetchall() == [(1,)]
+    assert copy.execute('PRAGMA journal_mode').fetchone() == ('wal',)
+    copy.close()
@@ -0,0 +1,139 @@
+import json
+import pytest
+from datetime import timedelta
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.base import BaseStorage
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.utils import timezone
+from model_bakery import baker
+from bookmarks import bulk
+from bookmarks.admin import BookmarkAdmin, DomainFilter
+from bookmarks.models import Bookmark, DomainStat
+
+DOMAINS_URL = '/bookmarks/v1/domains/'
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def _counts():
+    # Domains still holding bookmarks; emptied rows are kept at zero
+    return {d: (a, t) for d, a, t in DomainStat.objects.values_list('domain', 'approved_count', 'total_count') if t}
+
+def _make(url, approved=True, **kwargs):
+    return baker.make('bookmarks.Bookmark', url=url, is_approved=approved, **kwargs)
+
+@pytest.mark.django_db
+def test_counts_follow_create_approve_move_and_delete():
+    a = _make('https://www.example.com/a', approved=False)
+    _make('https://example.com/b')
+    assert _counts() == {'example.com': (1, 2)}
+
+    a = Bookmark.objects.get(pk=a.pk)
+    a.is_approved = True
+    a.save()
+    assert _counts() == {'example.com': (2, 2)}
+    a.title = 'Edited' # no change in domain or approval
+    a.save()
+    assert _counts() == {'example.com': (2, 2)}
+
+    a.url = 'https://other.org/a'
+    a.save()
+    assert _counts() == {'example.com': (1, 1), 'other.org': (1, 1)}
+    a.is_approved = False
+    a.url = 'https://example.com/a'
+    a.save()
+    assert _counts() == {'example.com': (1, 2)}
+
+    a.delete()
+    Bookmark.objects.get(url='https://example.com/b').delete()
+    assert _counts() == {}
+
+@pytest.mark.django_db
+def test_bulk_paths_update_counts(tmp_path):
+    bulk.submit_bookmarks([
+        {'url': f'https://example.com/{i}', 'title': 't', 'description': 'd', 'tags': []} for i in range(3)
+    ])
+    assert _counts() == {'example.com': (0, 3)}
+
+    request = RequestFactory().post('/admin/')
+    request.user = get_user_model().objects.create_user(username='mod', is_staff=True)
+    request._messages = BaseStorage(request)
+    BookmarkAdmin(Bookmark, AdminSite()).approve_selected(request, Bookmark.objects.filter(url__endswith='/1'))
+    assert _counts() == {'example.com': (1, 3)}
+
+    path = tmp_path / 'in.ndjson'
+    path.write_text('\n'.join(json.dumps({
+        'title': f'T{i}', 'url': f'https://rust-lang.org/{i}', 'is_approved': i % 2 == 0,
+    }) for i in range(3)))
+    call_command('bookmarks_import', str(path))
+    assert _counts() == {'example.com': (1, 3), 'rust-lang.org': (2, 3)}
+
+@pytest.mark.django_db
+def test_reconcile_repairs_drift(capsys):
+    _make('https://example.com/a')
+    _make('https://example.com/b', approved=False)
+    DomainStat.objects.filter(domain='example.com').update(approved_count=5)
+    DomainStat.objects.create(domain='gone.net', approved_count=1, total_count=1)
+
+    call_command('bookmarks_reconcile_domain_counts', '--dry-run')
+    out = capsys.readouterr().out
+    assert 'example.com: approved 5 -> 1, total 2 -> 2' in out
+    assert 'gone.net: approved 1 -> 0, total 1 -> 0' in out
+
+    call_command('bookmarks_reconcile_domain_counts')
+    assert _counts() == {'example.com': (1, 2)}
+    capsys.readouterr()
+    call_command('bookmarks_reconcile_domain_counts')
+    assert '0 domain count(s) repaired' in capsys.readouterr().out
+
+@pytest.mark.django_db
+def test_domains_endpoint_reads_the_rollup(api_client, django_assert_num_queries):
+    for i in range(3):
+        _make(f'https://example.com/{i}')
+    _make('https://python.org/')
+    _make('https://hidden.net/', approved=False)
+
+    with django_assert_num_queries(1):
+        data = api_client.get(DOMAINS_URL).json()
+    assert data['results'] == [{'domain': 'example.com', 'count': 3}, {'domain': 'python.org', 'count': 1}]
+    by_name = api_client.get(DOMAINS_URL, {'ordering': 'domain'}).json()['results']
+    assert [d['domain'] for d in by_name] == ['example.com', 'python.org']
+
+@pytest.mark.django_db
+def test_list_filters_by_domain(api_client, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    now = timezone.now()
+    for i in range(12):
+        _make(f'https://www.example.com/{i}', title=f'E{i}', created_at=now - timedelta(minutes=i))
+    _make('https://example.com/hidden', approved=False)
+    _make('https://example.org/')
+
+    first = api_client.get(LIST_URL, {'domain': 'WWW.Example.com', 'count': 'true'}).json()
+    assert first['count'] == 12
+    second = api_client.get(first['next']).json()
+    assert [b['title'] for b in first['results'] + second['results']] == [f'E{i}' for i in range(12)]
+    assert api_client.get(LIST_URL, {'domain': 'nowhere.test'}).json()['results'] == []
+
+@pytest.mark.django_db
+def test_domain_filter_overrides_tag_index(api_client, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    python = baker.make('bookmarks.Tag', name='Python', slug='python')
+    _make('https://example.com/a', tags=[python])
+    _make('https://python.org/b', tags=[python])
+
+    results = api_client.get(LIST_URL, {'tags': 'python', 'domain': 'python.org'}).json()['results']
+    assert [b['url'] for b in results] == ['https://python.org/b']
+
+@pytest.mark.django_db
+def test_admin_domain_filter_lists_busiest_domains_from_rollup(django_assert_num_queries):
+    for i in range(3):
+        _make(f'https://example.com/{i}', approved=False)
+    _make('https://python.org/')
+    request = RequestFactory().get('/admin/bookmarks/bookmark/', {'domain': 'rare.net'})
+    model_admin = BookmarkAdmin(Bookmark, AdminSite())
+
+    with django_assert_num_queries(1):
+        flt = DomainFilter(request, {'domain': ['rare.net']}, Bookmark, model_admin)
+    assert [d for d, _ in flt.lookup_choices] == ['example.com', 'python.org', 'rare.net']
+    flt = DomainFilter(request, {'domain': ['example.com']}, Bookmark, model_admin)
+    assert flt.queryset(request, Bookmark.objects.all()).count() == 3
@@ -0,0 +1,96 @@
+import pytest
+from datetime import timedelta
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework.renderers import JSONRenderer
+from bookmarks import renderers
+from bookmarks.models import Bookmark
+from bookmarks.renderers import FastJSONRenderer
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def _corpus():
+    now = timezone.now()
+    django, python = baker.make('bookmarks.Tag', name='Django', slug='django'), baker.make('bookmarks.Tag', name='Python', slug='python')
+    baker.make('bookmarks.Bookmark', title='Ünïcode — “quotes” \u2028 sep', description='tab\there\x01 and / slash', is_approved=True, created_at=now, tags=[python, django])
+    baker.make('bookmarks.Bookmark', title='Micro', is_approved=True, created_at=now.replace(microsecond=123456) - timedelta(days=1))
+    for i in range(12):
+        baker.make('bookmarks.Bookmark', title=f'B{i}', is_approved=True, created_at=now - timedelta(days=2, minutes=i), tags=[django])
+    baker.make('bookmarks.Bookmark', title='Hidden', is_approved=False)
+
+def _fetch(api_client, settings, fast, url, params=None):
+    settings.BOOKMARKS = {'RESPONSE_CACHE': False, 'FAST_READ': fast}
+    settings.REST_FRAMEWORK = {
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_RENDERER_CLASSES': ['bookmarks.renderers.FastJSONRenderer' if fast else 'rest_framework.renderers.JSONRenderer'],
+    }
+    r = api_client.get(url, params or {})
+    assert r.status_code == 200, r.content
+    return r.content
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [{}, {'page_size': 100}, {'tag': 'django', 'ordering': 'created_at'}, {'search': 'micro'}, {'page': 2},
+    {'fields': 'id,title,url'}, {'fields': 'created_at,url', 'include': 'tags', 'tag': 'django', 'page_size': 5}])
+def test_fast_list_is_byte_identical(api_client, settings, params):
+    _corpus()
+    slow = _fetch(api_client, settings, False, LIST_URL, params)
+    assert _fetch(api_client, settings, True, LIST_URL, params) == slow
+
+@pytest.mark.django_db
+def test_fast_detail_is_byte_identical(api_client, settings):
+    _corpus()
+    for b in Bookmark.objects.filter(is_approved=True):
+        url = f'{LIST_URL}{b.id}/'
+        assert _fetch(api_client, settings, True, url) == _fetch(api_client, settings, False, url)
+        sparse = {'fields': 'title', 'include': 'tags'}
+        assert _fetch(api_client, settings, True, url, sparse) == _fetch(api_client, settings, False, url, sparse)
+
+@pytest.mark.django_db
+def test_fast_detail_hides_unapproved(api_client, settings):
+    settings.BOOKMARKS = {'RESPONSE_CACHE': False}
+    b = baker.make('bookmarks.Bookmark', is_approved=False)
+    assert api_client.get(f'{LIST_URL}{b.id}/').status_code == 404
+
+@pytest.mark.django_db
+def test_fast_list_queries_do_not_grow_with_page_size(api_client, settings, django_assert_num_queries):
+    _corpus()
+    settings.BOOKMARKS = {'RESPONSE_CACHE': False}
+    with django_assert_num_queries(2): # page + tag slugs
+        api_client.get(LIST_URL, {'page_size': 100})
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('fast', [True, False])
+def test_sparse_fields_skip_the_tags_query(api_client, settings, django_assert_num_queries, fast):
+    _corpus()
+    settings.BOOKMARKS = {'RESPONSE_CACHE': False, 'FAST_READ': fast}
+    with django_assert_num_queries(1) as ctx: # the page only
+        r = api_client.get(LIST_URL, {'fields': 'id,url'})
+    assert not {'title', 'description'} & {c for c in ctx.captured_queries[0]['sql'].split('"')}
+    with django_assert_num_queries(2): # page + tags
+        api_client.get(LIST_URL, {'fields': 'id,url', 'include': 'tags'})
+    assert r.json()['results'][0].keys() == {'id', 'url'}
+
+@pytest.mark.parametrize('data', [
+    {'a': [1, 2.5, None, True], 'b': 'ü\u2028\u2029<>&', 'c': {'nested': 'x'}},
+    {'when': timezone.now(), 'day': timezone.now().date()},
+    [],
+])
+def test_renderer_matches_json_renderer(data):
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+@pytest.mark.parametrize('value', [float('nan'), float('inf'), -float('inf')])
+def test_renderer_rejects_non_finite_floats_like_json_renderer(value):
+    data = {'results': [{'score': value}]}
+    with pytest.raises(ValueError):
+        JSONRenderer().render(data)
+    with pytest.raises(ValueError):
+        FastJSONRenderer().render(data)
+
+def test_renderer_falls_back_without_orjson(monkeypatch):
+    monkeypatch.setattr(renderers, 'orjson', None)
+    data = {'b': 'ü\u2028'}
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+def test_renderer_honours_indent():
+    data = {'a': 1}
+    assert FastJSONRenderer().render(data, 'application/json; indent=2') == JSONRenderer().render(data, 'application/json; indent=2')
@@ -0,0 +1,171 @@
+import signal
+import pytest
+from datetime import timedelta
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.base import BaseStorage
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory
+from django.utils import timezone
+from bookmarks import jobs, metrics
+from bookmarks.admin import JobAdmin
+from bookmarks.models import Bookmark, Job
+
+SUBMIT_URL = '/bookmarks/v1/bookmarks/submit/'
+BATCH_URL = '/bookmarks/v1/bookmarks/submit/batch/'
+
+@pytest.fixture
+def registry(monkeypatch):
+    # Handlers registered by a test stay in that test
+    monkeypatch.setattr(jobs, '_handlers', dict(jobs._handlers))
+    return jobs
+
+@pytest.fixture
+def calls(registry):
+    seen = []
+
+    @registry.handler('echo', batch_size=3)
+    def echo(payloads):
+        seen.append([p['n'] for p in payloads])
+        return {i: f'bad {p["n"]}' for i, p in enumerate(payloads) if p.get('fail')}
+    return seen
+
+def _statuses():
+    return dict(Job.objects.values_list('payload__n', 'status'))
+
+@pytest.mark.django_db
+def test_enqueue_is_idempotent_per_key():
+    jobs.enqueue('echo', {'n': 1}, key='echo:1')
+    jobs.enqueue('echo', {'n': 2}, key='echo:1')
+    jobs.enqueue_many('echo', [({'n': 3}, None), ({'n': 4}, None), ({'n': 5}, 'echo:5'), ({'n': 6}, 'echo:5')])
+    assert sorted(Job.objects.values_list('payload__n', flat=True)) == [1, 3, 4, 5]
+
+@pytest.mark.django_db
+def test_worker_runs_jobs_in_batches_of_one_kind(calls, django_assert_max_num_queries):
+    jobs.enqueue_many('echo', [({'n': n}, None) for n in range(7)])
+    jobs.enqueue('unhandled', {'n': 99})
+
+    assert jobs.work(once=True) == 7
+    assert calls == [[0, 1, 2], [3, 4, 5], [6]]
+    assert set(Job.objects.filter(kind='echo').values_list('status', flat=True)) == {Job.DONE}
+    assert Job.objects.get(kind='unhandled').status == Job.QUEUED
+
+    jobs.enqueue_many('echo', [({'n': n}, None) for n in range(10, 13)])
+    with django_assert_max_num_queries(5): # claim (pick kind + select + update + fetch) and finish
+        jobs.run(*jobs.claim('w'))
+
+@pytest.mark.django_db
+def test_failed_jobs_retry_with_backoff_then_fail(calls, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'JOB_MAX_ATTEMPTS': 2, 'JOB_RETRY_DELAY': 60}
+    jobs.enqueue_many('echo', [({'n': 0}, None), ({'n': 1, 'fail': True}, None)])
+
+    assert jobs.work(once=True) == 2
+    retry = Job.objects.get(payload__n=1)
+    assert (retry.status, retry.attempts, retry.last_error) == (Job.QUEUED, 1, 'bad 1')
+    assert timezone.now() + timedelta(seconds=25) < retry.run_at < timezone.now() + timedelta(seconds=61)
+    assert _statuses() == {0: Job.DONE, 1: Job.QUEUED}
+    assert jobs.work(once=True) == 0 # not due yet
+
+    Job.objects.filter(pk=retry.pk).update(run_at=timezone.now())
+    assert jobs.work(once=True) == 1
+    retry.refresh_from_db()
+    assert (retry.status, retry.attempts) == (Job.FAILED, 2)
+
+@pytest.mark.django_db
+def test_raising_handler_fails_the_whole_batch(registry):
+    @registry.handler('crash', batch_size=10)
+    def crash(payloads):
+        raise RuntimeError('down')
+
+    jobs.enqueue_many('crash', [({'n': n}, None) for n in range(3)])
+    assert jobs.work(once=True) == 3
+    assert set(Job.objects.values_list('status', 'last_error')) == {(Job.QUEUED, 'down')}
+
+@pytest.mark.django_db
+def test_concurrent_workers_never_claim_the_same_job(calls):
+    jobs.enqueue_many('echo', [({'n': n}, None) for n in range(5)])
+    _, first = jobs.claim('a')
+    _, second = jobs.claim('b')
+    _, third = jobs.claim('c')
+    ids = [j.id for j in first + second + third]
+    assert len(ids) == len(set(ids)) == 5
+    assert {j.locked_by for j in first} == {'a'}
+    assert jobs.claim('d') == (None, [])
+
+@pytest.mark.django_db
+def test_reap_and_purge(calls, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'JOB_TIMEOUT': 60, 'JOB_RETENTION': 3600, 'JOB_MAX_ATTEMPTS': 3}
+    long_ago = timezone.now() - timedelta(hours=2)
+    Job.objects.create(kind='echo', payload={'n': 0}, status=Job.RUNNING, attempts=1, locked_by='dead', locked_at=long_ago)
+    Job.objects.create(kind='echo', payload={'n': 1}, status=Job.RUNNING, attempts=3, locked_by='dead', locked_at=long_ago)
+    Job.objects.create(kind='echo', payload={'n': 2}, status=Job.RUNNING, attempts=1, locked_by='alive', locked_at=timezone.now())
+    Job.objects.create(kind='echo', payload={'n': 3}, status=Job.DONE, finished_at=long_ago)
+    Job.objects.create(kind='echo', payload={'n': 4}, status=Job.DONE, finished_at=timezone.now())
+
+    assert jobs.reap() == 2
+    assert jobs.purge() == 1
+    assert _statuses() == {0: Job.QUEUED, 1: Job.FAILED, 2: Job.RUNNING, 4: Job.DONE}
+
+@pytest.mark.django_db
+def test_queue_depth_in_stats_command_and_metrics(calls, api_client, capsys):
+    metrics.reset()
+    jobs.enqueue_many('echo', [({'n': n}, None) for n in range(4)])
+    Job.objects.filter(payload__n=0).update(run_at=timezone.now() - timedelta(seconds=30))
+    Job.objects.filter(payload__n=3).update(status=Job.FAILED)
+
+    stats = jobs.stats()
+    assert {k: v for k, v in stats['echo'].items() if k != 'oldest_due_seconds'} == {'queued': 3, 'running': 0, 'failed': 1}
+    assert stats['echo']['oldest_due_seconds'] >= 30
+
+    call_command('bookmarks_worker', '--stats')
+    assert 'echo' in capsys.readouterr().out
+    body = api_client.get('/bookmarks/v1/metrics/').content.decode()
+    assert 'bookmarks_jobs{kind="echo",status="queued"} 3' in body
+    assert 'bookmarks_jobs{kind="echo",status="failed"} 1' in body
+
+    handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+    call_command('bookmarks_worker', '--once')
+    assert 'Processed 3 job(s).' in capsys.readouterr().out
+    assert (signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)) == handlers
+    body = api_client.get('/bookmarks/v1/metrics/').content.decode()
+    assert 'bookmarks_jobs_total{kind="echo",result="done"} 3' in body
+
+@pytest.mark.django_db
+def test_worker_rejects_unknown_kinds():
+    with pytest.raises(CommandError):
+        call_command('bookmarks_worker', '--once', '--kinds', 'nope')
+
+@pytest.mark.django_db
+def test_submissions_only_enqueue(api_client, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'SUBMIT_JOBS': ['enrich', 'check']}
+    r = api_client.post(SUBMIT_URL, {'title': 'T', 'url': 'https://example.com/one', 'description': 'd', 'tags': ['x']}, format='json')
+    assert r.status_code == 201
+    single = r.json()['id']
+    r = api_client.post(BATCH_URL, [
+        {'title': 'T', 'url': f'https://example.com/{i}', 'description': 'd', 'tags': ['x']} for i in ('two', 'one')
+    ], format='json')
+    batch = [item['id'] for item in r.json()['results'] if item['status'] == 'created']
+
+    assert len(batch) == 1
+    assert sorted(Job.objects.values_list('key', flat=True)) == sorted(
+        f'{kind}:{i}' for kind in ('enrich', 'check') for i in (single, *batch)
+    )
+    assert Job.objects.get(key=f'enrich:{single}').payload == {'id': single}
+    assert Bookmark.objects.count() == 2
+
+@pytest.mark.django_db
+def test_admin_retry_selected(calls):
+    failed = Job.objects.create(kind='echo', payload={'n': 0}, status=Job.FAILED, attempts=5, finished_at=timezone.now())
+    running = Job.objects.create(kind='echo', payload={'n': 1}, status=Job.RUNNING, attempts=1, locked_at=timezone.now())
+    request = RequestFactory().post('/admin/')
+    request.user = get_user_model().objects.create_user(username='mod', is_staff=True)
+    request._messages = BaseStorage(request)
+
+    JobAdmin(Job, AdminSite()).retry_selected(request, Job.objects.all())
+    assert [m.message for m in request._messages._queued_messages] == ['Queued 1 job(s) again.']
+    failed.refresh_from_db()
+    assert (failed.status, failed.attempts, failed.finished_at) == (Job.QUEUED, 0, None)
+    assert Job.objects.get(pk=running.pk).status == Job.RUNNING
+    assert jobs.work(once=True) == 1
+    assert calls == [[0]]
+
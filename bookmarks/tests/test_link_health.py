@@ -0,0 +1,129 @@
+import asyncio
+from datetime import timedelta
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+from model_bakery import baker
+from bookmarks import link_health
+from bookmarks.models import Bookmark
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def _check(url):
+    async def run():
+        pool = link_health.new_pool()
+        try:
+            return await link_health.check(pool, url, 'stand.in')
+        finally:
+            await pool.close()
+    return asyncio.run(run())
+
+def test_head_then_ranged_get(web):
+    web.routes['/ok'] = (200, {}, b'page')
+    web.routes['/no-head'] = (200, {}, b'page')
+    web.head_routes['/no-head'] = (405, {}, b'')
+    web.routes['/moved'] = (301, {'Location': '/ok'}, b'')
+    web.routes['/busy'] = (429, {}, b'slow down')
+
+    assert _check(f'{web.base}/ok').status == 200
+    assert _check(f'{web.base}/moved').status == 200
+    assert _check(f'{web.base}/no-head').status == 200
+    assert _check(f'{web.base}/gone').status == 404
+    assert _check(f'{web.base}/busy').status == 429
+    assert web.requests == [
+        ('HEAD', '/ok', None),
+        ('HEAD', '/moved', None), ('HEAD', '/ok', None),
+        ('HEAD', '/no-head', None), ('GET', '/no-head', 'bytes=0-0'),
+        ('HEAD', '/gone', None), ('GET', '/gone', 'bytes=0-0'),
+        ('HEAD', '/busy', None), # 429 is not worth a second request
+    ]
+
+def test_failures_are_checks(web, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'LINK_CHECK_TIMEOUT': 0.2}
+    web.delay = 1.0
+    slow = _check(f'{web.base}/slow')
+    assert (slow.status, slow.error) == (None, 'Timed out')
+    assert link_health.failed(slow) is True
+    assert _check('ftp://example.com/').error == 'Unsupported URL: ftp://example.com/'
+
+@pytest.mark.django_db
+def test_dead_after_consecutive_failures_then_revived(web, settings, api_client):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'LINK_DEAD_AFTER': 2, 'LINK_CHECK_INTERVAL': 0}
+    web.routes['/ok'] = (200, {}, b'page')
+    ok = baker.make('bookmarks.Bookmark', url=f'{web.base}/ok', is_approved=True)
+    gone = baker.make('bookmarks.Bookmark', url=f'{web.base}/gone', is_approved=True)
+
+    assert link_health.sweep() == {'checked': 2}
+    gone.refresh_from_db()
+    assert (gone.link_status, gone.link_failures, gone.link_dead) == (404, 1, False)
+    assert gone.link_checked_at is not None and gone.link_latency_ms is not None
+
+    assert link_health.sweep() == {'checked': 2, 'dead': 1}
+    assert [b['id'] for b in api_client.get(LIST_URL, {'dead': 'true'}).json()['results']] == [gone.id]
+    assert [b['id'] for b in api_client.get(LIST_URL, {'dead': 'false'}).json()['results']] == [ok.id]
+
+    web.routes['/gone'] = (429, {}, b'slow down')
+    assert link_health.sweep() == {'checked': 2}
+    assert Bookmark.objects.get(pk=gone.pk).link_failures == 2 # inconclusive: neither way
+
+    web.routes['/gone'] = (200, {}, b'back')
+    assert link_health.sweep() == {'checked': 2, 'revived': 1}
+    gone.refresh_from_db()
+    assert (gone.link_status, gone.link_failures, gone.link_dead) == (200, 0, False)
+    assert api_client.get(LIST_URL, {'dead': 'true'}).json()['results'] == []
+
+@pytest.mark.django_db
+def test_due_checks_unchecked_first_then_oldest():
+    now = timezone.now()
+    old, older, recent = [baker.make('bookmarks.Bookmark', is_approved=True) for _ in range(3)]
+    Bookmark.objects.filter(pk=old.pk).update(link_checked_at=now - timedelta(days=10))
+    Bookmark.objects.filter(pk=older.pk).update(link_checked_at=now - timedelta(days=20))
+    Bookmark.objects.filter(pk=recent.pk).update(link_checked_at=now - timedelta(days=1))
+    unchecked = [baker.make('bookmarks.Bookmark', is_approved=True) for _ in range(2)]
+    baker.make('bookmarks.Bookmark', is_approved=False) # pending: not checked
+
+    expected = [unchecked[0].id, unchecked[1].id, older.id, old.id]
+    assert [row[0] for row in link_health.due(10)] == expected
+    first = link_health.due(3)
+    assert [row[0] for row in first + link_health.due(3, after=first[-1])] == expected
+
+    plan = Bookmark.objects.filter(is_approved=True, link_checked_at__isnull=True).order_by('id').explain()
+    assert 'bookmark_link_checked_idx' in plan
+    plan = Bookmark.objects.filter(is_approved=True, link_dead=True).order_by('-created_at').explain()
+    assert 'bookmark_dead_idx' in plan
+
+@pytest.mark.django_db
+def test_command_limit_and_resume(web, capsys):
+    web.routes['/'] = (200, {}, b'page')
+    bookmarks = [baker.make('bookmarks.Bookmark', url=f'{web.base}/?n={i}', is_approved=True) for i in range(5)]
+
+    call_command('bookmarks_check_links', '--limit', '3', '--batch-size', '2')
+    out, err = capsys.readouterr()
+    assert 'Checked 3 link(s): 0 newly dead, 0 revived, 0 skipped.' in out
+    assert '3 checked (0 dead, 0 revived)' in err
+    checked = set(Bookmark.objects.filter(link_checked_at__isnull=False).values_list('id', flat=True))
+    assert checked == {b.id for b in bookmarks[:3]}
+
+    call_command('bookmarks_check_links')
+    assert 'Checked 2 link(s)' in capsys.readouterr().out
+    assert not Bookmark.objects.filter(link_checked_at__isnull=True).exists()
+    call_command('bookmarks_check_links')
+    assert 'Checked 0 link(s)' in capsys.readouterr().out # nothing due for LINK_CHECK_INTERVAL
+
+@pytest.mark.django_db
+def test_sweep_caps_requests_per_domain(web, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'LINK_CHECK_PER_DOMAIN': 2}
+    web.delay = 0.05
+    web.routes['/'] = (200, {}, b'page')
+    for i in range(8):
+        baker.make('bookmarks.Bookmark', url=f'{web.base}/?n={i}', is_approved=True)
+    assert link_health.sweep(batch_size=80) == {'checked': 8}
+    assert web.max_in_flight == 2
+
+    # One domain may hold at most a tenth of the window; the rest waits for the next run
+    Bookmark.objects.update(link_checked_at=None)
+    assert link_health.sweep(batch_size=40) == {'checked': 4, 'skipped': 4}
+
+@pytest.mark.django_db
+def test_dead_filter_rejects_other_values(api_client):
+    assert api_client.get(LIST_URL, {'dead': 'maybe'}).status_code == 400
@@ -0,0 +1,156 @@
+import asyncio
+import pytest
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.base import BaseStorage
+from django.core.management import call_command
+from django.test import RequestFactory
+from model_bakery import baker
+from bookmarks import jobs, link_metadata
+from bookmarks.admin import BookmarkAdmin
+from bookmarks.models import Bookmark, Job, LinkMetadata
+
+PAGE = b'''<!doctype html><html><head>
+<meta charset="utf-8"><title>
+  Example   page </title>
+<meta name="description" content="What it is &amp; why">
+<link rel="canonical" href="/canonical">
+</head><body><title>not this</title></body></html>'''
+
+def _fetch_all(urls, **pool_options):
+    async def run():
+        pool = link_metadata.new_pool(**pool_options)
+        try:
+            return await link_metadata.fetch_all([(url, 'stand.in') for url in urls], pool), pool
+        finally:
+            await pool.close()
+    return asyncio.run(run())
+
+def test_follows_redirects_and_parses_the_head(web):
+    web.routes['/old'] = (301, {'Location': '/page'}, b'')
+    web.routes['/page'] = (200, {}, PAGE)
+    [metadata], _ = _fetch_all([f'{web.base}/old'])
+    assert metadata == link_metadata.Metadata(
+        status_code=200, final_url=f'{web.base}/page', canonical_url=f'{web.base}/canonical',
+        title='Example page', description='What it is & why', content_type='text/html',
+    )
+
+def test_reuses_keep_alive_connections(web):
+    for i in range(20):
+        web.routes[f'/{i}'] = (200, {}, PAGE)
+    results, pool = _fetch_all([f'{web.base}/{i}' for i in range(20)], per_domain=2)
+    assert all(m.title == 'Example page' for m in results)
+    assert pool.opened == web.connections <= 2
+    assert pool.reused == 20 - pool.opened
+
+def test_caps_requests_per_domain(web):
+    web.delay = 0.05
+    for i in range(12):
+        web.routes[f'/{i}'] = (200, {}, PAGE)
+    results, _ = _fetch_all([f'{web.base}/{i}' for i in range(12)], per_domain=3)
+    assert len(results) == 12
+    assert web.max_in_flight == 3
+
+def test_reads_at_most_max_bytes(web, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'METADATA_MAX_BYTES': 100}
+    web.routes['/big'] = (200, {}, b'<html><head><title>Big</title></head>' + b'x' * 100000)
+    chunks = [b'<title>Chunked</title>', b'y' * 65536]
+    web.routes['/chunked'] = (200, {'Content-Length': None, 'Transfer-Encoding': 'chunked'},
+                              b''.join(b'%x\r\n%s\r\n' % (len(c), c) for c in chunks) + b'0\r\n\r\n')
+    web.routes['/small'] = (200, {}, PAGE[:80])
+    results, pool = _fetch_all([f'{web.base}/big', f'{web.base}/chunked', f'{web.base}/small'], per_domain=1)
+    assert [m.title for m in results] == ['Big', 'Chunked', 'Example page']
+    assert pool.opened == 3 # a connection with an unread body is never reused
+
+def test_failures_are_results(web, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'METADATA_TIMEOUT': 0.2, 'METADATA_MAX_REDIRECTS': 2}
+    web.routes['/loop'] = (302, {'Location': '/loop'}, b'')
+    web.routes['/gone'] = (410, {}, PAGE)
+    web.routes['/pdf'] = (200, {'Content-Type': 'application/pdf'}, b'%PDF-1.4')
+    results, _ = _fetch_all([f'{web.base}/loop', f'{web.base}/gone', f'{web.base}/pdf', 'ftp://example.com/'])
+    assert [(m.error, m.retry) for m in results] == [
+        ('Too many redirects', False), ('HTTP 410', False), ('', False), ('Unsupported URL: ftp://example.com/', False),
+    ]
+    assert results[1].status_code == 410 and results[1].title == ''
+    assert results[2].content_type == 'application/pdf'
+
+    web.delay = 1.0
+    web.routes['/slow'] = (200, {}, PAGE)
+    [slow], _ = _fetch_all([f'{web.base}/slow'])
+    assert (slow.error, slow.retry) == ('Timed out', True)
+
+def test_refuses_private_addresses(web, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'METADATA_ALLOW_PRIVATE': False}
+    web.routes['/'] = (200, {}, PAGE)
+    [metadata], _ = _fetch_all([f'{web.base}/'])
+    assert metadata.error == '127.0.0.1 does not resolve to a public address'
+    assert web.connections == 0
+
+@pytest.mark.django_db
+def test_submit_job_stores_metadata(web, api_client):
+    web.routes['/page'] = (200, {}, PAGE)
+    r = api_client.post('/bookmarks/v1/bookmarks/submit/', {
+        'title': 'typed by anyone', 'url': f'{web.base}/page', 'description': 'd', 'tags': ['web'],
+    }, format='json')
+    assert r.status_code == 201, r.json()
+    bookmark_id = r.json()['id']
+    assert Job.objects.get().key == f'fetch_metadata:{bookmark_id}'
+
+    assert jobs.work(once=True) == 1
+    metadata = LinkMetadata.objects.get(bookmark_id=bookmark_id)
+    assert (metadata.status_code, metadata.title, metadata.error) == (200, 'Example page', '')
+    assert Job.objects.get().status == Job.DONE
+
+@pytest.mark.django_db
+def test_retryable_failures_keep_earlier_metadata(web):
+    web.routes['/page'] = (200, {}, PAGE)
+    bookmark = baker.make('bookmarks.Bookmark', url=f'{web.base}/page')
+    link_metadata.enrich([bookmark.id])
+    web.shutdown()
+    web.server_close() # connection refused from now on
+
+    jobs.enqueue('fetch_metadata', {'id': bookmark.id})
+    jobs.enqueue('fetch_metadata', {'id': 999999}) # deleted since: nothing to do
+    assert jobs.work(once=True) == 2
+    assert sorted(Job.objects.values_list('status', flat=True)) == [Job.DONE, Job.QUEUED]
+    assert LinkMetadata.objects.get().title == 'Example page'
+
+@pytest.mark.django_db
+def test_backfill_command(web, capsys):
+    for i in range(5):
+        web.routes[f'/{i}'] = (200, {}, PAGE)
+        baker.make('bookmarks.Bookmark', url=f'{web.base}/{i}')
+    done = Bookmark.objects.order_by('id').first()
+    LinkMetadata.objects.create(bookmark=done, title='Fetched before')
+
+    call_command('bookmarks_fetch_metadata', '--batch-size', '2')
+    assert 'Fetched metadata for 4 bookmark(s)' in capsys.readouterr().out
+    assert LinkMetadata.objects.get(bookmark=done).title == 'Fetched before'
+    assert LinkMetadata.objects.filter(title='Example page').count() == 4
+
+    call_command('bookmarks_fetch_metadata', '--all')
+    assert LinkMetadata.objects.filter(title='Example page').count() == 5
+
+@pytest.mark.django_db
+def test_admin_uses_fetched_metadata():
+    kept = baker.make('bookmarks.Bookmark', title='Typed', description='Typed too', is_approved=True)
+    replaced = baker.make('bookmarks.Bookmark', title='Typed', description='Typed too', is_approved=True)
+    LinkMetadata.objects.create(bookmark=replaced, title='T' * 200, description='Fetched')
+    LinkMetadata.objects.create(bookmark=kept, error='HTTP 404')
+    request = RequestFactory().post('/admin/')
+    request.user = get_user_model().objects.create_user(username='mod', is_staff=True)
+    request._messages = BaseStorage(request)
+
+    BookmarkAdmin(Bookmark, AdminSite()).use_fetched_metadata(request, Bookmark.objects.all())
+    assert [m.message for m in request._messages._queued_messages] == ['Updated 1 bookmark(s) from their fetched metadata.']
+    replaced.refresh_from_db()
+    assert (replaced.title, replaced.description) == ('T' * 120, 'Fetched')
+    assert Bookmark.objects.get(pk=kept.pk).title == 'Typed'
+
+@pytest.mark.django_db
+def test_bulk_reject_deletes_metadata():
+    from bookmarks import bulk
+    bookmark = baker.make('bookmarks.Bookmark')
+    LinkMetadata.objects.create(bookmark=bookmark, title='Fetched')
+    assert bulk.reject_bookmarks(Bookmark.objects.all()) == [bookmark.id]
+    assert not LinkMetadata.objects.exists()
@@ -0,0 +1,105 @@
+import json, os, subprocess, sys
+import pytest
+from model_bakery import baker
+from bookmarks import metrics
+
+METRICS_URL = '/bookmarks/v1/metrics/'
+
+@pytest.fixture(autouse=True)
+def _fresh_metrics():
+    metrics.reset()
+    yield
+
+def _samples(text):
+    '''
+    {'name{labels}': value} for every sample line of an exposition.
+    '''
+    out = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            key, value = line.rsplit(' ', 1)
+            out[key] = float(value)
+    return out
+
+@pytest.mark.django_db
+def test_metrics_record_latency_queries_and_size_per_route(api_client, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    baker.make('bookmarks.Bookmark', is_approved=True, _quantity=3)
+    body = api_client.get('/bookmarks/v1/bookmarks/').content
+    api_client.get('/bookmarks/v1/bookmarks/')
+
+    r = api_client.get(METRICS_URL)
+    assert r.status_code == 200
+    assert r['Content-Type'].startswith('text/plain; version=0.0.4')
+    samples = _samples(r.content.decode())
+
+    route = 'route="bookmarks-list"'
+    assert samples[f'bookmarks_http_request_duration_seconds_count{{{route},method="GET",status="200"}}'] == 2
+    assert samples[f'bookmarks_http_request_duration_seconds_bucket{{{route},method="GET",status="200",le="+Inf"}}'] == 2
+    assert samples[f'bookmarks_http_response_size_bytes_sum{{{route}}}'] == 2 * len(body)
+    assert samples[f'bookmarks_db_queries_per_request_sum{{{route}}}'] == 4 # page + tags, twice
+    assert samples[f'bookmarks_db_query_duration_seconds_count{{{route}}}'] == 4
+    assert samples[f'bookmarks_phase_duration_seconds_count{{{route},phase="serialize"}}'] == 2
+    assert samples[f'bookmarks_phase_duration_seconds_count{{{route},phase="throttle"}}'] == 2
+    assert samples['bookmarks_throttle_decisions_total{scope="bookmarks_reads",result="allowed"}'] == 2
+
+@pytest.mark.django_db
+def test_metrics_count_throttled_requests(api_client, monkeypatch):
+    from bookmarks.throttling import BookmarksReadsThrottle
+    monkeypatch.setattr(BookmarksReadsThrottle, 'rate', '1/min', raising=False)
+    api_client.get('/bookmarks/v1/bookmarks/')
+    assert api_client.get('/bookmarks/v1/bookmarks/').status_code == 429
+
+    samples = _samples(api_client.get(METRICS_URL).content.decode())
+    assert samples['bookmarks_throttle_decisions_total{scope="bookmarks_reads",result="throttled"}'] == 1
+    assert samples['bookmarks_http_request_duration_seconds_count{route="bookmarks-list",method="GET",status="429"}'] == 1
+
+@pytest.mark.django_db
+def test_metrics_merge_snapshots_from_other_workers(api_client, settings, tmp_path):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'METRICS_DIR': str(tmp_path)}
+    other = {
+        'counters': {'bookmarks_throttle_decisions_total': {'scope="bookmarks_reads",result="allowed"': 5}},
+        'histograms': {},
+    }
+    (tmp_path / f'{os.getppid()}.json').write_text(json.dumps(other)) # a live process
+    # A worker that has exited: its file is dropped
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    (tmp_path / f'{exited.pid}.json').write_text(json.dumps(other))
+    api_client.get('/bookmarks/v1/bookmarks/')
+
+    samples = _samples(api_client.get(METRICS_URL).content.decode())
+    assert samples['bookmarks_throttle_decisions_total{scope="bookmarks_reads",result="allowed"}'] == 6
+    assert (tmp_path / f'{os.getpid()}.json').exists()
+    assert not (tmp_path / f'{exited.pid}.json').exists()
+
+def test_histogram_buckets_are_cumulative():
+    metrics.observe('bookmarks_db_duration_seconds', (('route', 'x'),), 0.003)
+    metrics.observe('bookmarks_db_duration_seconds', (('route', 'x'),), 0.2)
+    samples = _samples(metrics.render(metrics.snapshot()))
+    assert samples['bookmarks_db_duration_seconds_bucket{route="x",le="0.001"}'] == 0
+    assert samples['bookmarks_db_duration_seconds_bucket{route="x",le="0.005"}'] == 1
+    assert samples['bookmarks_db_duration_seconds_bucket{route="x",le="0.25"}'] == 2
+    assert samples['bookmarks_db_duration_seconds_count{route="x"}'] == 2
+    assert samples['bookmarks_db_duration_seconds_sum{route="x"}'] == pytest.approx(0.203)
+
+def test_label_values_are_escaped():
+    metrics.inc('bookmarks_throttle_decisions_total', (('scope', 'a"b\\c'), ('result', 'allowed')))
+    assert 'scope="a\\"b\\\\c"' in metrics.render(metrics.snapshot())
+
+@pytest.mark.django_db
+def test_metrics_endpoint_is_off_when_disabled(api_client, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'METRICS': False}
+    assert api_client.get(METRICS_URL).status_code == 404
+
+@pytest.mark.django_db
+def test_metrics_endpoint_is_for_the_allowed_networks_and_staff(client, settings, admin_user):
+    # The test client comes from 127.0.0.1
+    assert client.get(METRICS_URL).status_code == 200
+    assert client.get(METRICS_URL, REMOTE_ADDR='203.0.113.10').status_code == 403
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'METRICS_ALLOWED_NETWORKS': ['203.0.113.0/24']}
+    assert client.get(METRICS_URL, REMOTE_ADDR='203.0.113.10').status_code == 200
+    assert client.get(METRICS_URL).status_code == 403
+    client.force_login(admin_user)
+    assert client.get(METRICS_URL).status_code == 200
+
@@ -46,4 +46,51 @@ def test_tag_ordering_by_name():
     a = baker.make('bookmarks.Tag', slug='a', name='Aaa')
     z = baker.make('bookmarks.Tag', slug='z', name='Zzz')
     names = [t.name for t in type(a).objects.all()]
-    assert names == ['Aaa', 'Zzz']
\ No newline at end of file
+    assert names == ['Aaa', 'Zzz']
+
+@pytest.mark.parametrize('raw, canonical', [
+    ('HTTPS://Example.COM:443/', 'https://example.com'),
+    ('http://example.com:8080/a#frag', 'http://example.com:8080/a'),
+    ('https://example.com/p?b=2&utm_source=x&a=1&fbclid=abc', 'https://example.com/p?a=1&b=2'),
+    ('https://example.com/p?tag=b&x=1&tag=a', 'https://example.com/p?tag=b&tag=a&x=1'), # repeated names keep their order
+    ('https://example.com/p?next=/a%2Fb&q=a+b', 'https://example.com/p?next=/a%2Fb&q=a+b'), # never re-encoded
+    ('https://Bücher.example/straße', 'https://xn--bcher-kva.example/straße'),
+    ('https://example.com./?UTM_Medium=email', 'https://example.com'),
+])
+def test_canonical_url_folds_common_variants(raw, canonical):
+    from bookmarks.models import canonical_url
+    assert canonical_url(raw) == canonical
+
+@pytest.mark.django_db
+def test_bookmark_save_sets_url_hash_and_clean_rejects_variants():
+    from bookmarks.models import Bookmark, url_hash
+    b = baker.make('bookmarks.Bookmark', url='https://example.com/page?id=1')
+    assert b.url_hash == url_hash('https://EXAMPLE.com/page?utm_campaign=x&id=1')
+
+    twin = Bookmark(title='Twin', url='https://example.com/page?id=1&utm_source=feed', description='')
+    with pytest.raises(ValidationError) as ei:
+        twin.full_clean()
+    assert ei.value.error_dict['url'][0].message == 'URL already submitted'
+    b.full_clean() # a bookmark is no duplicate of itself
+
+@pytest.mark.django_db(transaction=True)
+def test_url_hash_migration_backfills_and_leaves_folded_duplicates_null():
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+    from bookmarks.models import url_hash
+
+    executor = MigrationExecutor(connection)
+    executor.migrate([('bookmarks', '0006_tag_approved_count')])
+    try:
+        Old = executor.loader.project_state([('bookmarks', '0006_tag_approved_count')]).apps.get_model('bookmarks', 'Bookmark')
+        first = Old.objects.create(title='A', url='https://example.com/a?x=1', description='')
+        folded = Old.objects.create(title='B', url='https://example.com/a?x=1&utm_source=y', description='')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([('bookmarks', '0007_bookmark_url_hash')])
+        New = executor.loader.project_state([('bookmarks', '0007_bookmark_url_hash')]).apps.get_model('bookmarks', 'Bookmark')
+        assert New.objects.get(id=first.id).url_hash == url_hash(first.url)
+        assert New.objects.get(id=folded.id).url_hash is None
+    finally:
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
\ No newline at end of file
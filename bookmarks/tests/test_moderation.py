@@ -0,0 +1,115 @@
+import pytest
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.base import BaseStorage
+from django.db import connection
+from django.db.models.sql.constants import GET_ITERATOR_CHUNK_SIZE
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+from bookmarks import search
+from bookmarks.admin import BookmarkAdmin
+from bookmarks.models import Bookmark, DomainStat, Tag
+
+MODERATION_URL = '/bookmarks/v1/moderation/'
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+@pytest.fixture
+def staff():
+    return get_user_model().objects.create_user(username='mod', is_staff=True)
+
+@pytest.fixture
+def moderator(api_client, staff):
+    api_client.force_authenticate(user=staff)
+    return api_client
+
+def _pending(n, start=0, **kwargs):
+    return [
+        baker.make('bookmarks.Bookmark', url=f'https://example.com/{start + i}', title=f'Pending {start + i}', is_approved=False, **kwargs)
+        for i in range(n)
+    ]
+
+def _tag_counts():
+    return dict(Tag.objects.values_list('slug', 'approved_count'))
+
+@pytest.mark.django_db
+def test_approve_promotes_pending_tags(moderator, staff):
+    django = baker.make('bookmarks.Tag', name='Django', slug='django')
+    first = _pending(1, pending_tags=['django', 'htmx'], tags=[django])[0]
+    second = _pending(1, start=1, pending_tags=['htmx', 'orm'])[0]
+
+    r = moderator.post(MODERATION_URL, {'action': 'approve', 'ids': [first.id, second.id, 999999]}, format='json')
+    assert r.status_code == 200
+    assert r.json() == {'approved': 2, 'ids': [first.id, second.id], 'created_tags': ['htmx', 'orm']}
+
+    first.refresh_from_db()
+    assert first.is_approved and first.approved_by == staff and first.approved_at is not None
+    assert first.pending_tags == []
+    assert sorted(first.tags.values_list('slug', flat=True)) == ['django', 'htmx']
+    assert sorted(second.tags.values_list('slug', flat=True)) == ['htmx', 'orm']
+    assert _tag_counts() == {'django': 1, 'htmx': 2, 'orm': 1}
+    assert DomainStat.objects.get(domain='example.com').approved_count == 2
+
+    results = moderator.get(LIST_URL, {'tags': 'htmx'}).json()['results']
+    assert {b['id'] for b in results} == {first.id, second.id}
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('action', ['approve', 'reject'])
+def test_moderation_query_count_is_independent_of_size(moderator, action):
+    def queries(bookmarks):
+        with CaptureQueriesContext(connection) as ctx:
+            r = moderator.post(MODERATION_URL, {'action': action, 'ids': [b.id for b in bookmarks]}, format='json')
+        assert r.status_code == 200
+        return len(ctx.captured_queries)
+
+    small = queries(_pending(3, pending_tags=['a', 'b']))
+    large = queries(_pending(200, start=100, pending_tags=['c', 'd'])) # 400 through rows: one INSERT on SQLite
+    # QuerySet.delete() removes the bookmark rows GET_ITERATOR_CHUNK_SIZE at a time
+    assert large == small + (200 // GET_ITERATOR_CHUNK_SIZE - 1 if action == 'reject' else 0)
+
+@pytest.mark.django_db
+def test_reject_deletes_and_unpublishes(moderator):
+    python = baker.make('bookmarks.Tag', name='Python', slug='python')
+    shown = baker.make('bookmarks.Bookmark', url='https://python.org/', title='Shown', is_approved=True, tags=[python])
+    pending = _pending(2, tags=[python])
+    if search.is_available():
+        assert moderator.get(LIST_URL, {'search': 'shown'}).json()['results']
+
+    r = moderator.post(MODERATION_URL, {'action': 'reject', 'ids': [shown.id, pending[0].id]}, format='json')
+    assert r.json() == {'rejected': 2, 'ids': [shown.id, pending[0].id]}
+    assert list(Bookmark.objects.values_list('id', flat=True)) == [pending[1].id]
+    assert not Bookmark.tags.through.objects.exclude(bookmark_id=pending[1].id).exists()
+    assert _tag_counts() == {'python': 0}
+    assert dict(DomainStat.objects.values_list('domain', 'total_count')) == {'python.org': 0, 'example.com': 1}
+    assert moderator.get(LIST_URL).json()['results'] == []
+    assert moderator.get(LIST_URL, {'search': 'shown'}).json()['results'] == []
+
+@pytest.mark.django_db
+def test_moderation_is_staff_only(api_client):
+    bookmark = _pending(1)[0]
+    payload = {'action': 'approve', 'ids': [bookmark.id]}
+    assert api_client.post(MODERATION_URL, payload, format='json').status_code == 403
+
+    api_client.force_authenticate(user=get_user_model().objects.create_user(username='someone'))
+    assert api_client.post(MODERATION_URL, payload, format='json').status_code == 403
+    assert not Bookmark.objects.get(pk=bookmark.pk).is_approved
+
+@pytest.mark.django_db
+def test_moderation_validates_payload(moderator, settings):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'MODERATION_MAX_ITEMS': 2}
+    assert moderator.post(MODERATION_URL, {'action': 'publish', 'ids': [1]}, format='json').status_code == 400
+    assert moderator.post(MODERATION_URL, {'action': 'approve', 'ids': []}, format='json').status_code == 400
+    r = moderator.post(MODERATION_URL, {'action': 'approve', 'ids': [1, 2, 3]}, format='json')
+    assert r.status_code == 400
+    assert r.json() == {'ids': ['At most 2 ids per request']}
+
+@pytest.mark.django_db
+def test_admin_reject_selected(staff):
+    bookmarks = _pending(3)
+    request = RequestFactory().post('/admin/')
+    request.user = staff
+    request._messages = BaseStorage(request)
+
+    BookmarkAdmin(Bookmark, AdminSite()).reject_selected(request, Bookmark.objects.filter(id__in=[b.id for b in bookmarks[:2]]))
+    assert list(Bookmark.objects.values_list('id', flat=True)) == [bookmarks[2].id]
+    assert [m.message for m in request._messages._queued_messages] == ['Rejected 2 bookmark(s).']
@@ -0,0 +1,109 @@
+import pytest
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.base import BaseStorage
+from django.core.management import call_command
+from django.test import RequestFactory
+from model_bakery import baker
+from bookmarks import bulk, near_duplicates
+from bookmarks.admin import BookmarkAdmin
+from bookmarks.models import Bookmark, bookmark_lsh_bands, text_tokens
+
+SUBMIT_URL = '/bookmarks/v1/bookmarks/submit/'
+BATCH_URL = '/bookmarks/v1/bookmarks/submit/batch/'
+
+TITLE = 'How Python dictionaries work under the hood'
+DESCRIPTION = 'A deep dive into the hash table behind dict: open addressing, probing, resizing and the compact layout.'
+
+def _submit(api_client, url, title=TITLE, description=DESCRIPTION):
+    r = api_client.post(SUBMIT_URL, {'title': title, 'url': url, 'description': description, 'tags': ['python']}, format='json')
+    assert r.status_code == 201, r.json()
+    return Bookmark.objects.get(id=r.json()['id'])
+
+def test_tokens_and_bands():
+    assert text_tokens('How dicts work', '', 'https://mirror.example/amp/python-dicts.html') == {'dicts', 'work', 'python'}
+    original = bookmark_lsh_bands(TITLE, DESCRIPTION, 'https://blog.example/2024/python-dict-internals')
+    mirror = bookmark_lsh_bands(TITLE, DESCRIPTION, 'https://mirror.example/amp/2024/python-dict-internals/')
+    other = bookmark_lsh_bands('Rust async runtimes compared', 'Tokio and smol on throughput', 'https://rust.example/async')
+    assert len(original) == 32 and original == mirror
+    assert not {original[i:i + 4] for i in range(0, 32, 4)} & {other[i:i + 4] for i in range(0, 32, 4)}
+    assert bookmark_lsh_bands('', '', 'https://example.com/') is None
+
+@pytest.mark.django_db
+def test_submissions_are_flagged_into_groups(api_client):
+    original = baker.make(
+        'bookmarks.Bookmark', title=TITLE, description=DESCRIPTION, url='https://blog.example/2024/python-dict-internals',
+        is_approved=True,
+    )
+    mirror = _submit(api_client, 'https://mirror.example/amp/2024/python-dict-internals')
+    assert mirror.near_duplicate_of_id == original.id
+
+    # A re-titled copy of the mirror joins the same group
+    retitled = _submit(api_client, 'https://copy.example/2024/python-dict-internals', title='Python dict internals explained')
+    assert retitled.near_duplicate_of_id == original.id
+
+    unrelated = _submit(api_client, 'https://rust.example/async', 'Rust async runtimes compared', 'Tokio and smol on throughput')
+    assert unrelated.near_duplicate_of_id is None
+
+@pytest.mark.django_db
+def test_batch_flags_copies_within_the_batch(api_client):
+    item = {'title': TITLE, 'description': DESCRIPTION, 'tags': ['python']}
+    payload = [
+        {**item, 'url': 'https://blog.example/python-dict-internals'},
+        {**item, 'url': 'https://mirror.example/amp/python-dict-internals'},
+        {'title': 'Something else', 'description': 'Entirely', 'tags': ['python'], 'url': 'https://other.example/'},
+    ]
+    ids = [x['id'] for x in api_client.post(BATCH_URL, data=payload, format='json').json()['results']]
+    assert list(Bookmark.objects.filter(id__in=ids).order_by('id').values_list('near_duplicate_of', flat=True)) == [None, ids[0], None]
+
+@pytest.mark.django_db
+def test_index_is_incremental_and_confirms_candidates(monkeypatch, api_client):
+    monkeypatch.setattr(near_duplicates, 'MERGE_AFTER', 2)
+    bookmarks = [
+        baker.make('bookmarks.Bookmark', title=TITLE, description=DESCRIPTION, url=f'https://site{i}.example/dicts')
+        for i in range(3)
+    ]
+    index = near_duplicates.get_index()
+    assert index.sync() and len(index) == 3
+    assert index.candidates(bookmarks[0].lsh_bands) == [b.id for b in bookmarks]
+    assert index.candidates(bookmarks[0].lsh_bands, before=bookmarks[2].id) == [bookmarks[0].id, bookmarks[1].id]
+
+    # Rows added since are found too, before and after they are merged into the sorted tables
+    for i in range(3):
+        bookmarks.append(baker.make('bookmarks.Bookmark', title=TITLE, description=DESCRIPTION, url=f'https://late{i}.example/dicts'))
+        assert index.sync() and len(index) == 4 + i
+        assert index.recent_count == (0 if i == 1 else 1)
+        assert index.candidates(bookmarks[0].lsh_bands) == [b.id for b in bookmarks]
+
+    # Deleted rows are still in the index, but never flag anything
+    Bookmark.objects.all()._raw_delete(Bookmark.objects.db)
+    assert _submit(api_client, 'https://new.example/dicts').near_duplicate_of_id is None
+
+@pytest.mark.django_db
+def test_command_flags_what_submission_missed(capsys):
+    original = baker.make('bookmarks.Bookmark', title=TITLE, description=DESCRIPTION, url='https://blog.example/dicts', is_approved=True)
+    copy = baker.make('bookmarks.Bookmark', title=TITLE, description=DESCRIPTION, url='https://mirror.example/dicts')
+    baker.make('bookmarks.Bookmark', title='Unrelated', description='Nothing alike', url='https://other.example/')
+    call_command('bookmarks_near_duplicates', '--batch-size', '1')
+    assert 'Flagged 1 of 2 bookmark(s) as near duplicates.' in capsys.readouterr().out
+    assert Bookmark.objects.get(pk=copy.pk).near_duplicate_of_id == original.id
+
+@pytest.mark.django_db
+def test_admin_groups_and_ungroups():
+    original = baker.make('bookmarks.Bookmark', is_approved=True)
+    copies = baker.make('bookmarks.Bookmark', near_duplicate_of=original, _quantity=2)
+    baker.make('bookmarks.Bookmark')
+    model_admin = BookmarkAdmin(Bookmark, AdminSite())
+    request = RequestFactory().get('/admin/bookmarks/bookmark/', {'near_duplicates': str(original.id)})
+    request.user = get_user_model().objects.create_superuser(username='mod', password='x')
+    changelist = model_admin.get_changelist_instance(request)
+    assert sorted(b.id for b in changelist.get_queryset(request)) == [original.id] + [c.id for c in copies]
+
+    request._messages = BaseStorage(request)
+    model_admin.not_near_duplicates(request, Bookmark.objects.filter(id=copies[0].id))
+    assert [m.message for m in request._messages._queued_messages] == ['Removed 1 bookmark(s) from their near-duplicate group.']
+    assert list(Bookmark.objects.filter(near_duplicate_of=original).values_list('id', flat=True)) == [copies[1].id]
+
+    # Rejecting the group's oldest bookmark leaves its copies in the queue
+    bulk.reject_bookmarks(Bookmark.objects.filter(id=original.id))
+    assert Bookmark.objects.get(pk=copies[1].pk).near_duplicate_of_id is None
@@ -0,0 +1,121 @@
+import base64, json
+import pytest
+from django.utils import timezone
+from datetime import timedelta
+from model_bakery import baker
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def _make_bookmarks(n, **kwargs):
+    now = timezone.now()
+    return [
+        baker.make('bookmarks.Bookmark', title=f'B{i}', is_approved=True, created_at=now - timedelta(minutes=i), **kwargs)
+        for i in range(n)
+    ]
+
+def _walk(api_client, params):
+    '''
+    Follow `next` links until exhausted, returning every page.
+    '''
+    pages = []
+    r = api_client.get(LIST_URL, params)
+    while True:
+        assert r.status_code == 200, r.content
+        pages.append(r.json())
+        nxt = pages[-1]['next']
+        if not nxt:
+            return pages
+        r = api_client.get(nxt)
+
+@pytest.mark.django_db
+def test_cursor_walks_all_rows_newest_first(api_client):
+    '''
+    Following `next` visits every approved bookmark once, newest first, without a count.
+    '''
+    _make_bookmarks(25)
+    pages = _walk(api_client, {})
+    assert [len(p['results']) for p in pages] == [10, 10, 5]
+    assert 'count' not in pages[0]
+    titles = [b['title'] for p in pages for b in p['results']]
+    assert titles == [f'B{i}' for i in range(25)]
+
+@pytest.mark.django_db
+def test_cursor_previous_link_returns_prior_page(api_client):
+    _make_bookmarks(25)
+    first = api_client.get(LIST_URL).json()
+    assert first['previous'] is None
+    second = api_client.get(first['next']).json()
+    back = api_client.get(second['previous']).json()
+    assert [b['id'] for b in back['results']] == [b['id'] for b in first['results']]
+    assert back['previous'] is None
+    assert back['next'] is not None
+
+@pytest.mark.django_db
+def test_cursor_ties_on_created_at_are_broken_by_id(api_client):
+    '''
+    Rows sharing a created_at are neither skipped nor repeated across pages.
+    '''
+    same = timezone.now()
+    made = [baker.make('bookmarks.Bookmark', is_approved=True, created_at=same) for _ in range(15)]
+    pages = _walk(api_client, {})
+    ids = [b['id'] for p in pages for b in p['results']]
+    assert ids == sorted((b.id for b in made), reverse=True)
+
+@pytest.mark.django_db
+def test_cursor_respects_ordering_and_tag(api_client):
+    t = baker.make('bookmarks.Tag', slug='django')
+    _make_bookmarks(12, tags=[t])
+    _make_bookmarks(3)
+    pages = _walk(api_client, {'tag': 'django', 'ordering': 'created_at', 'page_size': 5})
+    titles = [b['title'] for p in pages for b in p['results']]
+    assert titles == [f'B{i}' for i in reversed(range(12))]
+
+@pytest.mark.django_db
+def test_cursor_count_is_opt_in(api_client):
+    _make_bookmarks(3)
+    r = api_client.get(LIST_URL, {'count': 'true'})
+    assert r.json()['count'] == 3
+
+@pytest.mark.django_db
+def test_cursor_query_count_is_constant_for_deep_pages(api_client, django_assert_num_queries, settings):
+    '''
+    A deep page costs the same queries as the first: no COUNT, no OFFSET.
+    '''
+    settings.BOOKMARKS = {'RESPONSE_CACHE': False}
+    _make_bookmarks(30)
+    pages = _walk(api_client, {})
+    with django_assert_num_queries(2): # page + tag prefetch
+        api_client.get(pages[-2]['next'])
+
+@pytest.mark.django_db
+def test_invalid_cursor_returns_404(api_client):
+    r = api_client.get(LIST_URL, {'cursor': 'not-a-cursor'})
+    assert r.status_code == 404
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('fast_read', [True, False])
+@pytest.mark.parametrize('params, position', [
+    ({}, ['not-a-date', 1]),
+    ({}, ['2025-01-01T00:00:00Z', 'x']),
+    ({}, [None, 1]),
+    ({}, [5, 1]),
+    ({}, ['2025-01-01T00:00:00Z', 1, 2]),
+    ({'tags': 'python'}, ['not-a-date', 1]),
+    ({'tags': 'python'}, ['2025-01-01T00:00:00Z', [1]]),
+    ({'search': 'b1'}, ['high', 1]), # (search_rank, id)
+])
+def test_tampered_cursor_values_return_404(api_client, settings, fast_read, params, position):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False, 'FAST_READ': fast_read}
+    _make_bookmarks(3, tags=[baker.make('bookmarks.Tag', slug='python')])
+    raw = json.dumps({'p': position}).encode('ascii')
+    r = api_client.get(LIST_URL, {**params, 'cursor': base64.urlsafe_b64encode(raw).decode('ascii')})
+    assert r.status_code == 404, r.content
+    assert r.json() == {'detail': 'Invalid cursor'}
+
+@pytest.mark.django_db
+def test_legacy_page_param_still_works(api_client):
+    _make_bookmarks(15)
+    r = api_client.get(LIST_URL, {'page': 2})
+    data = r.json()
+    assert data['count'] == 15
+    assert len(data['results']) == 5
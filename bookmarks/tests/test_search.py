@@ -0,0 +1,82 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from model_bakery import baker
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def _titles(r):
+    assert r.status_code == 200, r.content
+    return [b['title'] for b in r.json()['results']]
+
+@pytest.fixture(autouse=True)
+def _require_index():
+    from bookmarks import search
+    if not search.is_available():
+        pytest.skip('no full-text index on this database')
+
+@pytest.mark.django_db
+def test_search_matches_word_prefixes(api_client):
+    '''
+    Every term is matched as a prefix: "djan fram" finds "Django ... framework".
+    '''
+    baker.make('bookmarks.Bookmark', title='Learn Django', description='Web framework', is_approved=True)
+    baker.make('bookmarks.Bookmark', title='Flask', description='Micro framework', is_approved=True)
+    assert _titles(api_client.get(LIST_URL, {'search': 'djan fram'})) == ['Learn Django']
+    assert sorted(_titles(api_client.get(LIST_URL, {'search': 'frame'}))) == ['Flask', 'Learn Django']
+
+@pytest.mark.django_db
+def test_search_ranks_title_hits_first(api_client):
+    baker.make('bookmarks.Bookmark', title='Something else', description='mentions python once', is_approved=True)
+    baker.make('bookmarks.Bookmark', title='Python tutorial', description='python python', is_approved=True)
+    assert _titles(api_client.get(LIST_URL, {'search': 'python'})) == ['Python tutorial', 'Something else']
+
+@pytest.mark.django_db
+def test_search_ignores_query_syntax(api_client):
+    baker.make('bookmarks.Bookmark', title='C++ reference', description='', is_approved=True)
+    assert _titles(api_client.get(LIST_URL, {'search': 'c++ "ref*('})) == ['C++ reference']
+
+@pytest.mark.django_db
+def test_search_index_follows_edits_and_deletes(api_client):
+    b = baker.make('bookmarks.Bookmark', title='Old title', description='', is_approved=True)
+    b.title = 'New title'
+    b.save()
+    assert _titles(api_client.get(LIST_URL, {'search': 'old'})) == []
+    assert _titles(api_client.get(LIST_URL, {'search': 'new'})) == ['New title']
+    b.delete()
+    assert _titles(api_client.get(LIST_URL, {'search': 'new'})) == []
+
+@pytest.mark.django_db
+def test_search_indexes_bulk_admin_approval(api_client, rf, admin_user):
+    from django.contrib.admin.sites import AdminSite
+    from bookmarks.admin import BookmarkAdmin
+    from bookmarks.models import Bookmark
+
+    b = baker.make('bookmarks.Bookmark', title='Pending gem', description='', is_approved=False)
+    assert _titles(api_client.get(LIST_URL, {'search': 'gem'})) == []
+
+    request = rf.post('/')
+    request.user = admin_user
+    ma = BookmarkAdmin(Bookmark, AdminSite())
+    ma.message_user = lambda *a, **k: None
+    ma.approve_selected(request, Bookmark.objects.filter(id=b.id))
+    assert _titles(api_client.get(LIST_URL, {'search': 'gem'})) == ['Pending gem']
+
+@pytest.mark.django_db
+def test_rebuild_command_repopulates_index(api_client):
+    from bookmarks.search import FTS_TABLE
+    baker.make('bookmarks.Bookmark', title='Rebuilt', description='', is_approved=True)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    assert _titles(api_client.get(LIST_URL, {'search': 'rebuilt'})) == []
+    call_command('bookmarks_rebuild_search')
+    assert _titles(api_client.get(LIST_URL, {'search': 'rebuilt'})) == ['Rebuilt']
+
+@pytest.mark.django_db
+def test_search_results_page_by_relevance_cursor(api_client):
+    for i in range(7):
+        baker.make('bookmarks.Bookmark', title=f'Topic {i}', description='topic ' * i, is_approved=True)
+    first = api_client.get(LIST_URL, {'search': 'topic', 'page_size': 4}).json()
+    second = api_client.get(first['next']).json()
+    ids = [b['id'] for b in first['results'] + second['results']]
+    assert len(ids) == len(set(ids)) == 7
@@ -0,0 +1,177 @@
+import threading, time
+import pytest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.utils import timezone
+from model_bakery import baker
+from bookmarks import tag_index
+from bookmarks.models import Bookmark
+from bookmarks.tag_index import TagIndex
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+@pytest.fixture
+def corpus():
+    '''
+    30 approved bookmarks, newest first B0..B29, tagged by divisibility; plus hidden ones.
+    '''
+    tags = {slug: baker.make('bookmarks.Tag', name=slug.title(), slug=slug) for slug in ('two', 'three', 'five')}
+    now = timezone.now()
+    for i in range(30):
+        picked = [t for slug, t in tags.items() if i % {'two': 2, 'three': 3, 'five': 5}[slug] == 0]
+        # Pairs of rows share a created_at so the id tie-breaker matters
+        baker.make('bookmarks.Bookmark', title=f'B{i}', is_approved=True, created_at=now - timedelta(minutes=i // 2), tags=picked)
+    baker.make('bookmarks.Bookmark', title='Hidden', is_approved=False, tags=list(tags.values()))
+    return tags
+
+def _walk(api_client, params):
+    titles, r = [], api_client.get(LIST_URL, params)
+    while True:
+        assert r.status_code == 200, r.content
+        data = r.json()
+        titles += [b['title'] for b in data['results']]
+        if not data['next']:
+            return titles
+        r = api_client.get(data['next'])
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [
+    {'tags': 'two,three'},
+    {'tags': 'two,three', 'match': 'any'},
+    {'tags': 'five,three,two', 'match': 'any', 'ordering': 'created_at'},
+    {'tags': 'three', 'page_size': 3},
+    {'tags': 'two,nope', 'match': 'any'},
+])
+def test_index_and_sql_paths_agree(api_client, settings, corpus, params):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    from_index = _walk(api_client, params)
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'TAG_INDEX': False}
+    assert from_index == _walk(api_client, params)
+    assert from_index # the fixture has matches for all of these
+
+@pytest.mark.django_db
+def test_match_all_and_any(api_client, corpus):
+    both = _walk(api_client, {'tags': 'two,three', 'page_size': 100})
+    assert both == [f'B{i}' for i in range(0, 30, 6)]
+    either = _walk(api_client, {'tags': 'two,three', 'match': 'any', 'page_size': 100})
+    matching = [i for i in range(30) if i % 2 == 0 or i % 3 == 0]
+    assert either == [f'B{i}' for i in sorted(matching, key=lambda i: (i // 2, -i))] # ties: higher id first
+    assert _walk(api_client, {'tags': 'two,nope'}) == []
+
+@pytest.mark.django_db
+def test_previous_link_from_index_page(api_client, settings, corpus):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    first = api_client.get(LIST_URL, {'tags': 'two', 'page_size': 4}).json()
+    second = api_client.get(first['next']).json()
+    back = api_client.get(second['previous']).json()
+    assert [b['title'] for b in back['results']] == [b['title'] for b in first['results']]
+
+@pytest.mark.django_db
+def test_index_page_costs_two_queries(api_client, settings, corpus, django_assert_num_queries):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    api_client.get(LIST_URL, {'tags': 'two,three'}) # builds the index
+    with django_assert_num_queries(2): # page rows by id + their tags
+        r = api_client.get(LIST_URL, {'tags': 'two,five', 'match': 'any'})
+    assert len(r.json()['results']) == 10
+
+@pytest.mark.django_db
+def test_index_follows_changes_without_rebuilding(api_client, settings, corpus, monkeypatch, django_capture_on_commit_callbacks):
+    from bookmarks.signals import bookmarks_changed
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    assert _walk(api_client, {'tags': 'five,three', 'page_size': 100}) == ['B0', 'B15']
+
+    rebuilds = []
+    monkeypatch.setattr(TagIndex, 'rebuild', lambda self: rebuilds.append(1))
+    b1 = Bookmark.objects.get(title='B1')
+    pending = baker.make('bookmarks.Bookmark', title='New', is_approved=False, created_at=timezone.now() + timedelta(days=1))
+    with django_capture_on_commit_callbacks(execute=True):
+        b1.tags.add(corpus['five'], corpus['three'])
+        Bookmark.objects.get(title='B0').tags.remove(corpus['five'])
+        corpus['three'].bookmarks.remove(Bookmark.objects.get(title='B15'))
+        pending.tags.add(corpus['five'], corpus['three'])
+    assert _walk(api_client, {'tags': 'five,three', 'page_size': 100}) == ['B1']
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Bookmark.objects.filter(id=pending.id).update(is_approved=True) # as approve_selected does
+        bookmarks_changed.send(sender=Bookmark, ids=[pending.id], action='approved')
+        b1.delete()
+    assert _walk(api_client, {'tags': 'five,three', 'page_size': 100}) == ['New']
+    assert not rebuilds
+
+@pytest.mark.django_db
+def test_gap_in_change_log_rebuilds(api_client, settings, corpus):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    _walk(api_client, {'tags': 'five'})
+    index = tag_index.get_index()
+    # Another worker changed things and the log entries are gone
+    Bookmark.objects.filter(title='B5').update(is_approved=False)
+    tag_index.response_cache.get_cache().set(tag_index.VERSION_KEY, index.version + 3)
+    assert 'B5' not in _walk(api_client, {'tags': 'five'})
+
+@pytest.mark.django_db
+def test_changes_the_log_missed_are_picked_up_by_the_periodic_rebuild(api_client, settings, corpus, monkeypatch):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    assert 'B5' in _walk(api_client, {'tags': 'five'})
+    # Another process's change, logged in a cache this worker does not see
+    monkeypatch.setattr(tag_index, '_append', lambda entry: None)
+    Bookmark.objects.get(title='B5').tags.clear()
+    assert 'B5' in _walk(api_client, {'tags': 'five'})
+
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'TAG_INDEX_REBUILD_AFTER': 0}
+    assert 'B5' not in _walk(api_client, {'tags': 'five'})
+
+@pytest.mark.django_db
+def test_index_is_off_by_default_over_a_per_process_cache(api_client, settings, corpus, django_assert_num_queries):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False, 'TAG_INDEX': None}
+    assert not tag_index.is_enabled()
+    _walk(api_client, {'tags': 'five'})
+    assert not tag_index.get_index().ready # never built; ?tags= ran in SQL
+
+@pytest.mark.django_db
+def test_facets_with_tags_count_every_match(api_client, corpus):
+    data = api_client.get(LIST_URL, {'tags': 'two', 'facets': 'tags', 'page_size': 2}).json()
+    assert len(data['results']) == 2
+    assert data['facets']['tags'][0] == {'slug': 'two', 'name': 'Two', 'count': 15}
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params', [{'tags': 'a', 'match': 'some'}, {'tags': ','.join(f't{i}' for i in range(11))}])
+def test_bad_tags_params(api_client, params):
+    assert api_client.get(LIST_URL, params).status_code == 400
+
+def test_concurrent_requests_start_one_rebuild(monkeypatch):
+    started, release = [], threading.Event()
+    monkeypatch.setattr(TagIndex, 'rebuild', lambda self: started.append(1) or release.wait(5))
+    index = TagIndex()
+    index.build_in_background = True
+    barrier = threading.Barrier(8)
+
+    def request():
+        barrier.wait()
+        index._rebuild_later()
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+    deadline = time.monotonic() + 5
+    while index.building and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert started == [1] and not index.building
+
+def test_page_seeks_past_cursor_in_both_directions():
+    base = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    rows = sorted(
+        [(1, i, base + timedelta(seconds=i // 2)) for i in range(1, 21)]
+        + [(2, i, base + timedelta(seconds=i // 2)) for i in range(1, 21, 3)],
+        key=lambda r: (r[2], r[1]),
+    )
+    index = TagIndex()
+    index.load(rows, {'a': 1, 'b': 2}, max_id=20)
+    key = lambda i: (tag_index.stamp(base + timedelta(seconds=i // 2)), i)
+
+    assert index.page(['a', 'b'], 'all', limit=3) == [19, 16, 13]
+    assert index.page(['a', 'b'], 'all', after=key(13), limit=10) == [10, 7, 4, 1]
+    assert index.page(['b'], 'any', descending=False, after=key(7), limit=2) == [10, 13]
+    assert index.page(['a', 'b'], 'any', after=key(3), limit=5) == [2, 1]
+    assert index.page(['a', 'zzz'], 'all') == []
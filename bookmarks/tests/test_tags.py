@@ -0,0 +1,170 @@
+import json
+import pytest
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.base import BaseStorage
+from django.core.management import call_command
+from django.test import RequestFactory
+from model_bakery import baker
+from bookmarks.models import Bookmark, Tag
+
+TAGS_URL = '/bookmarks/v1/tags/'
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def _counts():
+    return dict(Tag.objects.values_list('slug', 'approved_count'))
+
+@pytest.fixture
+def tags():
+    return [baker.make('bookmarks.Tag', name=n.title(), slug=n) for n in ('django', 'python', 'rust')]
+
+@pytest.mark.django_db
+def test_counts_follow_tag_changes_on_approved_bookmarks(tags):
+    django, python, rust = tags
+    b = baker.make('bookmarks.Bookmark', is_approved=True, tags=[django, python])
+    hidden = baker.make('bookmarks.Bookmark', is_approved=False, tags=[django])
+    assert _counts() == {'django': 1, 'python': 1, 'rust': 0}
+
+    b.tags.add(python, rust) # python already attached: not counted twice
+    b.tags.remove(django, rust)
+    assert _counts() == {'django': 0, 'python': 1, 'rust': 0}
+    b.tags.clear()
+    hidden.tags.add(rust)
+    assert _counts() == {'django': 0, 'python': 0, 'rust': 0}
+
+@pytest.mark.django_db
+def test_counts_follow_reverse_tag_changes(tags):
+    django = tags[0]
+    shown = baker.make('bookmarks.Bookmark', is_approved=True, _quantity=2)
+    hidden = baker.make('bookmarks.Bookmark', is_approved=False)
+    django.bookmarks.add(*shown, hidden)
+    assert _counts()['django'] == 2
+    django.bookmarks.remove(shown[0], hidden)
+    assert _counts()['django'] == 1
+    django.bookmarks.clear()
+    assert _counts()['django'] == 0
+
+@pytest.mark.django_db
+def test_counts_follow_approval_and_delete(tags):
+    django, python, _ = tags
+    b = baker.make('bookmarks.Bookmark', is_approved=False, tags=[django, python])
+    b = Bookmark.objects.get(pk=b.pk)
+    b.is_approved = True
+    b.save()
+    assert _counts() == {'django': 1, 'python': 1, 'rust': 0}
+    b.title = 'Edited' # saving again without a flip changes nothing
+    b.save()
+    assert _counts()['django'] == 1
+
+    b.is_approved = False
+    b.save()
+    assert _counts()['django'] == 0
+    b.is_approved = True
+    b.save()
+    b.delete()
+    assert _counts() == {'django': 0, 'python': 0, 'rust': 0}
+
+@pytest.mark.django_db
+def test_admin_approve_selected_updates_counts_in_fixed_queries(tags, django_assert_max_num_queries):
+    from bookmarks.admin import BookmarkAdmin
+    django, python, _ = tags
+    pending = [baker.make('bookmarks.Bookmark', is_approved=False, tags=[django, python]) for _ in range(5)]
+    pending[0].tags.remove(python)
+    request = RequestFactory().post('/admin/')
+    request.user = get_user_model().objects.create_user(username='mod', is_staff=True)
+    request._messages = BaseStorage(request)
+
+    with django_assert_max_num_queries(14): # includes pending-tag promotion and the DomainStat rollup
+        BookmarkAdmin(Bookmark, AdminSite()).approve_selected(request, Bookmark.objects.filter(id__in=[b.id for b in pending]))
+    assert _counts() == {'django': 5, 'python': 4, 'rust': 0}
+
+@pytest.mark.django_db
+def test_tag_save_does_not_overwrite_count(tags):
+    django = Tag.objects.get(slug='django')
+    baker.make('bookmarks.Bookmark', is_approved=True, tags=[tags[0]])
+    django.name = 'Django!'
+    django.save() # loaded before the bookmark was added
+    assert Tag.objects.get(slug='django').approved_count == 1
+
+@pytest.mark.django_db
+def test_counts_that_drifted_low_stop_at_zero(tags):
+    django, python, _ = tags
+    b = baker.make('bookmarks.Bookmark', is_approved=True, tags=[django, python])
+    Tag.objects.filter(slug='django').update(approved_count=0)
+
+    b.is_approved = False
+    b.save()
+    assert _counts() == {'django': 0, 'python': 0, 'rust': 0}
+
+@pytest.mark.django_db
+def test_reconcile_repairs_drift(tags, capsys):
+    baker.make('bookmarks.Bookmark', is_approved=True, tags=tags[:2])
+    Tag.objects.filter(slug='django').update(approved_count=7)
+
+    call_command('bookmarks_reconcile_tag_counts', '--dry-run')
+    assert 'django: 7 -> 1' in capsys.readouterr().out
+    assert _counts()['django'] == 7
+
+    call_command('bookmarks_reconcile_tag_counts')
+    assert _counts() == {'django': 1, 'python': 1, 'rust': 0}
+    capsys.readouterr()
+    call_command('bookmarks_reconcile_tag_counts')
+    assert '0 tag count(s) repaired' in capsys.readouterr().out
+
+@pytest.mark.django_db
+def test_import_counts_tags(tags, tmp_path):
+    path = tmp_path / 'in.ndjson'
+    path.write_text('\n'.join(json.dumps({
+        'title': f'T{i}', 'url': f'https://example.com/{i}', 'tags': ['django', 'rust'],
+        'is_approved': i % 2 == 0, 'created_at': '2025-01-01T00:00:00Z',
+    }) for i in range(4)))
+    call_command('bookmarks_import', str(path))
+    assert _counts() == {'django': 2, 'python': 0, 'rust': 2}
+
+@pytest.mark.django_db
+def test_tags_endpoint_orders_by_count_then_name(api_client, tags):
+    django, python, rust = tags
+    baker.make('bookmarks.Bookmark', is_approved=True, tags=[django, python], _quantity=2)
+    baker.make('bookmarks.Bookmark', is_approved=True, tags=[python])
+    baker.make('bookmarks.Bookmark', is_approved=False, tags=[rust])
+
+    data = api_client.get(TAGS_URL).json()
+    assert data['results'] == [
+        {'name': 'Python', 'slug': 'python', 'count': 3},
+        {'name': 'Django', 'slug': 'django', 'count': 2},
+    ]
+    by_name = api_client.get(TAGS_URL, {'ordering': 'name'}).json()['results']
+    assert [t['slug'] for t in by_name] == ['django', 'python']
+
+@pytest.mark.django_db
+def test_tags_endpoint_pages_through_ties(api_client):
+    for i in range(15):
+        t = baker.make('bookmarks.Tag', name=f'T{i:02}', slug=f't{i}')
+        baker.make('bookmarks.Bookmark', is_approved=True, tags=[t])
+    first = api_client.get(TAGS_URL).json()
+    second = api_client.get(first['next']).json()
+    names = [t['name'] for t in first['results'] + second['results']]
+    assert names == [f'T{i:02}' for i in range(15)]
+
+@pytest.mark.django_db
+def test_list_facets(api_client, tags, settings, django_assert_num_queries):
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'RESPONSE_CACHE': False}
+    django, python, rust = tags
+    baker.make('bookmarks.Bookmark', is_approved=True, tags=[django, python], _quantity=3)
+    baker.make('bookmarks.Bookmark', is_approved=True, tags=[rust, python])
+    baker.make('bookmarks.Bookmark', is_approved=False, tags=[rust])
+
+    with django_assert_num_queries(3): # page + tags + facets
+        data = api_client.get(LIST_URL, {'facets': 'tags'}).json()
+    assert data['facets']['tags'] == [
+        {'slug': 'python', 'name': 'Python', 'count': 4},
+        {'slug': 'django', 'name': 'Django', 'count': 3},
+        {'slug': 'rust', 'name': 'Rust', 'count': 1},
+    ]
+
+    filtered = api_client.get(LIST_URL, {'facets': 'tags', 'tag': 'rust'}).json()
+    assert filtered['facets']['tags'] == [
+        {'slug': 'python', 'name': 'Python', 'count': 1},
+        {'slug': 'rust', 'name': 'Rust', 'count': 1},
+    ]
+    assert 'facets' not in api_client.get(LIST_URL).json()
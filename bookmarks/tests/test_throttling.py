@@ -0,0 +1,111 @@
+import pytest
+from model_bakery import baker
+from bookmarks.throttling import BookmarksReadsThrottle, retry_after, sliding_window
+
+LIST_URL = '/bookmarks/v1/bookmarks/'
+
+def test_sliding_window_counts_within_window():
+    state = None
+    for _ in range(3):
+        state, allowed, used = sliding_window(state, 10.0, 60, 3)
+        assert allowed
+    state, allowed, used = sliding_window(state, 11.0, 60, 3)
+    assert not allowed
+    assert state == (0, 3, 0) # fixed-size state, denied requests are not counted
+
+def test_sliding_window_weights_previous_window():
+    '''
+    Halfway into the next window, half of the previous window's count still applies.
+    '''
+    state, _, _ = sliding_window(None, 59.0, 60, 10, cost=10)
+    state, allowed, used = sliding_window(state, 90.0, 60, 10)
+    assert allowed and used == pytest.approx(6.0)
+    state, allowed, _ = sliding_window(state, 90.0, 60, 10, cost=5)
+    assert not allowed
+
+def test_retry_after_is_when_request_fits_again():
+    state, _, _ = sliding_window(None, 0.0, 60, 2, cost=2)
+    wait = retry_after(state, 30.0, 60, 2)
+    assert wait == pytest.approx(60.0) # 2 * (1 - (t - 60) / 60) <= 1  ->  t >= 90
+    _, allowed, _ = sliding_window(state, 30.0 + wait, 60, 2)
+    assert allowed
+
+@pytest.mark.django_db
+def test_rate_limit_headers_track_remaining(api_client, monkeypatch, settings):
+    settings.BOOKMARKS = {'RESPONSE_CACHE': False}
+    monkeypatch.setattr(BookmarksReadsThrottle, 'rate', '3/min', raising=False)
+    baker.make('bookmarks.Bookmark', is_approved=True)
+
+    remaining = []
+    for _ in range(3):
+        r = api_client.get(LIST_URL)
+        assert r.status_code == 200
+        assert r['X-RateLimit-Limit'] == '3'
+        remaining.append(int(r['X-RateLimit-Remaining']))
+    assert remaining == [2, 1, 0]
+
+    r = api_client.get(LIST_URL)
+    assert r.status_code == 429
+    assert int(r['Retry-After']) >= 1
+    assert r['X-RateLimit-Remaining'] == '0'
+
+@pytest.mark.django_db
+def test_rate_limit_headers_cost_one_cache_read_per_throttle(api_client, monkeypatch, settings):
+    '''
+    The headers reuse the decision's state instead of re-reading the cache.
+    '''
+    settings.BOOKMARKS = {'THROTTLE_STORE': None}
+    from django.core.cache.backends.locmem import LocMemCache
+    reads = []
+    real_get = LocMemCache.get
+    monkeypatch.setattr(LocMemCache, 'get', lambda self, key, *a, **k: (reads.append(key), real_get(self, key, *a, **k))[1])
+
+    api_client.get('/bookmarks/v1/health/') # health has no throttles
+    reads.clear()
+    api_client.post('/bookmarks/v1/bookmarks/submit/', data={}, format='json')
+    assert len([k for k in reads if k.startswith('throttle_')]) == 2 # day + burst
+
+def test_sqlite_store_is_shared_between_processes(tmp_path):
+    '''
+    Workers hitting the same key through separate connections never exceed the limit together.
+    '''
+    import multiprocessing
+    from bookmarks.throttle_store import SQLiteThrottleStore
+
+    path = str(tmp_path / 'shared.sqlite3')
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(4) as pool:
+        allowed = sum(pool.starmap(_hammer, [(path, 25)] * 4))
+    assert allowed == 50
+    assert len(SQLiteThrottleStore(path)) == 1
+
+def _hammer(path, n):
+    import time
+    from bookmarks.throttle_store import SQLiteThrottleStore
+    store = SQLiteThrottleStore(path)
+    now = time.time()
+    return sum(store.hit('client', now, 3600, 50)[0] for _ in range(n))
+
+def test_sqlite_store_prunes_expired_and_excess_keys(tmp_path):
+    from bookmarks.throttle_store import SQLiteThrottleStore
+    store = SQLiteThrottleStore(tmp_path / 'prune.sqlite3', max_keys=5, prune_every=10**9)
+    for i in range(10):
+        store.hit(f'old-{i}', 0.0, 60, 10)
+    for i in range(8):
+        store.hit(f'new-{i}', 1000.0, 60, 10)
+    store.prune(1000.0)
+    assert len(store) == 5
+
+def test_sqlite_store_async_hit_waits_for_a_locked_file_in_a_thread(tmp_path):
+    import sqlite3, threading
+    from asgiref.sync import async_to_sync
+    from bookmarks.throttle_store import SQLiteThrottleStore
+
+    store = SQLiteThrottleStore(tmp_path / 'locked.sqlite3')
+    assert async_to_sync(store.ahit)('client', 0.0, 60, 10)[0] # lock free: answered on the loop
+
+    other = sqlite3.connect(str(tmp_path / 'locked.sqlite3'), isolation_level=None, check_same_thread=False)
+    other.execute('BEGIN IMMEDIATE')
+    threading.Timer(0.2, lambda: other.execute('COMMIT')).start()
+    allowed, state, used = async_to_sync(store.ahit)('client', 0.0, 60, 10)
+    assert allowed and used == 2
@@ -0,0 +1,97 @@
+import pytest
+from model_bakery import baker
+from bookmarks.throttling import BookmarksBatchSubmitBurst
+
+BATCH_URL = '/bookmarks/v1/bookmarks/submit/batch/'
+
+def _item(n, **kwargs):
+    return {'title': f'Site {n}', 'url': f'https://site{n}.example/', 'description': 'desc', 'tags': ['django'], **kwargs}
+
+@pytest.mark.django_db
+def test_batch_reports_created_duplicate_and_invalid(api_client):
+    '''
+    Per-item results: new urls are created (moderated), stored or repeated urls are duplicates,
+    bad items are invalid without failing the batch.
+    '''
+    baker.make('bookmarks.Tag', slug='django', name='Django')
+    baker.make('bookmarks.Bookmark', url='https://taken.example')
+
+    payload = [
+        _item(1, tags=['django', 'API', 'api']),
+        {**_item(2), 'url': 'https://TAKEN.example:443/'},
+        {**_item(3), 'url': 'https://site1.example'}, # same as item 0 after canonicalization
+        {**_item(4), 'url': 'ftp://nope.example'},
+        {**_item(5), 'website': 'spam'},
+    ]
+    r = api_client.post(BATCH_URL, data=payload, format='json')
+    assert r.status_code == 200, r.content
+    data = r.json()
+    assert (data['created'], data['duplicate'], data['invalid']) == (1, 2, 2)
+    assert [x['status'] for x in data['results']] == ['created', 'duplicate', 'duplicate', 'invalid', 'invalid']
+
+    created = data['results'][0]
+    assert created['tags'] == ['django']
+    assert created['pending_tags'] == ['api']
+
+    from bookmarks.models import Bookmark
+    obj = Bookmark.objects.get(id=created['id'])
+    assert obj.url == 'https://site1.example'
+    assert obj.domain == 'site1.example'
+    assert obj.is_approved is False
+    assert obj.submitted_ip in {'127.0.0.1', '::1'}
+    assert list(obj.tags.values_list('slug', flat=True)) == ['django']
+
+@pytest.mark.django_db
+def test_batch_query_count_is_independent_of_size(api_client, django_assert_max_num_queries, django_user_model):
+    from bookmarks import near_duplicates
+    baker.make('bookmarks.Tag', slug='django')
+    api_client.force_authenticate(django_user_model.objects.create_user('importer')) # past the anonymous budget
+    near_duplicates.get_index().sync() # built once per worker, not per request
+    # Includes the DomainStat upsert (insert missing + update), the fetch_metadata jobs and the
+    # near-duplicate check (new index rows + candidates); SQLite's 999-parameter limit splits
+    # the bookmark and job INSERTs into a few statements each
+    with django_assert_max_num_queries(16):
+        r = api_client.post(BATCH_URL, data=[_item(i) for i in range(200)], format='json')
+    assert r.json()['created'] == 200
+
+@pytest.mark.django_db
+def test_batch_throttle_counts_items(api_client, monkeypatch):
+    monkeypatch.setattr(BookmarksBatchSubmitBurst, 'rate', '5/min', raising=False)
+    r = api_client.post(BATCH_URL, data=[_item(i) for i in range(3)], format='json')
+    assert r.status_code == 200
+    assert r['X-RateLimit-Remaining'] == '2'
+    r = api_client.post(BATCH_URL, data=[_item(i) for i in range(3, 6)], format='json')
+    assert r.status_code == 429
+
+@pytest.mark.django_db
+def test_anonymous_batches_draw_on_the_single_submit_budget(api_client, django_user_model):
+    # 5/min for single submissions (config.settings)
+    r = api_client.post(BATCH_URL, data=[_item(i) for i in range(6)], format='json')
+    assert r.status_code == 429
+    assert api_client.post(BATCH_URL, data=[_item(i) for i in range(3)], format='json').status_code == 200
+    assert api_client.post('/bookmarks/v1/bookmarks/submit/', _item(10), format='json').status_code == 201
+    assert api_client.post(BATCH_URL, data=[_item(i) for i in range(20, 22)], format='json').status_code == 429
+
+    # Authenticated clients only have the batch budgets
+    api_client.force_authenticate(django_user_model.objects.create_user('importer'))
+    assert api_client.post(BATCH_URL, data=[_item(i) for i in range(30, 36)], format='json').status_code == 200
+
+@pytest.mark.django_db
+def test_batch_rejects_bad_shape(api_client, settings):
+    assert api_client.post(BATCH_URL, data={'title': 'x'}, format='json').status_code == 400
+    assert api_client.post(BATCH_URL, data=[], format='json').status_code == 400
+    settings.BOOKMARKS = {**settings.BOOKMARKS, 'BATCH_SUBMIT_MAX_ITEMS': 2}
+    assert api_client.post(BATCH_URL, data=[_item(i) for i in range(3)], format='json').status_code == 400
+
+@pytest.mark.django_db
+def test_batch_stores_url_hash_and_folds_tracking_variants(api_client):
+    from bookmarks.models import Bookmark, url_hash
+    payload = [
+        {**_item(1), 'url': 'https://news.example/story?id=3&utm_source=rss'},
+        {**_item(2), 'url': 'https://news.example/story?fbclid=xyz&id=3'},
+    ]
+    data = api_client.post(BATCH_URL, data=payload, format='json').json()
+    assert [x['status'] for x in data['results']] == ['created', 'duplicate']
+    stored = Bookmark.objects.get(id=data['results'][0]['id'])
+    assert stored.url == 'https://news.example/story?id=3'
+    assert stored.url_hash == url_hash(stored.url)
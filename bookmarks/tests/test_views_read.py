@@ -78,4 +78,29 @@ def test_detail_returns_404_for_unapproved(api_client):
     assert r_ok.status_code == 200
 
     r_no = api_client.get(f'/bookmarks/v1/bookmarks/{no.id}/')
-    assert r_no.status_code == 404
\ No newline at end of file
+    assert r_no.status_code == 404
+
+@pytest.mark.django_db
+def test_sparse_fieldsets_and_include_tags(api_client):
+    '''
+    ?fields= picks the fields (in the usual order); tags only when listed or included.
+    '''
+    t = baker.make('bookmarks.Tag', slug='django')
+    b = baker.make('bookmarks.Bookmark', title='Sparse', is_approved=True, tags=[t])
+
+    r = api_client.get(LIST_URL, {'fields': 'url, id'})
+    assert r.status_code == 200
+    assert list(r.json()['results'][0]) == ['id', 'url']
+
+    r = api_client.get(LIST_URL, {'fields': 'title', 'include': 'tags'})
+    assert r.json()['results'][0] == {'title': 'Sparse', 'tags': ['django']}
+
+    r = api_client.get(f'{LIST_URL}{b.id}/', {'fields': 'id,tags'})
+    assert r.json() == {'id': b.id, 'tags': ['django']}
+
+    # No ?fields: the full representation, as before
+    assert list(api_client.get(f'{LIST_URL}{b.id}/').json()) == ['id', 'title', 'url', 'description', 'tags', 'created_at']
+
+    for params in ({'fields': 'id,is_approved'}, {'include': 'domain'}):
+        r = api_client.get(LIST_URL, params)
+        assert r.status_code == 400, params
\ No newline at end of file
@@ -47,4 +47,23 @@ def test_submit_records_submitted_ip(api_client):
 
     from bookmarks.models import Bookmark
     obj = Bookmark.objects.get(id=data['id'])
-    assert obj.submitted_ip in {'127.0.0.1', '::1'}
\ No newline at end of file
+    assert obj.submitted_ip in {'127.0.0.1', '::1'}
+
+@pytest.mark.django_db
+def test_submit_rejects_canonical_variants_with_one_indexed_lookup(api_client):
+    '''
+    Tracking parameters, query order, host case and default ports do not make a new url.
+    '''
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    baker.make('bookmarks.Bookmark', url='https://example.com/post?id=7&page=2')
+
+    with CaptureQueriesContext(connection) as queries:
+        r = api_client.post(SUBMIT_URL, {
+            'title': 'Again', 'url': 'https://EXAMPLE.com:443/post?page=2&utm_source=news&id=7',
+            'description': 'd', 'tags': ['x'],
+        }, format='json')
+    assert r.status_code == 400
+    assert r.json() == {'detail': 'URL already submitted'}
+    precheck = [q['sql'] for q in queries if 'url_hash' in q['sql']]
+    assert len(precheck) == 1 and 'LIKE' not in precheck[0]
\ No newline at end of file
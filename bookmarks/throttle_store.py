@@ -0,0 +1,119 @@
+'''
+Throttle state shared by every worker process on a host.
+
+Django's default LocMemCache is per process, so with N workers each client effectively gets
+N times the configured rate, and counters vanish on restart. SQLiteThrottleStore keeps the
+sliding-window state (see bookmarks.throttling) in a small WAL-mode SQLite file instead:
+each check is one short BEGIN IMMEDIATE transaction, which serializes the read-modify-write
+across processes without any external service. Idle clients are pruned so the file stays bounded.
+'''
+import os, sqlite3, threading
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from . import conf
+from .throttling import CacheThrottleStore, sliding_window
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS throttle (
+    key TEXT PRIMARY KEY,
+    win INTEGER NOT NULL,
+    cur INTEGER NOT NULL,
+    prev INTEGER NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS throttle_expires ON throttle (expires);
+'''
+
+class SQLiteThrottleStore:
+    def __init__(self, path, max_keys=100_000, prune_every=1_000, timeout=5.0):
+        self.path = str(path)
+        self.max_keys = max_keys
+        self.prune_every = prune_every
+        self.timeout = timeout
+        self._local = threading.local()
+        self._hits = 0
+
+    def _connection(self, wait=True):
+        # One connection per thread, reopened after fork (connections must not cross processes).
+        # wait=False gives one that fails at once instead of waiting for another writer's lock
+        name = 'conn' if wait else 'nowait_conn'
+        conn = getattr(self._local, name, None)
+        if conn is None or getattr(self._local, name + '_pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout if wait else 0, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF') # losing the last few counts on power loss is fine
+            conn.executescript(SCHEMA)
+            setattr(self._local, name, conn)
+            setattr(self._local, name + '_pid', os.getpid())
+        return conn
+
+    async def ahit(self, key, now, duration, limit, cost=1):
+        '''
+        hit() for async views. A check takes microseconds, far less than a thread hop, so it runs
+        on the event loop; only when another writer holds the lock is it waited for in a thread.
+        '''
+        try:
+            return self.hit(key, now, duration, limit, cost, wait=False)
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+        return await sync_to_async(self.hit, thread_sensitive=False)(key, now, duration, limit, cost)
+
+    def hit(self, key, now, duration, limit, cost=1, wait=True):
+        conn = self._connection(wait)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT win, cur, prev FROM throttle WHERE key = ?', (key,)).fetchone()
+            state, allowed, used = sliding_window(row, now, duration, limit, cost)
+            if allowed:
+                conn.execute(
+                    'INSERT OR REPLACE INTO throttle (key, win, cur, prev, expires) VALUES (?, ?, ?, ?, ?)',
+                    (key, state[0], state[1], state[2], (state[0] + 2) * duration),
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._hits += 1
+        if self._hits % self.prune_every == 0:
+            self.prune(now)
+        return allowed, state, used
+
+    def prune(self, now):
+        '''
+        Drop clients whose windows have fully expired, then the least recently active
+        ones beyond max_keys.
+        '''
+        conn = self._connection()
+        conn.execute('DELETE FROM throttle WHERE expires < ?', (now,))
+        (count,) = conn.execute('SELECT COUNT(*) FROM throttle').fetchone()
+        if count > self.max_keys:
+            conn.execute(
+                'DELETE FROM throttle WHERE key IN (SELECT key FROM throttle ORDER BY expires LIMIT ?)',
+                (count - self.max_keys,),
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM throttle')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM throttle').fetchone()[0]
+
+_stores = {}
+
+def get_store(cache=None):
+    '''
+    Store configured by BOOKMARKS['THROTTLE_STORE'] (a dotted path, or None for the Django cache).
+    Instances are shared per process so connections are reused between requests.
+    '''
+    backend = conf.get('THROTTLE_STORE')
+    if not backend:
+        return CacheThrottleStore(cache or caches['default'])
+
+    options = conf.get('THROTTLE_STORE_OPTIONS')
+    key = (backend, tuple(sorted((k, str(v)) for k, v in options.items())))
+    if key not in _stores:
+        _stores[key] = import_string(backend)(**options)
+    return _stores[key]
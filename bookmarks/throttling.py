@@ -1,6 +1,141 @@
+import math
+from asgiref.sync import sync_to_async
 from rest_framework.throttling import SimpleRateThrottle
+from . import metrics
 
-class _IPRateThrottle(SimpleRateThrottle):
+def sliding_window(state, now, duration, limit, cost=1):
+    '''
+    Sliding-window counter transition.
+
+    `state` is (window index, count in current window, count in previous window), or None.
+    The number of requests in the last `duration` seconds is estimated by weighting the
+    previous window by how much of it still overlaps the sliding window.
+    Returns (new_state, allowed, used) where `used` includes this request when allowed.
+    '''
+    window = int(now // duration)
+    current = previous = 0
+    if state is not None:
+        w, c, p = state
+        if w == window:
+            current, previous = c, p
+        elif w == window - 1:
+            previous = c
+
+    overlap = 1.0 - (now - window * duration) / duration
+    used = previous * overlap + current
+    allowed = used + cost <= limit
+    if allowed:
+        current += cost
+        used += cost
+    return (window, current, previous), allowed, used
+
+def retry_after(state, now, duration, limit, cost=1):
+    '''
+    Seconds until a request of `cost` fits under `limit` again (0 if it already does).
+    '''
+    (window, current, previous), _, used = sliding_window(state, now, duration, limit, 0)
+    if used + cost <= limit:
+        return 0.0
+    window_end = (window + 1) * duration
+    room = limit - cost - current
+    if room >= 0 and previous:
+        # Wait for the previous window's weight to decay enough
+        return max(0.0, window_end - duration * room / previous - now)
+    if cost > limit:
+        return None
+    # Otherwise the current window has to age into "previous" and decay
+    return max(0.0, window_end + duration * (1.0 - (limit - cost) / current) - now) if current else window_end - now
+
+class CacheThrottleStore:
+    '''
+    Keeps sliding-window state in a Django cache (one small tuple per client and scope).
+    '''
+    def __init__(self, cache):
+        self.cache = cache
+
+    def hit(self, key, now, duration, limit, cost=1):
+        '''
+        Apply one request and return (allowed, state, used) in a single read/write round-trip.
+        '''
+        state = self.cache.get(key)
+        if not (isinstance(state, tuple) and len(state) == 3):
+            state = None # missing, expired or written by the old timestamp-list throttle
+        state, allowed, used = sliding_window(state, now, duration, limit, cost)
+        if allowed:
+            self.cache.set(key, state, int(math.ceil(duration * 2)))
+        return allowed, state, used
+
+    async def ahit(self, key, now, duration, limit, cost=1):
+        from .cache import call_async
+        state = await call_async(self.cache, 'get', key)
+        if not (isinstance(state, tuple) and len(state) == 3):
+            state = None
+        state, allowed, used = sliding_window(state, now, duration, limit, cost)
+        if allowed:
+            await call_async(self.cache, 'set', key, state, int(math.ceil(duration * 2)))
+        return allowed, state, used
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    '''
+    Rate throttle with O(1) state per client: a sliding-window counter instead of
+    SimpleRateThrottle's list of request timestamps.
+
+    The decision and the X-RateLimit-* numbers come from the same store round-trip;
+    after allow_request() they are available as `self.state` = (remaining, reset_at, limit).
+    '''
+    def get_store(self):
+        from .throttle_store import get_store
+        return get_store(self.cache)
+
+    def get_cost(self, request, view):
+        # Views can charge more than one unit per request (e.g. one per item of a batch)
+        get_cost = getattr(view, 'get_throttle_cost', None)
+        return get_cost(request) if get_cost else 1
+
+    def allow_request(self, request, view):
+        if not self._prepare(request, view):
+            return True
+        with metrics.phase('throttle'):
+            result = self.get_store().hit(self.key, self.now, self.duration, self.num_requests, self.cost)
+        return self._decide(*result)
+
+    async def aallow_request(self, request, view):
+        '''
+        allow_request() for async views: the store round-trip is awaited instead of blocking.
+        '''
+        if not self._prepare(request, view):
+            return True
+        store = self.get_store()
+        # Stores without an async API run in a worker thread
+        hit = getattr(store, 'ahit', None) or sync_to_async(store.hit, thread_sensitive=False)
+        with metrics.phase('throttle'):
+            result = await hit(self.key, self.now, self.duration, self.num_requests, self.cost)
+        return self._decide(*result)
+
+    def _prepare(self, request, view):
+        # False when this request is not throttled at all
+        self.state = None
+        if self.rate is None:
+            return False
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return False
+        self.now = self.timer()
+        self.cost = self.get_cost(request, view)
+        return True
+
+    def _decide(self, allowed, window_state, used):
+        self.window_state = window_state
+        metrics.inc('bookmarks_throttle_decisions_total', (('scope', self.scope), ('result', 'allowed' if allowed else 'throttled')))
+        remaining = max(0, int(math.floor(self.num_requests - used)))
+        reset_at = int(math.ceil((window_state[0] + 1) * self.duration))
+        self.state = (remaining, reset_at, self.num_requests)
+        return allowed
+
+    def wait(self):
+        return retry_after(self.window_state, self.now, self.duration, self.num_requests, self.cost)
+
+class _IPRateThrottle(SlidingWindowThrottle):
     def get_cache_key(self, request, view):
         ident = self.get_ident(request)
         if not ident:
@@ -15,3 +150,25 @@ class BookmarksSubmitBurst(_IPRateThrottle):
 
 class BookmarksSubmitDay(_IPRateThrottle):
     scope = 'bookmarks_submit_day'
+
+class _AnonymousOnly:
+    # Authenticated clients are not charged by this throttle
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return super().get_cache_key(request, view)
+
+class BookmarksBatchAnonBurst(_AnonymousOnly, BookmarksSubmitBurst):
+    '''
+    The single-submit budgets (same scope, same counters), charged per item of an anonymous
+    batch: wrapping submissions in a list must not buy more of them.
+    '''
+
+class BookmarksBatchAnonDay(_AnonymousOnly, BookmarksSubmitDay):
+    pass
+
+class BookmarksBatchSubmitBurst(_IPRateThrottle):
+    scope = 'bookmarks_batch_burst'
+
+class BookmarksBatchSubmitDay(_IPRateThrottle):
+    scope = 'bookmarks_batch_day'
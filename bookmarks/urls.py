@@ -1,14 +1,27 @@
 from django.urls import path
 from django.views.generic import TemplateView
-from . import views
+from . import conf, views
 
 app_name = 'bookmarks'
 
+# Native async list/detail/health for ASGI deployments (see bookmarks.async_views)
+if conf.get('ASYNC_VIEWS'):
+    from . import async_views as read_views
+else:
+    read_views = views
+
 urlpatterns = [
     path('docs/', TemplateView.as_view(template_name='bookmarks/swagger_docs.html'), name='bookmarks-docs'),
-    path('v1/health/', views.HealthCheckView.as_view(), name='bookmarks-health'),
-    path('v1/bookmarks/', views.BookmarkListView.as_view(), name='bookmarks-list'),
-    path('v1/bookmarks/<int:id>/', views.BookmarkDetailView.as_view(), name='bookmarks-detail'),
+    path('v1/health/', read_views.HealthCheckView.as_view(), name='bookmarks-health'),
+    path('v1/metrics/', views.MetricsView.as_view(), name='bookmarks-metrics'),
+    path('v1/bookmarks/', read_views.BookmarkListView.as_view(), name='bookmarks-list'),
+    path('v1/bookmarks/export.ndjson', views.BookmarkExportView.as_view(), name='bookmarks-export'),
+    path('v1/bookmarks/export.ndjson.gz', views.BookmarkExportView.as_view(compress=True), name='bookmarks-export-gz'),
+    path('v1/bookmarks/<int:id>/', read_views.BookmarkDetailView.as_view(), name='bookmarks-detail'),
+    path('v1/tags/', views.TagListView.as_view(), name='bookmarks-tags'),
+    path('v1/domains/', views.DomainListView.as_view(), name='bookmarks-domains'),
     path('v1/bookmarks/submit/', views.BookmarkSubmitView.as_view(), name='bookmarks-submit'),
+    path('v1/bookmarks/submit/batch/', views.BookmarkBatchSubmitView.as_view(), name='bookmarks-submit-batch'),
+    path('v1/moderation/', views.ModerationView.as_view(), name='bookmarks-moderation'),
     path('demo/', TemplateView.as_view(template_name='bookmarks/bookmarks_demo.html'), name='bookmarks-demo'),
 ]
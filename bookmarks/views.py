@@ -1,12 +1,25 @@
-import math, time
+from datetime import datetime, time as dt_time
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.filters import SearchFilter, OrderingFilter
-from rest_framework.generics import ListAPIView, RetrieveAPIView, CreateAPIView
+from rest_framework.filters import OrderingFilter
+from rest_framework.exceptions import ParseError
+from rest_framework.generics import ListAPIView, RetrieveAPIView, CreateAPIView, GenericAPIView
 from rest_framework import status, permissions
-from .models import Bookmark, Tag
-from .serializers import BookmarkReadSerializer, BookmarkSubmissionSerializer, BookmarkWriteSerializer
-from .throttling import BookmarksReadsThrottle, BookmarksSubmitBurst, BookmarksSubmitDay
+# bulk, export, jobs and near_duplicates are imported in the write and export views that use
+# them, so a worker that only serves reads never loads them
+from . import conf, db, fastread, metrics, tag_counts
+from . import cache as response_cache
+from .filters import FullTextSearchFilter, MultiTagFilter
+from .models import Bookmark, DomainStat, Tag, url_domain
+from .serializers import DomainSerializer, ModerationSerializer, TagSerializer, BookmarkReadSerializer, BookmarkSubmissionSerializer, BookmarkWriteSerializer, BookmarkBatchItemSerializer
+from .throttling import BookmarksReadsThrottle, BookmarksSubmitBurst, BookmarksSubmitDay, BookmarksBatchAnonBurst, BookmarksBatchAnonDay, BookmarksBatchSubmitBurst, BookmarksBatchSubmitDay
 
 # Helpers
 def _client_ip(request):
@@ -19,47 +32,21 @@ class RateLimitHeadersMixin:
     '''
     Adds X-RateLimit-* headers based on DRF throttles.
     For multiple throttles, chooses the most restrictive (lowest remaining; tie-breaker: earliest reset)
+    The numbers are the ones each throttle computed while deciding, so no extra cache reads happen here.
     '''
-    def _compute_throttle_state(self, request):
-        now = time.time()
-        best = None # tuple (remaining, resets_secs, limit)
-
-        # Use the declared throttle_classes
-        for ThrottleClass in getattr(self, 'throttle_classes', []):
-            t = ThrottleClass()
-            rate = t.get_rate()
-            if not rate:
-                continue
-
-            # Parse rate
-            try:
-                num, duration = t.parse_rate(rate)
-            except Exception:
-                continue
+    def get_throttles(self):
+        # Keep the instances that check_throttles() runs so their state can be reported
+        self._throttles = super().get_throttles()
+        return self._throttles
 
-            # Determine cache key for this request/view
-            key = t.get_cache_key(request, self)
-            if not key:
+    def _compute_throttle_state(self, request):
+        best = None # tuple (remaining, resets_at, limit)
+        for t in getattr(self, '_throttles', []):
+            cur = getattr(t, 'state', None)
+            if cur is None:
                 continue
-
-            history= t.cache.get(key, [])
-            window_start = now - duration
-            history = [ts for ts in history if ts > window_start]
-            remaining = max(0, num - len(history))
-
-            if history:
-                oldest = history[0]
-                reset_at = int(math.ceil(oldest + duration)) # epoch when reset happens
-            else:
-                reset_at = int(math.ceil(now + duration))
-
-            cur = (remaining, reset_at, num)
-
-            if best is None:
+            if best is None or cur[0] < best[0] or (cur[0] == best[0] and cur[1] < best[1]):
                 best = cur
-            else:
-                if cur[0] < best[0] or (cur[0] == best[0] and cur[1] < best[1]):
-                    best = cur
 
         return best # or None
 
@@ -79,6 +66,73 @@ class RateLimitHeadersMixin:
         return response
 
 
+class CachedResponseMixin:
+    '''
+    Serves GETs from the rendered-response cache, and answers conditional GETs from the same
+    data version (see bookmarks.cache). Throttling still runs first; a hit or a 304 skips the
+    queries and serialization entirely.
+    '''
+    def get(self, request, *args, **kwargs):
+        caching, conditional = response_cache.is_enabled(), response_cache.is_conditional()
+        if not (caching or conditional):
+            return super().get(request, *args, **kwargs)
+
+        version = response_cache.version()
+        if conditional and (not_modified := response_cache.not_modified(request, version)) is not None:
+            return not_modified
+
+        lagging = response_cache.replica_may_lag(version)
+        if caching:
+            key = response_cache.make_key(request, version.generation)
+            response = response_cache.lookup(key)
+            if response is None:
+                response = super().get(request, *args, **kwargs)
+                if lagging:
+                    response['X-Cache'] = 'MISS'
+                else:
+                    response_cache.store_on_render(key, response)
+        else:
+            response = super().get(request, *args, **kwargs)
+        if conditional and not lagging:
+            response_cache.set_validators(response, version)
+        return response
+
+class SparseFieldsMixin:
+    '''
+    ?fields=id,url,title returns only those fields; tags are left out (and not queried) unless
+    listed or asked for with ?include=tags. Without ?fields every field is returned.
+    '''
+    def get_sparse_fields(self):
+        if not hasattr(self, '_fields'):
+            params = self.request.query_params
+            fields = {f.strip() for f in params.get('fields', '').split(',') if f.strip()}
+            include = {f.strip() for f in params.get('include', '').split(',') if f.strip()}
+            if include - {'tags'}:
+                raise ParseError('include only accepts "tags"')
+            unknown = fields - set(fastread.READ_FIELDS)
+            if unknown:
+                raise ParseError(f'Unknown field(s): {", ".join(sorted(unknown))}. Available: {", ".join(fastread.READ_FIELDS)}')
+            if fields:
+                fields |= include
+            self._fields = tuple(f for f in fastread.READ_FIELDS if not fields or f in fields)
+        return self._fields
+
+    def select_fields(self, queryset):
+        # Only the requested columns, and no tag prefetch unless tags are requested
+        fields = self.get_sparse_fields()
+        if 'tags' not in fields:
+            queryset = queryset.prefetch_related(None)
+        if fields != fastread.READ_FIELDS:
+            queryset = queryset.only(*fastread.columns(fields))
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields != fastread.READ_FIELDS:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+
 # Create your views here.
 class HealthCheckView(RateLimitHeadersMixin, APIView):
     permission_classes = [permissions.AllowAny]
@@ -86,14 +140,28 @@ class HealthCheckView(RateLimitHeadersMixin, APIView):
         content = {'status': 'ok'}
         return Response(content, status.HTTP_200_OK)
 
-class BookmarkListView(RateLimitHeadersMixin, ListAPIView):
+class MetricsView(View):
+    '''
+    Prometheus scrape target; plain Django view so scrapes skip DRF negotiation and throttling.
+    Internal numbers, so only for the scraper's network and staff (see metrics.is_allowed).
+    '''
+    def get(self, request, *args, **kwargs):
+        if not conf.get('METRICS'):
+            raise Http404
+        if not metrics.is_allowed(request):
+            return HttpResponseForbidden()
+        from . import jobs
+        return HttpResponse(metrics.render(gauges=jobs.gauges()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class BookmarkListView(db.ReplicaReadsMixin, RateLimitHeadersMixin, CachedResponseMixin, SparseFieldsMixin, ListAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = BookmarkReadSerializer
     throttle_classes = [BookmarksReadsThrottle]
-    filter_backends = [SearchFilter, OrderingFilter]
+    filter_backends = [OrderingFilter, MultiTagFilter, FullTextSearchFilter] # search runs last so it can rank by relevance
     search_fields = ['title', 'description']
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    use_tag_index = True
 
     def get_queryset(self):
         # Get queryset; prefetch related tags (approved Bookmarks)
@@ -105,15 +173,142 @@ class BookmarkListView(RateLimitHeadersMixin, ListAPIView):
         # If tag, filter queryset by tag
         if tag:
             qs = qs.filter(tags__slug=tag)
-        return qs
 
-class BookmarkDetailView(RateLimitHeadersMixin, RetrieveAPIView):
+        # ?domain=www.Example.com is the same domain as example.com (see url_domain)
+        domain = self.request.query_params.get('domain', '').strip()
+        if domain:
+            qs = qs.filter(domain=url_domain(f'//{domain}'))
+
+        # ?dead=true: links the checker gave up on (see bookmarks.link_health); ?dead=false: the rest
+        dead = self.request.query_params.get('dead', '').lower()
+        if dead:
+            if dead not in ('1', 'true', 'yes', '0', 'false', 'no'):
+                raise ParseError('dead must be "true" or "false"')
+            qs = qs.filter(link_dead=dead in ('1', 'true', 'yes'))
+        return self.select_fields(qs)
+
+    # Query parameters that narrow the result set (used to pick how facets are computed)
+    filter_params = ('tag', 'tags', 'domain', 'dead', 'search')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if conf.get('FAST_READ'):
+            # Same filtering and keyset pagination, but over .values() rows (see bookmarks.fastread)
+            fields = self.get_sparse_fields()
+            response = self.paginated(fastread.values(queryset, fields), lambda rows: fastread.serialize(rows, fields))
+        else:
+            response = self.paginated(queryset, lambda rows: self.get_serializer(rows, many=True).data)
+
+        if 'tags' in request.query_params.get('facets', '').split(','):
+            response.data['facets'] = {'tags': self.tag_facets(queryset)}
+        return response
+
+    def paginated(self, queryset, serialize):
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serialize(list(queryset)))
+        return self.get_paginated_response(serialize(page))
+
+    def tag_facets(self, queryset):
+        # Unfiltered, the stored per-tag counts are the answer; otherwise one GROUP BY over the matches
+        limit = conf.get('TAG_FACETS_LIMIT')
+        if self.use_tag_index and self.request.query_params.get('tags'):
+            # The tag index only resolved the current page; facets need every match
+            self.use_tag_index = False
+            queryset = self.filter_queryset(self.get_queryset())
+        if not any(self.request.query_params.get(p) for p in self.filter_params):
+            return tag_counts.top_tags(limit)
+        return tag_counts.facets(queryset, limit)
+
+class BookmarkDetailView(db.ReplicaReadsMixin, RateLimitHeadersMixin, CachedResponseMixin, SparseFieldsMixin, RetrieveAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = BookmarkReadSerializer
     throttle_classes = [BookmarksReadsThrottle]
     lookup_url_kwarg = 'id' # match /v1/bookmarks/<int:id>/
     queryset = Bookmark.objects.filter(is_approved=True).prefetch_related('tags')
 
+    def get_queryset(self):
+        return self.select_fields(super().get_queryset())
+
+    def retrieve(self, request, *args, **kwargs):
+        if not conf.get('FAST_READ'):
+            return super().retrieve(request, *args, **kwargs)
+
+        fields = self.get_sparse_fields()
+        queryset = fastread.values(self.filter_queryset(self.get_queryset()), fields)
+        row = get_object_or_404(queryset, **{self.lookup_field: self.kwargs[self.lookup_url_kwarg]})
+        self.check_object_permissions(request, row)
+        return Response(fastread.serialize([row], fields)[0])
+
+class TagListView(db.ReplicaReadsMixin, RateLimitHeadersMixin, CachedResponseMixin, ListAPIView):
+    '''
+    Tags in use by approved bookmarks, with their counts (?ordering=-count (default), count, name, -name).
+    '''
+    permission_classes = [permissions.AllowAny]
+    serializer_class = TagSerializer
+    throttle_classes = [BookmarksReadsThrottle]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['count', 'name']
+    ordering = ['-count', 'name']
+
+    def get_queryset(self):
+        return Tag.objects.filter(approved_count__gt=0).annotate(count=F('approved_count'))
+
+class DomainListView(db.ReplicaReadsMixin, RateLimitHeadersMixin, CachedResponseMixin, ListAPIView):
+    '''
+    Domains of approved bookmarks, with their counts (?ordering=-count (default), count, domain, -domain).
+    Read from the DomainStat rollup, never grouped over the bookmark table.
+    '''
+    permission_classes = [permissions.AllowAny]
+    serializer_class = DomainSerializer
+    throttle_classes = [BookmarksReadsThrottle]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['count', 'domain']
+    ordering = ['-count', 'domain']
+
+    def get_queryset(self):
+        return DomainStat.objects.filter(approved_count__gt=0).annotate(count=F('approved_count'))
+
+class BookmarkExportView(RateLimitHeadersMixin, APIView):
+    '''
+    Streams every approved bookmark as NDJSON (oldest first), gzip-compressed for the .gz variant.
+    ?since=<ISO date or datetime> limits the export to rows created after that moment.
+    '''
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [BookmarksReadsThrottle]
+    compress = False
+
+    def perform_content_negotiation(self, request, force=False):
+        # The body is NDJSON whatever Accept says; JSON renderer is only used for errors
+        return super().perform_content_negotiation(request, force=True)
+
+    def get_since(self, request):
+        raw = request.query_params.get('since')
+        if not raw:
+            return None
+        try:
+            since = parse_datetime(raw)
+            if since is None and (day := parse_date(raw)) is not None:
+                since = datetime.combine(day, dt_time.min)
+        except ValueError:
+            since = None
+        if since is None:
+            raise ParseError('since must be an ISO-8601 date or datetime')
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, timezone.get_current_timezone())
+        return since
+
+    def get(self, request, *args, **kwargs):
+        from . import export
+        rows = export.iter_rows(since=self.get_since(request), chunk_size=conf.get('EXPORT_CHUNK_SIZE'))
+        body = export.ndjson_chunks(rows)
+        if self.compress:
+            response = StreamingHttpResponse(export.gzip_chunks(body), content_type='application/gzip')
+            response['Content-Disposition'] = 'attachment; filename="bookmarks.ndjson.gz"'
+        else:
+            response = StreamingHttpResponse(body, content_type='application/x-ndjson')
+        return response
+
 class BookmarkSubmitView(RateLimitHeadersMixin, CreateAPIView):
     permission_classes = [permissions.AllowAny]
     serializer_class = BookmarkWriteSerializer
@@ -124,11 +319,99 @@ class BookmarkSubmitView(RateLimitHeadersMixin, CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        # Save with client IP (serializer default is_approved=False)
+        # Save with client IP (serializer default is_approved=False); any enrichment runs
+        # later in a worker, enqueued in the same transaction (see bookmarks.jobs).
+        # Likely copies of a stored bookmark are flagged for moderators (see bookmarks.near_duplicates)
+        from . import jobs, near_duplicates
         ip = _client_ip(request)
-        instance = serializer.save(submitted_ip=ip)
+        with transaction.atomic():
+            instance = serializer.save(submitted_ip=ip)
+            jobs.submitted([instance.id])
+            near_duplicates.flag([instance])
 
         # return submission reciept
         out = BookmarkSubmissionSerializer(instance, context = self.get_serializer_context())
         headers = self.get_success_headers(out.data)
         return Response(out.data, status=status.HTTP_201_CREATED, headers=headers)
+
+class BookmarkBatchSubmitView(RateLimitHeadersMixin, GenericAPIView):
+    '''
+    POST a JSON list of submissions; each item is created, reported as a duplicate, or rejected as invalid.
+    Duplicate detection, tag lookup, inserts and tag attachment are one query each for the whole batch.
+    Throttles are charged one unit per item; anonymous clients also draw on the single-submit budgets.
+    '''
+    permission_classes = [permissions.AllowAny]
+    serializer_class = BookmarkBatchItemSerializer
+    throttle_classes = [BookmarksBatchAnonDay, BookmarksBatchAnonBurst, BookmarksBatchSubmitDay, BookmarksBatchSubmitBurst]
+
+    def get_items(self, request):
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('bookmarks')
+        if not isinstance(items, list) or not items:
+            raise ParseError('Expected a non-empty list of bookmarks')
+        max_items = conf.get('BATCH_SUBMIT_MAX_ITEMS')
+        if len(items) > max_items:
+            raise ParseError(f'At most {max_items} bookmarks per batch')
+        return items
+
+    def get_throttle_cost(self, request):
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('bookmarks')
+        if isinstance(items, list):
+            return max(1, min(len(items), conf.get('BATCH_SUBMIT_MAX_ITEMS')))
+        return 1
+
+    def post(self, request, *args, **kwargs):
+        items = self.get_items(request)
+
+        # Validate every item on its own; invalid ones are reported, not fatal
+        results = [None] * len(items)
+        valid = []
+        for i, raw in enumerate(items):
+            serializer = self.get_serializer(data=raw)
+            if serializer.is_valid():
+                valid.append((i, serializer.validated_data))
+            else:
+                results[i] = {'index': i, 'status': 'invalid', 'errors': serializer.errors}
+
+        from . import bulk
+        created = bulk.submit_bookmarks([data for _, data in valid], submitted_ip=_client_ip(request))
+        for (i, data), bookmark in zip(valid, created):
+            if bookmark is None:
+                results[i] = {'index': i, 'status': 'duplicate', 'url': data['url']}
+            else:
+                results[i] = {
+                    'index': i,
+                    'status': 'created',
+                    'id': bookmark.id,
+                    'url': bookmark.url,
+                    'tags': [t.slug for t in bookmark.known_tags],
+                    'pending_tags': bookmark.pending_tags,
+                }
+
+        summary = {state: sum(r['status'] == state for r in results) for state in ('created', 'duplicate', 'invalid')}
+        return Response({**summary, 'results': results}, status=status.HTTP_200_OK)
+
+class ModerationView(GenericAPIView):
+    '''
+    Staff-only bulk moderation: POST {"action": "approve" | "reject", "ids": [...]}.
+    Approving promotes pending_tags to real tags; rejecting deletes the bookmarks.
+    Either way the whole selection is handled in a fixed number of queries (see bookmarks.bulk).
+    '''
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = ModerationSerializer
+
+    def post(self, request, *args, **kwargs):
+        from . import bulk
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        action, ids = serializer.validated_data['action'], serializer.validated_data['ids']
+        selection = Bookmark.objects.filter(id__in=ids)
+
+        if action == 'approve':
+            done, created = bulk.approve_bookmarks(selection, user=request.user)
+            return Response({'approved': len(done), 'ids': done, 'created_tags': sorted(created)}, status=status.HTTP_200_OK)
+        done = bulk.reject_bookmarks(selection)
+        return Response({'rejected': len(done), 'ids': done}, status=status.HTTP_200_OK)
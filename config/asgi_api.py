@@ -0,0 +1,19 @@
+"""
+ASGI entry point of the API-only profile (see config.settings_api):
+
+    uvicorn config.asgi_api:application
+"""
+
+import os, time
+
+started = time.perf_counter()
+
+from django.core.asgi import get_asgi_application # noqa: E402
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings_api')
+
+application = get_asgi_application()
+
+from config import startup # noqa: E402
+
+startup.ready(started, time.perf_counter())
@@ -44,20 +44,25 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'bookmarks.renderers.FastJSONRenderer', # orjson when installed, same bytes as JSONRenderer
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'bookmarks.pagination.KeysetPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_THROTTLE_CLASSES': [], # Throttle classes are set per view
     'DEFAULT_THROTTLE_RATES': {
         'bookmarks_reads': '60/min',
         'bookmarks_submit_burst': '5/min',
         'bookmarks_submit_day': '50/day',
+        # Batch submissions are charged per item (anonymous ones to the two scopes above as well)
+        'bookmarks_batch_burst': '500/min',
+        'bookmarks_batch_day': '5000/day',
     },
 }
 
 MIDDLEWARE = [
+    'bookmarks.metrics.MetricsMiddleware', # first, so its timing covers the whole stack
     'django.middleware.security.SecurityMiddleware',
+    'bookmarks.db.ReadYourWritesMiddleware', # reads go to the primary for a while after a write
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -97,9 +102,55 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections (and their pragmas, see bookmarks.db) across requests
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Writers queue for the lock (up to 20s) instead of failing with "database is locked"
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Read replicas for the public read views: BOOKMARKS_READ_REPLICAS=/path/a.sqlite3,/path/b.sqlite3
+# (kept in sync by your replication, or locally by `manage.py bookmarks_sync_replicas`)
+READ_REPLICAS = {
+    f'replica{i}': {**DATABASES['default'], 'NAME': path, 'TEST': {'MIRROR': 'default'}}
+    for i, path in enumerate(filter(None, os.getenv('BOOKMARKS_READ_REPLICAS', '').split(',')), start=1)
+}
+DATABASES.update(READ_REPLICAS)
+DATABASE_ROUTERS = ['bookmarks.db.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache is per process; with several workers use a shared backend so the bookmarks
+# response cache (and its invalidation) is seen by all of them.
+
+# Per process: the response cache (and what hangs off it, see bookmarks.checks) stays off until
+# this is a cache the workers share
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Bookmarks app settings (defaults in bookmarks/conf.py)
+BOOKMARKS = {
+    'RESPONSE_CACHE_TIMEOUT': 300,
+    # Throttle counters shared by all worker processes on this host
+    'THROTTLE_STORE': 'bookmarks.throttle_store.SQLiteThrottleStore',
+    'THROTTLE_STORE_OPTIONS': {
+        'path': os.getenv('BOOKMARKS_THROTTLE_DB', str(BASE_DIR / 'throttle.sqlite3')),
+    },
+    # Per-worker metric snapshots, merged by /bookmarks/v1/metrics/ (unset: this process only)
+    'METRICS_DIR': os.getenv('BOOKMARKS_METRICS_DIR'),
+    # Who may scrape it besides staff, e.g. "127.0.0.1/32,10.0.0.0/8" for a Prometheus on the private network
+    'METRICS_ALLOWED_NETWORKS': os.getenv('BOOKMARKS_METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128').split(','),
+    'READ_REPLICAS': list(READ_REPLICAS),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,45 @@
+"""
+API-only profile: serves the bookmarks JSON API (/bookmarks/v1/...) and nothing else.
+
+    gunicorn config.wsgi_api                  # or: uvicorn config.asgi_api:application
+
+Same database, cache and BOOKMARKS settings as config.settings, minus what anonymous JSON
+requests never use: no admin, sessions, messages, static files or Tailwind, no templates,
+and only the middleware the API needs. Staff reach /v1/moderation/ with HTTP Basic auth.
+Run migrations and the admin from a config.settings process.
+"""
+
+from .settings import * # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth', # Bookmark.approved_by, and staff checks on /v1/moderation/
+    'bookmarks',
+]
+
+MIDDLEWARE = [
+    'bookmarks.metrics.MetricsMiddleware', # first, so its timing covers the whole stack
+    'django.middleware.security.SecurityMiddleware',
+    'bookmarks.db.ReadYourWritesMiddleware', # reads go to the primary for a while after a write
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'config.urls_api'
+WSGI_APPLICATION = 'config.wsgi_api.application'
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    # No sessions here; anonymous requests skip authentication altogether
+    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.BasicAuthentication'],
+    # JSON only (from config.settings) and no schema generation: no browsable API or OpenAPI views
+    'DEFAULT_SCHEMA_CLASS': None,
+}
+
+# Startup report of the entry points (see config.startup)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'config.startup': {'handlers': ['console'], 'level': 'INFO'}},
+}
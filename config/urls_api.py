@@ -0,0 +1,11 @@
+"""
+URLconf of the API-only profile (config.settings_api): the /bookmarks/v1/ endpoints only.
+"""
+from django.urls import include, path
+from bookmarks import urls as bookmarks_urls
+
+api_patterns = [p for p in bookmarks_urls.urlpatterns if str(p.pattern).startswith('v1/')]
+
+urlpatterns = [
+    path('bookmarks/', include((api_patterns, bookmarks_urls.app_name))),
+]
@@ -0,0 +1,19 @@
+"""
+WSGI entry point of the API-only profile (see config.settings_api):
+
+    gunicorn config.wsgi_api
+"""
+
+import os, time
+
+started = time.perf_counter()
+
+from django.core.wsgi import get_wsgi_application # noqa: E402
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings_api')
+
+application = get_wsgi_application()
+
+from config import startup # noqa: E402
+
+startup.ready(started, time.perf_counter())